@@ -0,0 +1,86 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, TypeVar
+
+from CloudModel import CloudModel
+from savegame import Savegame, SaveMetadata
+
+T = TypeVar("T")
+
+
+class AsyncCloudModel(ABC):
+    """asyncio counterpart of CloudModel, with the same methods as coroutines."""
+
+    @abstractmethod
+    async def upload_save(self, save: Savegame):
+        pass
+
+    @abstractmethod
+    async def get_latest_metadata(self) -> Optional[SaveMetadata]:
+        """lastSave, identifier, hash and size of the latest save, without its payload."""
+        pass
+
+    @abstractmethod
+    async def get_save(self, file_name: str) -> Optional[Savegame]:
+        """Download a single save by file name."""
+        pass
+
+    @abstractmethod
+    async def list_saves(self) -> list[SaveMetadata]:
+        pass
+
+    async def get_latest_save(self) -> Optional[Savegame]:
+        latest = await self.get_latest_metadata()
+        if latest is None:
+            return None
+        return await self.get_save(latest.file_name)
+
+    async def close(self):
+        """Release resources such as open connections."""
+
+    async def __aenter__(self) -> "AsyncCloudModel":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class ThreadedCloudModel(AsyncCloudModel):
+    """
+    AsyncCloudModel running the calls of a blocking CloudModel in worker threads.
+
+    The event loop keeps running while the backend waits for disk or network.
+    Calls are serialized, as backends keep state like the cached manifest
+    between calls.
+    """
+
+    def __init__(self, model: CloudModel) -> None:
+        self.model = model
+        self._lock = asyncio.Lock()
+
+    async def _call(self, func, *args):
+        async with self._lock:
+            return await asyncio.to_thread(func, *args)
+
+    async def run(self, func: Callable[[CloudModel], T]) -> T:
+        """Call func with the blocking model in a worker thread, serialized with the other calls."""
+        return await self._call(func, self.model)
+
+    async def upload_save(self, save: Savegame):
+        await self._call(self.model.upload_save, save)
+
+    async def get_latest_metadata(self) -> Optional[SaveMetadata]:
+        return await self._call(self.model.get_latest_metadata)
+
+    async def get_save(self, file_name: str) -> Optional[Savegame]:
+        return await self._call(self.model.get_save, file_name)
+
+    async def list_saves(self) -> list[SaveMetadata]:
+        return await self._call(self.model.list_saves)
+
+    async def get_latest_save(self) -> Optional[Savegame]:
+        # one thread hop, the backend may retry on a stale manifest
+        return await self._call(self.model.get_latest_save)
+
+    async def close(self):
+        await self._call(self.model.close)
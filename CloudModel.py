@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
 from typing import Optional
 
-from savegame import Savegame
+from models.manifest import Manifest
+from models.retention import RetentionPolicy
+from savegame import Savegame, SaveMetadata
 
 
 class CloudModel(ABC):
@@ -10,5 +12,42 @@ class CloudModel(ABC):
         pass
 
     @abstractmethod
+    def get_latest_metadata(self) -> Optional[SaveMetadata]:
+        """lastSave, identifier, hash and size of the latest save, without its payload."""
+        pass
+
+    @abstractmethod
+    def get_save(self, file_name: str) -> Optional[Savegame]:
+        """Download a single save by file name."""
+        pass
+
+    @abstractmethod
+    def list_saves(self) -> list[SaveMetadata]:
+        pass
+
     def get_latest_save(self) -> Optional[Savegame]:
+        latest = self.get_latest_metadata()
+        if latest is None:
+            return None
+        return self.get_save(latest.file_name)
+
+    @abstractmethod
+    def prune(
+        self, policy: RetentionPolicy, dry_run: bool = False
+    ) -> list[SaveMetadata]:
+        """Delete the saves a retention policy does not keep, returns their entries."""
+        pass
+
+    @abstractmethod
+    def rebuild_manifest(self, full: bool = False) -> Manifest:
+        """Recreate the index of stored saves from the stored files."""
         pass
+
+    def close(self):
+        """Release resources such as open connections."""
+
+    def __enter__(self) -> "CloudModel":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,90 @@
+"""
+Size/time trade-off of the storage codecs on real save files.
+
+Usage:
+    python benchmarks/codec_benchmark.py path/to/bitburnerSave_*.json.gz [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.codec import get_codec  # noqa: E402
+
+DEFAULT_CODECS = ["gzip", "gzip-9", "bz2", "lzma", "lzma-9"]
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_codecs(
+    save_bytes: bytes, codecs: list[str], repeat: int = 3
+) -> list[dict]:
+    """
+    Encode a game save with each codec and decode it back to gzip.
+
+    Returns:
+        One result dict per codec with sizes in bytes and times in seconds
+    """
+    results = []
+    for spec in codecs:
+        codec = get_codec(spec)
+        stored = codec.encode(save_bytes)
+        results.append(
+            {
+                "codec": spec,
+                "original_size": len(save_bytes),
+                "stored_size": len(stored),
+                "ratio": len(stored) / len(save_bytes),
+                "encode_s": _best_of(lambda: codec.encode(save_bytes), repeat),
+                "decode_s": _best_of(lambda: codec.decode(stored), repeat),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark storage codecs")
+    parser.add_argument("saves", nargs="+", help="Save files exported by the game")
+    parser.add_argument(
+        "--codecs",
+        default=",".join(DEFAULT_CODECS),
+        help="Comma separated codec specs (default: %(default)s)",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+
+    report = []
+    for path in args.saves:
+        with open(path, "rb") as f:
+            save_bytes = f.read()
+        for result in benchmark_codecs(save_bytes, args.codecs.split(","), args.repeat):
+            report.append({"file": os.path.basename(path), **result})
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(
+        f"{'file':<40} {'codec':<8} {'stored':>12} {'ratio':>7} {'encode':>9} {'decode':>9}"
+    )
+    for r in report:
+        print(
+            f"{r['file'][:40]:<40} {r['codec']:<8} {r['stored_size']:>12} "
+            f"{r['ratio']:>7.3f} {r['encode_s'] * 1000:>7.0f}ms {r['decode_s'] * 1000:>7.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
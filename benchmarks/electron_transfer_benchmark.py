@@ -0,0 +1,173 @@
+"""
+Transfer time and peak memory of moving a save in and out of the Electron app.
+
+Runs against the mock DevTools endpoint (see mock_cdp.py, needs `node`). The
+export compares the previous script, which returned the save as a JSON array
+of numbers, with export_game.read_save_data. The import compares pushing the
+whole save as one base64 literal, decoded byte by byte in the page, with the
+chunked import_game.push_save_data. Peak memory is the Python side only,
+measured with tracemalloc.
+
+Usage:
+    python benchmarks/electron_transfer_benchmark.py [--sizes 1MB,10MB,100MB]
+        [--directions export,import] [--json]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from cdp_client import CDPClient  # noqa: E402
+from export_game import read_save_data  # noqa: E402
+from import_game import CONFIRM_SCRIPT, push_save_data  # noqa: E402
+from mock_cdp import MockCDPEndpoint  # noqa: E402
+from synthetic_save import make_save, parse_size, save_file_name  # noqa: E402
+
+# the export before read_save_data, one JSON number per byte
+LEGACY_EXPORT_SCRIPT = """
+(async () => {
+    const data = await window.appSaveFns.getSaveData();
+    return {fileName: data.fileName, save: Array.from(data.save)};
+})()
+"""
+
+# the import before push_save_data, the whole save in a single script
+LEGACY_PUSH_SCRIPT = """
+(() => {
+    const binaryString = atob(SAVE_DATA_BASE64);
+    const bytes = new Uint8Array(binaryString.length);
+    for (let i = 0; i < binaryString.length; i++) {
+        bytes[i] = binaryString.charCodeAt(i);
+    }
+    window.appSaveFns.pushSaveData(bytes, false);
+    return 'Import process initiated.';
+})()
+"""
+
+
+def _legacy_export(game: CDPClient) -> bytes:
+    result = game.evaluate(LEGACY_EXPORT_SCRIPT)
+    return bytes(result["save"])
+
+
+def _chunked_export(game: CDPClient) -> bytes:
+    return read_save_data(game)[1]
+
+
+def _legacy_import(game: CDPClient, save_bytes: bytes):
+    save_content = base64.b64encode(save_bytes).decode("ascii")
+    script = LEGACY_PUSH_SCRIPT.replace("SAVE_DATA_BASE64", f'"{save_content}"')
+    del save_content
+    game.evaluate(script)
+
+
+def _chunked_import(game: CDPClient, save_bytes: bytes):
+    push_save_data(game, save_bytes)
+
+
+def _measure(func, *args) -> tuple[float, int, bytes]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def _result(method: str, save_bytes: bytes, elapsed: float, peak: int) -> dict:
+    size_mb = len(save_bytes) / 1024 / 1024
+    return {
+        "method": method,
+        "size_mb": size_mb,
+        "seconds": elapsed,
+        "mb_per_s": size_mb / elapsed,
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def benchmark_transfer(
+    size: int, directions: list[str], legacy: bool = True
+) -> list[dict]:
+    """
+    Export and import a synthetic save of size uncompressed bytes with each method.
+
+    Returns:
+        One result dict per method, throughput relative to the compressed size
+    """
+    save_bytes = make_save(size)
+    variants = ["legacy", "chunked"] if legacy else ["chunked"]
+    exports = {"legacy": _legacy_export, "chunked": _chunked_export}
+    imports = {"legacy": _legacy_import, "chunked": _chunked_import}
+
+    results = []
+    with MockCDPEndpoint(save_bytes, save_file_name()) as endpoint:
+        with CDPClient.connect(endpoint.address) as game:
+            if "export" in directions:
+                for variant in variants:
+                    elapsed, peak, exported = _measure(exports[variant], game)
+                    if exported != save_bytes:
+                        raise RuntimeError(
+                            f"{variant} export returned a different save"
+                        )
+                    results.append(
+                        _result(f"export.{variant}", save_bytes, elapsed, peak)
+                    )
+            if "import" in directions:
+                for variant in variants:
+                    elapsed, peak, _ = _measure(imports[variant], game, save_bytes)
+                    game.evaluate(CONFIRM_SCRIPT)
+                    if endpoint.page.state()[0] != save_bytes:
+                        raise RuntimeError(f"{variant} import pushed a different save")
+                    results.append(
+                        _result(f"import.{variant}", save_bytes, elapsed, peak)
+                    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Electron save transfers")
+    parser.add_argument(
+        "--sizes", default="1MB,10MB,100MB", help="Uncompressed save sizes"
+    )
+    parser.add_argument(
+        "--directions", default="export,import", help="Transfers to benchmark"
+    )
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="Only run the chunked transfers"
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+
+    report = []
+    for size in args.sizes.split(","):
+        report.extend(
+            benchmark_transfer(
+                parse_size(size),
+                args.directions.split(","),
+                legacy=not args.skip_legacy,
+            )
+        )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'method':<16} {'size':>8} {'time':>9} {'throughput':>12} {'peak mem':>10}")
+    for r in report:
+        print(
+            f"{r['method']:<16} {r['size_mb']:>6.1f}MB {r['seconds']:>8.3f}s "
+            f"{r['mb_per_s']:>8.1f}MB/s {r['peak_mb']:>8.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Mock Chrome DevTools endpoint of the Bitburner Electron app.
+
+Serves /json/list and a page WebSocket like the app started with
+--remote-debugging-port. Runtime.evaluate runs the expressions in a Node.js
+process with a fake window.appSaveFns (getSaveData/pushSaveData) and the import
+confirmation button, so the JavaScript sent by export_game and import_game is
+executed for real. Requires `node` on the PATH.
+
+Usage:
+    python benchmarks/mock_cdp.py 10MB --port 9222
+    python benchmarks/mock_cdp.py --save bitburnerSave_1752885714_BN1x1.json.gz
+    python saveSync.py app --auto
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+from http import HTTPStatus
+from typing import Optional
+
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.http11 import Request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from synthetic_save import make_save, parse_size, save_file_name  # noqa: E402
+
+PAGE_ID = "mock-bitburner-page"
+
+# Node.js side: the fake game page and a line based evaluation loop
+_PAGE_RUNTIME = r"""
+const readline = require('readline');
+
+globalThis.window = globalThis;
+const game = {save: new Uint8Array(0), fileName: '', pending: null, imports: 0};
+
+window.appSaveFns = {
+    getSaveData: async () => ({save: game.save.slice(), fileName: game.fileName}),
+    pushSaveData: (bytes, automatic) => {
+        if (!(bytes instanceof Uint8Array)) {
+            throw new TypeError('pushSaveData expects a Uint8Array');
+        }
+        game.pending = bytes;
+    },
+};
+
+const confirmButton = {
+    textContent: 'Proceed with import',
+    disabled: false,
+    click: () => {
+        game.save = game.pending;
+        game.pending = null;
+        game.imports += 1;
+    },
+};
+globalThis.document = {
+    querySelectorAll: (selector) =>
+        selector === 'button' && game.pending !== null ? [confirmButton] : [],
+};
+
+function reply(message) {
+    process.stdout.write(JSON.stringify(message) + '\n');
+}
+
+async function handle(message) {
+    if (message.op === 'init') {
+        game.save = new Uint8Array(Buffer.from(message.save, 'base64'));
+        game.fileName = message.fileName;
+        return reply({id: message.id});
+    }
+    if (message.op === 'state') {
+        return reply({
+            id: message.id,
+            save: Buffer.from(game.save).toString('base64'),
+            imports: game.imports,
+        });
+    }
+    try {
+        let value = (0, eval)(message.expression);
+        if (message.awaitPromise && value && typeof value.then === 'function') {
+            value = await value;
+        }
+        reply({id: message.id, result: {result: {type: typeof value, value: value}}});
+    } catch (error) {
+        reply({
+            id: message.id,
+            result: {
+                result: {type: 'object', subtype: 'error'},
+                exceptionDetails: {
+                    text: 'Uncaught',
+                    exception: {description: String(error && error.stack || error)},
+                },
+            },
+        });
+    }
+}
+
+readline.createInterface({input: process.stdin, crlfDelay: Infinity})
+    .on('line', (line) => handle(JSON.parse(line)));
+"""
+
+
+class MockPage:
+    """The Node.js process running the fake game page."""
+
+    def __init__(self, save: bytes, file_name: str) -> None:
+        self._process = subprocess.Popen(
+            ["node", "-e", _PAGE_RUNTIME],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._lock = threading.Lock()
+        self._ids = 0
+        encoded = base64.b64encode(save).decode()
+        self._request({"op": "init", "save": encoded, "fileName": file_name})
+
+    def _request(self, message: dict) -> dict:
+        with self._lock:
+            self._ids += 1
+            message["id"] = self._ids
+            self._process.stdin.write(json.dumps(message).encode() + b"\n")
+            self._process.stdin.flush()
+            line = self._process.stdout.readline()
+        if not line:
+            raise RuntimeError("The mock page process exited")
+        return json.loads(line)
+
+    def evaluate(self, params: dict) -> dict:
+        """Result of a Runtime.evaluate call."""
+        return self._request(
+            {
+                "expression": params.get("expression", ""),
+                "awaitPromise": params.get("awaitPromise", False),
+            }
+        )["result"]
+
+    def state(self) -> tuple[bytes, int]:
+        """Current save of the game and the number of confirmed imports."""
+        state = self._request({"op": "state"})
+        return base64.b64decode(state["save"]), state["imports"]
+
+    def close(self):
+        self._process.stdin.close()
+        self._process.wait()
+
+
+class MockCDPEndpoint:
+    """
+    DevTools endpoint serving a MockPage, in a background thread.
+
+    Args:
+        save: gzip compressed save the game starts with
+        file_name: file name getSaveData reports
+        port: port to listen on, 0 picks a free one
+    """
+
+    def __init__(self, save: bytes, file_name: str, port: int = 0) -> None:
+        self.page = MockPage(save, file_name)
+        self.port = port
+        self.evaluations = 0
+        self._ready = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Future] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    def start(self) -> "MockCDPEndpoint":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = self._loop.create_future()
+        async with serve(
+            self._handle,
+            "127.0.0.1",
+            self.port,
+            process_request=self._process_request,
+            max_size=None,
+            compression=None,
+        ) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stop
+
+    def _process_request(self, connection: ServerConnection, request: Request):
+        if request.path in ("/json", "/json/list"):
+            target = {
+                "id": PAGE_ID,
+                "type": "page",
+                "title": "Bitburner",
+                "url": "file:///app/index.html",
+                "webSocketDebuggerUrl": f"ws://{self.address}/devtools/page/{PAGE_ID}",
+            }
+            return connection.respond(HTTPStatus.OK, json.dumps([target]))
+        if request.path != f"/devtools/page/{PAGE_ID}":
+            return connection.respond(HTTPStatus.NOT_FOUND, "Not found\n")
+        return None
+
+    async def _handle(self, websocket: ServerConnection):
+        async for raw in websocket:
+            message = json.loads(raw)
+            if message.get("method") == "Runtime.evaluate":
+                self.evaluations += 1
+                result = await asyncio.to_thread(self.page.evaluate, message["params"])
+                response = {"id": message["id"], "result": result}
+            else:
+                response = {"id": message["id"], "result": {}}
+            await websocket.send(json.dumps(response))
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set_result, None)
+            self._thread.join()
+        self.page.close()
+
+    def __enter__(self) -> "MockCDPEndpoint":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock DevTools endpoint of the game")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("size", nargs="?", help="Synthetic save size, e.g. 10MB")
+    source.add_argument("--save", help="Save file the game starts with")
+    parser.add_argument("--port", type=int, default=9222)
+    args = parser.parse_args()
+
+    if args.save:
+        with open(args.save, "rb") as f:
+            save_bytes = f.read()
+        name = os.path.basename(args.save)
+    else:
+        save_bytes = make_save(parse_size(args.size))
+        name = save_file_name()
+
+    endpoint = MockCDPEndpoint(save_bytes, name, port=args.port).start()
+    print(f"Mock DevTools endpoint at {endpoint.address}, serving {name}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        _, imports = endpoint.page.state()
+        print(f"{endpoint.evaluations} evaluations, {imports} imports")
+        endpoint.close()
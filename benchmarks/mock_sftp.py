@@ -0,0 +1,310 @@
+"""
+Local SFTP server for benchmarks, behind a proxy that adds network latency.
+
+MockSFTPServer serves a local directory over SFTP with paramiko, accepting any
+user and password. LatencyProxy forwards TCP connections to it, delaying data
+in each direction by half the round trip time, and can drop a connection
+after a number of bytes to exercise resumed transfers.
+
+Usage:
+    python benchmarks/mock_sftp.py ./sftp_root --port 2222 --rtt 40
+    # then use SFTPCloudServer("127.0.0.1", "user", "pw", port=2222, remote_path="/saves")
+"""
+
+import argparse
+import heapq
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from paramiko.sftp import SFTP_FAILURE, SFTP_OK
+
+
+class _Handle(SFTPHandle):
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class _DirectorySFTP(SFTPServerInterface):
+    """SFTP operations on a local directory, remote paths are relative to it."""
+
+    def __init__(self, server, *args, root: str, **kwargs) -> None:
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+
+    def _local(self, path: str) -> str:
+        return os.path.join(self.root, self.canonicalize(path).lstrip("/"))
+
+    def _errno(self, func, *args):
+        try:
+            func(*args)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            return [
+                SFTPAttributes.from_stat(os.stat(os.path.join(local, name)), name)
+                for name in os.listdir(local)
+            ]
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            fd = os.open(local, flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        f = os.fdopen(fd, mode)
+        handle = _Handle(flags)
+        handle.filename = local
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+    def remove(self, path):
+        return self._errno(os.remove, self._local(path))
+
+    def rename(self, oldpath, newpath):
+        if os.path.exists(self._local(newpath)):
+            return SFTP_FAILURE
+        return self._errno(os.rename, self._local(oldpath), self._local(newpath))
+
+    def posix_rename(self, oldpath, newpath):
+        return self._errno(os.replace, self._local(oldpath), self._local(newpath))
+
+    def mkdir(self, path, attr):
+        return self._errno(os.mkdir, self._local(path))
+
+    def rmdir(self, path):
+        return self._errno(os.rmdir, self._local(path))
+
+
+class _AcceptAll(paramiko.ServerInterface):
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+def _listen(port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", port))
+    sock.listen(16)
+    return sock
+
+
+def _serve_forever(sock: socket.socket, handle):
+    while True:
+        try:
+            client, _ = sock.accept()
+        except OSError:
+            return
+        threading.Thread(target=handle, args=(client,), daemon=True).start()
+
+
+class MockSFTPServer:
+    """
+    SFTP server on 127.0.0.1 serving root, in background threads.
+
+    Args:
+        root: local directory remote paths are relative to
+        port: port to listen on, 0 picks a free one
+    """
+
+    def __init__(self, root: str, port: int = 0) -> None:
+        self.root = root
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._sock = _listen(port)
+        self.port = self._sock.getsockname()[1]
+        self._transports: list[paramiko.Transport] = []
+
+    def start(self) -> "MockSFTPServer":
+        threading.Thread(
+            target=_serve_forever, args=(self._sock, self._handle), daemon=True
+        ).start()
+        return self
+
+    def _handle(self, client: socket.socket):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self._host_key)
+        transport.set_subsystem_handler(
+            "sftp", SFTPServer, _DirectorySFTP, root=self.root
+        )
+        self._transports.append(transport)
+        try:
+            transport.start_server(server=_AcceptAll())
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+
+    def close(self):
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
+
+    def __enter__(self) -> "MockSFTPServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class LatencyProxy:
+    """
+    TCP proxy to 127.0.0.1:target_port adding rtt_ms of round trip time.
+
+    Args:
+        target_port: port of the server
+        rtt_ms: added round trip time in milliseconds
+        port: port to listen on, 0 picks a free one
+    """
+
+    def __init__(self, target_port: int, rtt_ms: float = 0.0, port: int = 0) -> None:
+        self.target_port = target_port
+        self.delay = rtt_ms / 1000 / 2
+        self._sock = _listen(port)
+        self.port = self._sock.getsockname()[1]
+        # client to server bytes after which the next connection is dropped
+        self._drop_after: Optional[int] = None
+        self.dropped = 0
+        self._connections: list[socket.socket] = []
+
+    def drop_next_after(self, num_bytes: int):
+        """Cut the next connection that sends num_bytes towards the server."""
+        self._drop_after = num_bytes
+
+    def start(self) -> "LatencyProxy":
+        threading.Thread(
+            target=_serve_forever, args=(self._sock, self._handle), daemon=True
+        ).start()
+        return self
+
+    def _handle(self, client: socket.socket):
+        upstream = socket.create_connection(("127.0.0.1", self.target_port))
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._connections += [client, upstream]
+        threading.Thread(
+            target=self._pump, args=(client, upstream, True), daemon=True
+        ).start()
+        self._pump(upstream, client, False)
+
+    def _pump(self, src: socket.socket, dst: socket.socket, to_server: bool):
+        """Forward src to dst, each chunk delivered delay seconds after it arrived."""
+        queue: list[tuple[float, int, bytes]] = []
+        ready = threading.Condition()
+        closed = False
+
+        def deliver():
+            while True:
+                with ready:
+                    while not queue and not closed:
+                        ready.wait()
+                    if not queue:
+                        break
+                    due, _, data = queue[0]
+                    wait = due - time.monotonic()
+                    if wait > 0:
+                        ready.wait(wait)
+                        continue
+                    heapq.heappop(queue)
+                try:
+                    dst.sendall(data)
+                except OSError:
+                    break
+            _shutdown(dst)
+
+        sender = threading.Thread(target=deliver, daemon=True)
+        sender.start()
+        sequence = 0
+        forwarded = 0
+        while True:
+            try:
+                data = src.recv(65536)
+            except OSError:
+                data = b""
+            if to_server and self._drop_after is not None and data:
+                forwarded += len(data)
+                if forwarded >= self._drop_after:
+                    self._drop_after = None
+                    self.dropped += 1
+                    _shutdown(src)
+                    _shutdown(dst)
+                    data = b""
+            with ready:
+                if not data:
+                    closed = True
+                    ready.notify()
+                    break
+                sequence += 1
+                heapq.heappush(queue, (time.monotonic() + self.delay, sequence, data))
+                ready.notify()
+        sender.join()
+
+    def close(self):
+        self._sock.close()
+        for sock in self._connections:
+            _shutdown(sock)
+
+    def __enter__(self) -> "LatencyProxy":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _shutdown(sock: socket.socket):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SFTP server with latency")
+    parser.add_argument("root", help="Directory to serve")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--rtt", type=float, default=0.0, help="Added RTT in ms")
+    args = parser.parse_args()
+
+    os.makedirs(args.root, exist_ok=True)
+    server = MockSFTPServer(os.path.abspath(args.root)).start()
+    proxy = LatencyProxy(server.port, args.rtt, port=args.port).start()
+    print(f"SFTP server for {args.root} at 127.0.0.1:{proxy.port}, {args.rtt}ms RTT")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        proxy.close()
+        server.close()
@@ -0,0 +1,105 @@
+"""
+Throughput of decoding getSaveFile responses in the RFA server.
+
+Compares the previous per-character decode loop with write_save_data for
+base64 encoded binary saves of 1, 10 and 50 MB.
+
+Usage:
+    python benchmarks/rfa_decode_benchmark.py [--sizes 1,10,50] [--json]
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "websocket_server"
+    ),
+)
+
+from RFA_server import write_save_data  # noqa: E402
+
+
+def _legacy_decode(data: str, file_path: str) -> int:
+    byte_data = bytes(ord(c) for c in data)
+    with open(file_path, "wb") as f:
+        f.write(byte_data)
+    return len(byte_data)
+
+
+def _measure(func, *args) -> tuple[float, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def benchmark_decode(size_mb: float, legacy: bool = True) -> list[dict]:
+    """
+    Decode a base64 save of size_mb megabytes with each method.
+
+    Returns:
+        One result dict per method, throughput relative to the decoded size
+    """
+    save_bytes = os.urandom(int(size_mb * 1024 * 1024))
+    data = base64.b64encode(save_bytes).decode("ascii")
+    del save_bytes
+
+    methods = [("chunked", write_save_data, (data, True))]
+    if legacy:
+        methods.insert(0, ("legacy", _legacy_decode, (data,)))
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, func, args in methods:
+            file_path = os.path.join(tmp_dir, f"{name}.json.gz")
+            elapsed, peak = _measure(func, *args, file_path)
+            results.append(
+                {
+                    "method": name,
+                    "size_mb": size_mb,
+                    "seconds": elapsed,
+                    "mb_per_s": size_mb / elapsed,
+                    "peak_mb": peak / 1024 / 1024,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RFA save decoding")
+    parser.add_argument("--sizes", default="1,10,50", help="Save sizes in MB")
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="Only run the chunked decoder"
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+
+    report = []
+    for size in args.sizes.split(","):
+        report.extend(benchmark_decode(float(size), legacy=not args.skip_legacy))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'method':<8} {'size':>6} {'time':>9} {'throughput':>12} {'peak mem':>10}")
+    for r in report:
+        print(
+            f"{r['method']:<8} {r['size_mb']:>4.0f}MB {r['seconds']:>8.3f}s "
+            f"{r['mb_per_s']:>8.1f}MB/s {r['peak_mb']:>8.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
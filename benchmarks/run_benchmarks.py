@@ -0,0 +1,413 @@
+"""
+Benchmark suite for save handling, on synthetic saves (see synthetic_save.py).
+
+Times Savegame parsing, save_to_file, LocalSaveServer uploads and lookups over
+histories of different lengths, copies of save files into and out of a
+LocalSaveServer, scans of stored save files read into memory or mapped, and
+RFA save decoding. Results are written as
+JSON, so runs of different commits can be compared with --compare.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --quick --compare results.json
+"""
+
+import argparse
+import base64
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "websocket_server"))
+
+from models.localServer import LocalSaveServer  # noqa: E402
+from models.manifest import MANIFEST_NAME, Manifest  # noqa: E402
+from savegame import Savegame, SaveMetadata  # noqa: E402
+from synthetic_save import (  # noqa: E402
+    DEFAULT_LAST_SAVE,
+    make_save,
+    parse_size,
+    save_file_name,
+)
+
+REPORT_VERSION = 1
+DEFAULT_SIZES = "100KB,1MB,10MB,50MB"
+DEFAULT_HISTORIES = "10,100,1000,10000"
+QUICK_SIZES = "100KB,1MB"
+QUICK_HISTORIES = "10,100"
+BENCHMARKS = ("savegame", "local_server", "file_copy", "history_scan", "rfa")
+# size of every save in the generated histories
+HISTORY_SAVE_SIZE = 20 * 1024
+# files read and hashed by each run of the history_scan benchmark
+SCAN_FILES = 50
+
+
+def _timings(func, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"seconds": min(times), "mean_s": sum(times) / len(times), "repeat": repeat}
+
+
+def _result(benchmark: str, params: dict, timings: dict, **extra) -> dict:
+    return {"benchmark": benchmark, "params": params, **timings, **extra}
+
+
+def bench_savegame(size: int, repeat: int, tmp_dir: str) -> list[dict]:
+    save_bytes = make_save(size)
+    name = save_file_name()
+    params = {"size": size, "compressed_size": len(save_bytes)}
+    save = Savegame.from_bytes(name, save_bytes, metadata_only=True)
+    file_path = os.path.join(tmp_dir, name)
+    return [
+        _result(
+            "savegame.parse",
+            params,
+            _timings(lambda: Savegame.from_bytes(name, save_bytes), repeat),
+        ),
+        _result(
+            "savegame.parse_metadata",
+            params,
+            _timings(
+                lambda: Savegame.from_bytes(name, save_bytes, metadata_only=True),
+                repeat,
+            ),
+        ),
+        _result(
+            "savegame.save_to_file",
+            params,
+            _timings(lambda: save.save_to_file(file_path), repeat),
+        ),
+    ]
+
+
+def _populate_history(save_path: str, count: int) -> bytes:
+    """Write count saves and their manifest, returns the shared payload."""
+    payload = make_save(HISTORY_SAVE_SIZE)
+    template = Savegame.from_bytes(save_file_name(), payload, metadata_only=True)
+    entries = []
+    for i in range(count):
+        last_save = DEFAULT_LAST_SAVE - (count - i) * 60_000
+        meta = SaveMetadata(
+            file_name=save_file_name(last_save),
+            last_save=last_save,
+            identifier=template.identifier,
+            size=len(payload),
+            sha256=template.sha256,
+        )
+        with open(os.path.join(save_path, meta.file_name), "wb") as f:
+            f.write(payload)
+        entries.append(meta)
+    with open(os.path.join(save_path, MANIFEST_NAME), "wb") as f:
+        f.write(Manifest(entries).to_bytes())
+    return payload
+
+
+def bench_local_server(count: int, repeat: int, tmp_dir: str) -> list[dict]:
+    save_path = os.path.join(tmp_dir, f"history_{count}")
+    os.makedirs(save_path)
+    _populate_history(save_path, count)
+    params = {"history": count}
+
+    uploads = [
+        Savegame.from_bytes(
+            save_file_name(DEFAULT_LAST_SAVE + i * 1000),
+            make_save(HISTORY_SAVE_SIZE, DEFAULT_LAST_SAVE + i * 1000),
+            metadata_only=True,
+        )
+        for i in range(repeat)
+    ]
+    model = LocalSaveServer(save_path)
+    model.load_manifest()
+    pending_uploads = iter(uploads)
+    upload = _timings(lambda: model.upload_save(next(pending_uploads)), repeat)
+
+    return [
+        # cold lookups: a new backend instance has to read the manifest first
+        _result(
+            "local_server.latest_metadata",
+            params,
+            _timings(lambda: LocalSaveServer(save_path).get_latest_metadata(), repeat),
+        ),
+        _result(
+            "local_server.latest_save",
+            params,
+            _timings(lambda: LocalSaveServer(save_path).get_latest_save(), repeat),
+        ),
+        _result(
+            "local_server.list_saves",
+            params,
+            _timings(lambda: LocalSaveServer(save_path).list_saves(), repeat),
+        ),
+        _result("local_server.upload", params, upload),
+        # reads every stored file, a single run is enough
+        _result(
+            "local_server.rebuild_manifest",
+            params,
+            _timings(lambda: LocalSaveServer(save_path).rebuild_manifest(full=True), 1),
+        ),
+    ]
+
+
+def _copy_round_trip(tmp_dir: str, src: str, load) -> dict:
+    """Upload a save file to a new LocalSaveServer and export it again."""
+    store = tempfile.mkdtemp(dir=tmp_dir)
+    tracemalloc.start()
+    start = time.perf_counter()
+    model = LocalSaveServer(store)
+    model.upload_save(load(src))
+    model.get_latest_save().save_to_file(os.path.join(store, "exported.json.gz"))
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": seconds, "peak_mb": peak / 1024 / 1024}
+
+
+def _load_into_memory(path: str) -> Savegame:
+    with open(path, "rb") as f:
+        return Savegame.from_bytes(os.path.basename(path), f.read(), metadata_only=True)
+
+
+def bench_file_copy(size: int, repeat: int, tmp_dir: str) -> list[dict]:
+    save_bytes = make_save(size)
+    src = os.path.join(tmp_dir, save_file_name())
+    with open(src, "wb") as f:
+        f.write(save_bytes)
+    params = {"size": size, "compressed_size": len(save_bytes)}
+    results = []
+    for name, load in (
+        ("file_copy.in_memory", _load_into_memory),
+        ("file_copy.file_backed", lambda path: Savegame.from_file(path, True)),
+    ):
+        runs = [_copy_round_trip(tmp_dir, src, load) for _ in range(repeat)]
+        seconds = [run["seconds"] for run in runs]
+        timings = {
+            "seconds": min(seconds),
+            "mean_s": sum(seconds) / len(seconds),
+            "repeat": repeat,
+        }
+        results.append(
+            _result(name, params, timings, peak_mb=max(run["peak_mb"] for run in runs))
+        )
+    return results
+
+
+def _scan_read(paths: list[str]):
+    for path in paths:
+        with open(path, "rb") as f:
+            save = Savegame.from_bytes(
+                os.path.basename(path), f.read(), metadata_only=True
+            )
+        save.compute_sha256()
+
+
+def _scan_mapped(paths: list[str]):
+    for path in paths:
+        Savegame.from_file(path, metadata_only=True).compute_sha256()
+
+
+def bench_history_scan(size: int, repeat: int, tmp_dir: str) -> list[dict]:
+    """Read the metadata and hash of SCAN_FILES stored saves, as rebuild_manifest does."""
+    save_bytes = make_save(size)
+    scan_dir = tempfile.mkdtemp(dir=tmp_dir)
+    paths = []
+    for i in range(SCAN_FILES):
+        path = os.path.join(scan_dir, save_file_name(DEFAULT_LAST_SAVE + i * 1000))
+        with open(path, "wb") as f:
+            f.write(save_bytes)
+        paths.append(path)
+    params = {"size": size, "compressed_size": len(save_bytes), "files": SCAN_FILES}
+
+    results = []
+    for name, scan in (
+        ("history_scan.read", _scan_read),
+        ("history_scan.mapped", _scan_mapped),
+    ):
+        seconds = []
+        peak = 0
+        for _ in range(repeat):
+            tracemalloc.start()
+            start = time.perf_counter()
+            scan(paths)
+            seconds.append(time.perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        timings = {
+            "seconds": min(seconds),
+            "mean_s": sum(seconds) / len(seconds),
+            "repeat": repeat,
+        }
+        results.append(_result(name, params, timings, peak_mb=peak / 1024 / 1024))
+    return results
+
+
+def bench_rfa(size: int, repeat: int, tmp_dir: str) -> list[dict]:
+    from RFA_server import write_save_data
+
+    save_bytes = make_save(size)
+    data = base64.b64encode(save_bytes).decode("ascii")
+    file_path = os.path.join(tmp_dir, "rfa_save.json.gz")
+    timings = _timings(lambda: write_save_data(data, True, file_path), repeat)
+    return [
+        _result(
+            "rfa.decode",
+            {"size": size, "compressed_size": len(save_bytes)},
+            timings,
+            mb_per_s=len(save_bytes) / 1024 / 1024 / timings["seconds"],
+        )
+    ]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes: list[int], histories: list[int], repeat: int, benchmarks: list[str]
+) -> dict:
+    """Run the selected benchmarks, returns the JSON report."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # the backends report every step on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            if "savegame" in benchmarks:
+                for size in sizes:
+                    results += bench_savegame(size, repeat, tmp_dir)
+            if "local_server" in benchmarks:
+                for count in histories:
+                    results += bench_local_server(count, repeat, tmp_dir)
+            if "file_copy" in benchmarks:
+                for size in sizes:
+                    results += bench_file_copy(size, repeat, tmp_dir)
+            if "history_scan" in benchmarks:
+                for size in sizes:
+                    results += bench_history_scan(size, repeat, tmp_dir)
+            if "rfa" in benchmarks:
+                for size in sizes:
+                    results += bench_rfa(size, repeat, tmp_dir)
+
+    return {
+        "version": REPORT_VERSION,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "results": results,
+    }
+
+
+def _key(result: dict) -> tuple:
+    params = result["params"]
+    return (result["benchmark"], params.get("size"), params.get("history"))
+
+
+def _describe(result: dict) -> str:
+    params = result["params"]
+    if "history" in params:
+        return f"{result['benchmark']} history={params['history']}"
+    return f"{result['benchmark']} size={params['size'] / 1024 / 1024:.1f}MB"
+
+
+def print_report(report: dict, baseline: Optional[dict] = None):
+    previous = {}
+    if baseline is not None:
+        previous = {_key(r): r for r in baseline["results"]}
+        print(f"Baseline: {baseline.get('commit')}")
+    print(f"Commit:   {report.get('commit')}")
+
+    print(f"{'benchmark':<48} {'best':>10} {'baseline':>10} {'change':>8}")
+    for result in report["results"]:
+        line = f"{_describe(result):<48} {result['seconds'] * 1000:>8.2f}ms"
+        old = previous.get(_key(result))
+        if old is not None:
+            change = result["seconds"] / old["seconds"] - 1
+            line += f" {old['seconds'] * 1000:>8.2f}ms {change:>+7.0%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the save handling benchmarks")
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="Uncompressed save sizes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--histories",
+        default=DEFAULT_HISTORIES,
+        help="Number of stored saves for the backend benchmarks (default: %(default)s)",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--only",
+        default=",".join(BENCHMARKS),
+        help="Comma separated benchmark groups (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help=f"Small sizes and histories only ({QUICK_SIZES}; {QUICK_HISTORIES})",
+    )
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument(
+        "--compare", help="JSON report of a previous run to compare with"
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the JSON report instead of a table"
+    )
+    args = parser.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else args.sizes
+    histories = QUICK_HISTORIES if args.quick else args.histories
+    benchmarks = args.only.split(",")
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = run(
+        [parse_size(s) for s in sizes.split(",")],
+        [int(n) for n in histories.split(",")],
+        args.repeat,
+        benchmarks,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+SFTP upload and download throughput against a local server with added latency.
+
+Compares the previous transfers (putfo/getfo of an in-memory BytesIO) with the
+pipelined block transfers of SFTPCloudServer, with the default settings and a
+wider window and larger blocks, over the round trip times given. A final run
+drops the connection halfway through an upload, which has to resume on a new
+connection. Uses mock_sftp.py, no real server is needed.
+
+Usage:
+    python benchmarks/sftp_benchmark.py [--sizes 1MB,10MB] [--rtts 0,20,50] [--json]
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from mock_sftp import LatencyProxy, MockSFTPServer  # noqa: E402
+from models.sftpServer import SFTPCloudServer  # noqa: E402
+from synthetic_save import parse_size  # noqa: E402
+
+# settings of the pipelined variants, on top of the connection parameters
+VARIANTS = {
+    "pipelined": {},
+    "pipelined-wide": {"max_requests": 256, "window_size": 16 * 1024 * 1024},
+    "pipelined-128k": {
+        "block_size": 128 * 1024,
+        "max_requests": 64,
+        "window_size": 16 * 1024 * 1024,
+    },
+}
+
+
+def _legacy_write(model: SFTPCloudServer, name: str, data: bytes):
+    remote_file_path = model._remote_file_path(name)
+    with model._session() as sftp, io.BytesIO(data) as file_obj:
+        sftp.putfo(file_obj, remote_file_path + ".tmp")
+        sftp.posix_rename(remote_file_path + ".tmp", remote_file_path)
+
+
+def _legacy_read(model: SFTPCloudServer, name: str) -> bytes:
+    with model._session() as sftp, io.BytesIO() as file_obj:
+        sftp.getfo(model._remote_file_path(name), file_obj)
+        return file_obj.getvalue()
+
+
+def _timed(func, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def _result(method: str, direction: str, size: int, rtt: float, seconds: float):
+    size_mb = size / 1024 / 1024
+    return {
+        "method": method,
+        "direction": direction,
+        "size_mb": size_mb,
+        "rtt_ms": rtt,
+        "seconds": seconds,
+        "mb_per_s": size_mb / seconds,
+    }
+
+
+def benchmark_rtt(server: MockSFTPServer, sizes: list[int], rtt: float) -> list[dict]:
+    results = []
+    with LatencyProxy(server.port, rtt) as proxy:
+        connection = {
+            "hostname": "127.0.0.1",
+            "username": "bench",
+            "password": "bench",
+            "port": proxy.port,
+            "remote_path": "/saves",
+        }
+        models = {"legacy": SFTPCloudServer(**connection)}
+        for name, options in VARIANTS.items():
+            models[name] = SFTPCloudServer(**connection, **options)
+
+        for size in sizes:
+            data = os.urandom(size)
+            for method, model in models.items():
+                name = f"{method}_{size}.bin"
+                with model._session():
+                    if method == "legacy":
+                        write_s, _ = _timed(_legacy_write, model, name, data)
+                        read_s, read = _timed(_legacy_read, model, name)
+                    else:
+                        write_s, _ = _timed(model._write_file, name, data)
+                        read_s, read = _timed(model._read_file, name)
+                if read != data:
+                    raise RuntimeError(f"{method} read back different data")
+                results.append(_result(method, "upload", size, rtt, write_s))
+                results.append(_result(method, "download", size, rtt, read_s))
+
+        for model in models.values():
+            model.close()
+    return results
+
+
+def benchmark_resume(server: MockSFTPServer, size: int, rtt: float) -> dict:
+    """Upload with the connection dropped about halfway."""
+    with LatencyProxy(server.port, rtt) as proxy:
+        model = SFTPCloudServer(
+            "127.0.0.1", "bench", "bench", port=proxy.port, remote_path="/saves"
+        )
+        data = os.urandom(size)
+        proxy.drop_next_after(size // 2)
+        seconds, _ = _timed(model._write_file, "resumed.bin", data)
+        if model._read_file("resumed.bin") != data:
+            raise RuntimeError("resumed upload stored different data")
+        model.close()
+    return {
+        "size_mb": size / 1024 / 1024,
+        "rtt_ms": rtt,
+        "seconds": seconds,
+        "drops": proxy.dropped,
+        "reconnects": model.connection_stats["created"] - 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SFTP transfers")
+    parser.add_argument("--sizes", default="1MB,10MB", help="Transfer sizes")
+    parser.add_argument("--rtts", default="0,20,50", help="Added RTTs in ms")
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+
+    # only the resume warnings of the backend
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    sizes = [parse_size(s) for s in args.sizes.split(",")]
+    rtts = [float(r) for r in args.rtts.split(",")]
+
+    with tempfile.TemporaryDirectory() as root:
+        os.mkdir(os.path.join(root, "saves"))
+        with MockSFTPServer(root) as server:
+            report = []
+            for rtt in rtts:
+                report += benchmark_rtt(server, sizes, rtt)
+            resume = benchmark_resume(server, max(sizes), max(rtts))
+
+    if args.json:
+        print(json.dumps({"transfers": report, "resume": resume}, indent=2))
+        return
+
+    print(
+        f"{'method':<16} {'direction':<9} {'size':>8} {'rtt':>6} {'time':>9} "
+        f"{'throughput':>12}"
+    )
+    for r in report:
+        print(
+            f"{r['method']:<16} {r['direction']:<9} {r['size_mb']:>6.1f}MB "
+            f"{r['rtt_ms']:>4.0f}ms {r['seconds']:>8.3f}s {r['mb_per_s']:>8.1f}MB/s"
+        )
+    print(
+        f"resumed upload of {resume['size_mb']:.1f}MB at {resume['rtt_ms']:.0f}ms RTT: "
+        f"{resume['seconds']:.3f}s, {resume['drops']} drop(s), "
+        f"{resume['reconnects']} reconnect(s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold start time of saveSync.py.
+
+Every run is a new interpreter. "import" only imports saveSync, "eager"
+additionally imports what saveSync used to load at startup (the automation
+modules with websockets and every backend with paramiko), and "history" runs
+a complete `saveSync.py history` against a local backend selected by a config
+file. Also lists which heavy third-party modules each variant loads.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--repeat 10] [--json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("selenium", "webdriver_manager", "paramiko", "websockets")
+
+_REPORT_MODULES = (
+    "import sys; print(','.join(m for m in {modules!r} if m in sys.modules))"
+)
+
+VARIANTS = {
+    "import": "import saveSync",
+    "eager": "import saveSync, export_game, import_game, models.localServer, "
+    "models.sftpServer, models.replicated",
+}
+
+
+def _run(argv: list[str], cwd: str) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = subprocess.run(argv, cwd=cwd, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stdout
+
+
+def _timings(argv: list[str], cwd: str, repeat: int) -> dict:
+    times = [_run(argv, cwd)[0] for _ in range(repeat)]
+    return {"seconds": min(times), "mean_s": sum(times) / len(times), "repeat": repeat}
+
+
+def benchmark_startup(repeat: int) -> list[dict]:
+    results = []
+    for name, code in VARIANTS.items():
+        probe = f"{code}; {_REPORT_MODULES.format(modules=HEAVY_MODULES)}"
+        loaded = _run([sys.executable, "-c", probe], REPO_DIR)[1].strip()
+        results.append(
+            {
+                "variant": name,
+                **_timings([sys.executable, "-c", code], REPO_DIR, repeat),
+                "heavy_modules": loaded.split(",") if loaded else [],
+            }
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, "saveSync.json"), "w") as f:
+            json.dump({"backend": {"type": "local", "save_path": "savegames"}}, f)
+        argv = [
+            sys.executable,
+            os.path.join(REPO_DIR, "saveSync.py"),
+            "--log-level",
+            "WARNING",
+            "history",
+        ]
+        results.append({"variant": "history", **_timings(argv, tmp_dir, repeat)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the saveSync cold start")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print JSON results")
+    args = parser.parse_args()
+
+    report = benchmark_startup(args.repeat)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'variant':<8} {'best':>9} {'mean':>9}  heavy modules loaded")
+    for r in report:
+        modules = ", ".join(r.get("heavy_modules", [])) or "-"
+        if r["variant"] == "history":
+            modules = ""
+        print(
+            f"{r['variant']:<8} {r['seconds'] * 1000:>7.1f}ms "
+            f"{r['mean_s'] * 1000:>7.1f}ms  {modules}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Generator for valid synthetic Bitburner saves of a given size.
+
+Saves use the layout the game exports and Savegame expects: a gzip compressed
+BitburnerSaveObject whose data sections (PlayerSave, AllServersSave, ...) are
+JSON strings themselves. Most of the size is made up of scripts on servers,
+like in real saves, so compression ratios are realistic. Output is
+deterministic for a given seed.
+
+Usage:
+    python benchmarks/synthetic_save.py 10MB [--out bitburnerSave_1752885714_.json.gz]
+"""
+
+import argparse
+import gzip
+import json
+import random
+
+DEFAULT_LAST_SAVE = 1752885714000
+
+# building blocks of generated scripts
+_SCRIPT_LINES = [
+    "/** @param {NS} ns */",
+    "export async function main(ns) {",
+    '  const target = ns.args[0] ?? "n00dles";',
+    "  const moneyThresh = ns.getServerMaxMoney(target) * 0.75;",
+    "  const securityThresh = ns.getServerMinSecurityLevel(target) + 5;",
+    "  while (true) {",
+    "    if (ns.getServerSecurityLevel(target) > securityThresh) {",
+    "      await ns.weaken(target);",
+    "    } else if (ns.getServerMoneyAvailable(target) < moneyThresh) {",
+    "      await ns.grow(target);",
+    "    } else {",
+    "      await ns.hack(target);",
+    "    }",
+    "  }",
+    "}",
+    "  ns.tprint(`threads: ${ns.getRunningScript().threads}`);",
+    '  for (const host of ns.scan("home")) ns.print(host);',
+    '  ns.exec("hack.js", host, Math.floor(ram / 1.75), target);',
+    "  await ns.sleep(200);",
+    "// TODO: batch weaken/grow/hack timing",
+]
+
+
+def _script(rng: random.Random, size: int) -> str:
+    lines = []
+    length = 0
+    while length < size:
+        chunk = rng.choices(_SCRIPT_LINES, k=12)
+        # vary numbers so the content does not compress unrealistically well
+        chunk.append(f"  const port{rng.randrange(1 << 30)} = {rng.random():.6f};")
+        lines.extend(chunk)
+        length += sum(len(line) + 1 for line in chunk)
+    return "\n".join(lines)
+
+
+def _server(rng: random.Random, hostname: str, script_bytes: int) -> dict:
+    scripts = []
+    remaining = script_bytes
+    index = 0
+    while remaining > 0:
+        size = min(remaining, rng.randrange(2_000, 60_000))
+        code = _script(rng, size)
+        scripts.append(
+            {
+                "ctor": "Script",
+                "data": {
+                    "code": code,
+                    "filename": f"scripts/s{index}.js",
+                    "server": hostname,
+                    "ramUsage": round(rng.uniform(1.6, 30), 2),
+                },
+            }
+        )
+        remaining -= len(code)
+        index += 1
+    return {
+        "ctor": "Server",
+        "data": {
+            "hostname": hostname,
+            "ip": ".".join(str(rng.randrange(256)) for _ in range(4)),
+            "hasAdminRights": True,
+            "maxRam": 2 ** rng.randrange(3, 20),
+            "moneyMax": rng.randrange(10**6, 10**12),
+            "scripts": scripts,
+            "runningScripts": [],
+        },
+    }
+
+
+def make_save_json(
+    size: int,
+    last_save: int = DEFAULT_LAST_SAVE,
+    identifier: str = "synthetic",
+    seed: int = 0,
+) -> str:
+    """
+    Build the uncompressed save JSON of roughly size bytes.
+
+    Args:
+        size: target size of the uncompressed save JSON in bytes
+        last_save: lastSave of the player in milliseconds
+        identifier: identifier of the game instance
+        seed: seed of the generated content
+    """
+    rng = random.Random(seed)
+    player = {
+        "ctor": "PlayerObject",
+        "data": {
+            "money": rng.uniform(1e6, 1e15),
+            "lastSave": last_save,
+            "identifier": identifier,
+            "totalPlaytime": rng.randrange(10**6, 10**10),
+            "playtimeSinceLastAug": rng.randrange(10**6),
+            "augmentations": [
+                {"level": 1, "name": f"Augmentation {i}"}
+                for i in range(rng.randrange(10, 60))
+            ],
+            "sourceFiles": {"ctor": "JSONMap", "data": [[i, 3] for i in range(1, 13)]},
+            "hacknetNodes": [f"hacknet-server-{i}" for i in range(20)],
+        },
+    }
+
+    # servers get the rest of the size, json string escaping adds a bit on top
+    script_budget = max(size - 8_000, 0) * 0.9
+    servers = {}
+    server_count = max(1, min(70, int(script_budget // 50_000)))
+    for i in range(server_count):
+        hostname = "home" if i == 0 else f"server-{i}"
+        servers[hostname] = _server(rng, hostname, int(script_budget / server_count))
+
+    save = {
+        "ctor": "BitburnerSaveObject",
+        "data": {
+            "PlayerSave": json.dumps(player),
+            "AllServersSave": json.dumps(servers),
+            "CompaniesSave": json.dumps(
+                {"ECorp": {"ctor": "Company", "data": {"playerReputation": 1e6}}}
+            ),
+            "FactionsSave": json.dumps(
+                {"CyberSec": {"ctor": "Faction", "data": {"playerReputation": 1e5}}}
+            ),
+            "AliasesSave": "{}",
+            "GlobalAliasesSave": "{}",
+            "StockMarketSave": "{}",
+            "SettingsSave": json.dumps({"MaxLogCapacity": 50, "theme": {}}),
+            "VersionSave": "41",
+            "LastExportBonus": "0",
+        },
+    }
+    return json.dumps(save, separators=(",", ":"))
+
+
+def make_save(
+    size: int,
+    last_save: int = DEFAULT_LAST_SAVE,
+    identifier: str = "synthetic",
+    seed: int = 0,
+) -> bytes:
+    """Gzip compressed save as exported by the game, see make_save_json."""
+    text = make_save_json(size, last_save, identifier, seed)
+    return gzip.compress(text.encode("utf-8"), compresslevel=6, mtime=0)
+
+
+def save_file_name(last_save: int = DEFAULT_LAST_SAVE) -> str:
+    return f"bitburnerSave_{last_save // 1000}_.json.gz"
+
+
+def parse_size(text: str) -> int:
+    """Parse sizes like 100KB, 10MB or 2048."""
+    text = text.strip().upper()
+    for suffix, factor in (("KB", 1024), ("MB", 1024**2), ("GB", 1024**3)):
+        if text.endswith(suffix):
+            return int(float(text[: -len(suffix)]) * factor)
+    return int(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Bitburner save")
+    parser.add_argument("size", help="Uncompressed size, e.g. 100KB or 50MB")
+    parser.add_argument(
+        "--last-save", dest="last_save", type=int, default=DEFAULT_LAST_SAVE
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--out", help="Output file (default: bitburnerSave_<lastSave>_.json.gz)"
+    )
+    args = parser.parse_args()
+
+    data = make_save(parse_size(args.size), args.last_save, seed=args.seed)
+    out = args.out or save_file_name(args.last_save)
+    with open(out, "wb") as f:
+        f.write(data)
+    print(f"Wrote {out} ({len(data)} bytes)")
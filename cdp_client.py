@@ -0,0 +1,153 @@
+import itertools
+import json
+import logging
+import threading
+import time
+import urllib.request
+from typing import Any, Optional
+
+from websockets.sync.client import ClientConnection, connect
+
+logger = logging.getLogger(__name__)
+
+# the game has to be started with --remote-debugging-port=9222
+DEFAULT_DEBUGGER_ADDRESS = "127.0.0.1:9222"
+
+# seconds a single DevTools call may take, exporting a large save can be slow
+CALL_TIMEOUT = 120.0
+
+
+class CDPError(Exception):
+    """Failed DevTools call, or a JavaScript exception in the page."""
+
+
+def find_page_target(
+    address: str = DEFAULT_DEBUGGER_ADDRESS, timeout: float = 5.0
+) -> str:
+    """
+    WebSocket URL of the game page behind a remote debugging port.
+
+    Raises:
+        CDPError: if the port is not reachable or has no page target
+    """
+    try:
+        url = f"http://{address}/json/list"
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            targets = json.load(response)
+    except OSError as e:
+        raise CDPError(
+            f"No DevTools endpoint at {address} ({e}). "
+            "Start Bitburner with --remote-debugging-port=9222"
+        ) from e
+
+    for target in targets:
+        is_devtools = target.get("url", "").startswith("devtools://")
+        if target.get("type") == "page" and not is_devtools:
+            return target["webSocketDebuggerUrl"]
+    raise CDPError(f"No page target at {address}, is Bitburner running?")
+
+
+class CDPClient:
+    """
+    Minimal Chrome DevTools Protocol session with the game page.
+
+    Talks to the Electron app directly over its debugging WebSocket, without
+    a chromedriver process. One client can be used for a whole sync, i.e. the
+    export, the comparison and the import. Calls are serialized, so a client
+    may be shared between threads.
+    """
+
+    def __init__(self, websocket: ClientConnection) -> None:
+        self.websocket = websocket
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, address: str = DEFAULT_DEBUGGER_ADDRESS) -> "CDPClient":
+        """
+        Connect to the game page behind a remote debugging port.
+
+        Raises:
+            CDPError: if no page is found
+        """
+        url = find_page_target(address)
+        # saves can be tens of MB, and the page does not compress its messages
+        websocket = connect(url, max_size=None, compression=None, open_timeout=10)
+        # the connection outlives this call, enter it as the context manager
+        # websockets expects and leave it in close()
+        websocket.__enter__()
+        logger.debug(f"Connected to {url}")
+        return cls(websocket)
+
+    def call(
+        self, method: str, params: Optional[dict] = None, timeout: float = CALL_TIMEOUT
+    ) -> dict:
+        """
+        Send a DevTools command and wait for its result.
+
+        Events sent in between are skipped, no domain is enabled by this client.
+
+        Raises:
+            CDPError: for error responses
+            TimeoutError: if there is no response within timeout seconds
+        """
+        with self._lock:
+            call_id = next(self._ids)
+            self.websocket.send(
+                json.dumps({"id": call_id, "method": method, "params": params or {}})
+            )
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{method} did not answer within {timeout}s")
+                message = json.loads(self.websocket.recv(timeout=remaining))
+                if message.get("id") != call_id:
+                    continue
+                if "error" in message:
+                    error = message["error"]
+                    raise CDPError(f"{method} failed: {error.get('message', error)}")
+                return message.get("result", {})
+
+    def evaluate(
+        self, expression: str, await_promise: bool = True, timeout: float = CALL_TIMEOUT
+    ) -> Any:
+        """
+        Evaluate a JavaScript expression in the page and return its value.
+
+        Args:
+            expression: JavaScript expression, a returned promise is awaited
+                when await_promise is set
+            await_promise: wait for a returned promise to settle
+            timeout: seconds to wait for the result
+
+        Returns:
+            The JSON serializable result
+
+        Raises:
+            CDPError: if the expression throws or the promise rejects
+        """
+        result = self.call(
+            "Runtime.evaluate",
+            {
+                "expression": expression,
+                "awaitPromise": await_promise,
+                "returnByValue": True,
+            },
+            timeout=timeout,
+        )
+        details = result.get("exceptionDetails")
+        if details:
+            exception = details.get("exception", {})
+            message = exception.get("description") or details.get("text", "unknown")
+            raise CDPError(f"JavaScript error: {message}")
+        return result.get("result", {}).get("value")
+
+    def close(self):
+        self.websocket.__exit__(None, None, None)
+
+    def __enter__(self) -> "CDPClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,14 +1,12 @@
+import binascii
+import logging
 import os
-import time
 from typing import Dict, Optional, Union
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from utils import SaveResult
+from cdp_client import DEFAULT_DEBUGGER_ADDRESS, CDPClient, CDPError
+from metrics import add_bytes, span
+from utils import SaveBuffer, SaveResult
+
+logger = logging.getLogger(__name__)
 
 
 def save_from_web(save_to_disk: bool = True) -> Optional[Dict[str, Union[str, bytes]]]:
@@ -27,9 +25,18 @@ def save_from_web(save_to_disk: bool = True) -> Optional[Dict[str, Union[str, by
         "Extracting saves from the browser-based version does not work yet"
     )
 
+    # selenium is only needed for the web version, the Electron app uses CDP
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from webdriver_manager.chrome import ChromeDriverManager
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.chrome.options import Options
+
     download_path = os.getcwd()
-    print(f"Starting web save process...")
-    print(f"Download directory set to: {download_path}")
+    logger.info(f"Starting web save process...")
+    logger.info(f"Download directory set to: {download_path}")
 
     options = Options()
     options.binary_location = "path/to/browser.exe"
@@ -47,27 +54,112 @@ def save_from_web(save_to_disk: bool = True) -> Optional[Dict[str, Union[str, by
 
     driver = None
     try:
-        print("Launching browser and navigating to Bitburner...")
+        logger.info("Launching browser and navigating to Bitburner...")
         service = ChromeService(ChromeDriverManager().install())
         driver = webdriver.Chrome(service=service, options=options)
         driver.get("https://bitburner-official.github.io/")
 
-        print("Waiting for the game's UI to be rendered...")
+        logger.info("Waiting for the game's UI to be rendered...")
         WebDriverWait(driver, 30).until(
             EC.presence_of_element_located((By.ID, "terminal-input"))
         )
-        print("Game UI is ready.")
+        logger.info("Game UI is ready.")
     except Exception as e:
-        print(f"\nAn unexpected error occurred: {e}")
+        logger.error(f"\nAn unexpected error occurred: {e}")
         return None
     finally:
         if driver:
-            print("Closing browser.")
+            logger.info("Closing browser.")
             driver.quit()
 
 
+# bytes of the save per DevTools message, about 11 MB once base64 encoded
+EXPORT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Resolves to the file name, size and chunk count of the save, with the first
+# chunk base64 encoded. Larger saves stay in the page until all further chunks
+# are read with EXPORT_CHUNK_SCRIPT.
+EXPORT_SCRIPT = """
+(async () => {
+    if (typeof window.appSaveFns === 'undefined' ||
+        typeof window.appSaveFns.getSaveData !== 'function') {
+        throw new Error('getSaveData function not found. Is this the Electron version?');
+    }
+    const data = await window.appSaveFns.getSaveData();
+    const save = typeof data.save === 'string'
+        ? new TextEncoder().encode(data.save) : data.save;
+    const chunkSize = CHUNK_SIZE;
+    const chunk = (index) => {
+        const bytes = save.subarray(index * chunkSize, (index + 1) * chunkSize);
+        if (typeof bytes.toBase64 === 'function') {
+            return bytes.toBase64();
+        }
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        return btoa(binary);
+    };
+    const chunks = Math.max(1, Math.ceil(save.length / chunkSize));
+    if (chunks > 1) {
+        window.__saveSyncExport = chunk;
+    }
+    return {fileName: data.fileName, size: save.length, chunks: chunks, data: chunk(0)};
+})()
+""".replace("CHUNK_SIZE", str(EXPORT_CHUNK_SIZE))
+
+EXPORT_CHUNK_SCRIPT = "window.__saveSyncExport({index})"
+EXPORT_CLEANUP_SCRIPT = "delete window.__saveSyncExport"
+
+
+def read_save_data(game: CDPClient) -> tuple[str, SaveBuffer]:
+    """
+    Export the save from the game page.
+
+    The page sends the save base64 encoded, in chunks of EXPORT_CHUNK_SIZE
+    bytes, instead of as a JSON array with one number per byte. Chunks are
+    decoded into a single preallocated buffer, so only one encoded chunk is
+    held at a time.
+
+    Returns:
+        File name and the save as a read-only buffer
+
+    Raises:
+        CDPError: if the page has no save or the export fails
+    """
+    with span("export.get_save_data"):
+        info = game.evaluate(EXPORT_SCRIPT)
+    if not info or not info.get("fileName"):
+        raise CDPError("Could not retrieve valid save data or filename from the game")
+
+    size = info["size"]
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    with span("export.transfer"):
+        try:
+            offset = _decode_into(view, 0, info.pop("data"))
+            for index in range(1, info["chunks"]):
+                encoded = game.evaluate(
+                    EXPORT_CHUNK_SCRIPT.format(index=index), await_promise=False
+                )
+                offset = _decode_into(view, offset, encoded)
+        finally:
+            if info["chunks"] > 1:
+                game.evaluate(EXPORT_CLEANUP_SCRIPT, await_promise=False)
+    if offset != size:
+        raise CDPError(f"Received {offset} of {size} save bytes")
+    return info["fileName"], view.toreadonly()
+
+
+def _decode_into(view: memoryview, offset: int, encoded: str) -> int:
+    decoded = binascii.a2b_base64(encoded)
+    view[offset : offset + len(decoded)] = decoded
+    return offset + len(decoded)
+
+
 def save_from_electron(
     save_to_disk: bool = True,
+    game: Optional[CDPClient] = None,
 ) -> Optional[SaveResult]:
     """
     Connects to a running Bitburner Electron instance and exports the save file.
@@ -75,81 +167,48 @@ def save_from_electron(
 
     Args:
         save_to_disk (bool): Whether to save the data to disk. Defaults to True.
+        game (CDPClient): Open DevTools session to use, a new one is opened
+            and closed again if not given.
 
     Returns:
         dict or None: Returns a dict with save data if successful, otherwise None.
                      The dict contains 'fileName' and 'save' keys.
                      If save_to_disk is True, the file is also saved to disk.
     """
-    print("Starting Electron save process...")
-    debugger_address = "127.0.0.1:9222"
-    chrome_options = Options()
-    chrome_options.debugger_address = debugger_address
-
-    driver = None
+    logger.info("Starting Electron save process...")
+    own_session = game is None
     try:
-        print(f"Connecting to Bitburner instance at {debugger_address}...")
-
-        # manually load chromedriver version 122
-        chromedriver_path = os.path.join(
-            os.getcwd(), "chromedriver-win64", "chromedriver.exe"
-        )
-        service = ChromeService(executable_path=chromedriver_path)
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        print("Connected to Bitburner.")
-
-        # This script calls getSaveData() which returns a promise.
-        # execute_async_script waits for the promise to resolve by using the callback.
-        script = """
-            const callback = arguments[arguments.length - 1];
-            if (typeof window.appSaveFns !== 'undefined' && 
-                typeof window.appSaveFns.getSaveData === 'function') {
-                
-                window.appSaveFns.getSaveData()
-                    .then(result => callback({status: 'success', data: result}))
-                    .catch(error => callback({status: 'error', message: error.message}));
-            } else {
-                callback({status: 'error', message: 'getSaveData function not found. Is this the Electron version?'});
-            }
-        """
-        print("Executing Export Script...")
-        result = driver.execute_async_script(script)
-        print("done")
-
-        if result and result.get("status") == "success":
-            save_data_obj = result.get("data", {})
-            file_name = save_data_obj.get("fileName")
-            save_content = save_data_obj.get("save")
-
-            if not file_name or save_content is None:
-                print(
-                    "Error: Could not retrieve valid save data or filename from the game."
-                )
-                return None
+        if own_session:
+            logger.info(
+                f"Connecting to Bitburner instance at {DEFAULT_DEBUGGER_ADDRESS}..."
+            )
+            with span("export.connect"):
+                game = CDPClient.connect()
+            logger.info("Connected to Bitburner.")
 
-            if save_to_disk:
-                file_path = os.path.join(os.getcwd(), file_name)
-                print(f"Saving game to: {file_path}")
+        logger.info("Executing Export Script...")
+        file_name, save_bytes = read_save_data(game)
+        logger.info("done")
+        add_bytes("export.save", len(save_bytes))
 
-                with open(file_path, "wb") as f:
-                    f.write(bytes(save_content))
+        if save_to_disk:
+            file_path = os.path.join(os.getcwd(), file_name)
+            logger.info(f"Saving game to: {file_path}")
 
-                print("Save game exported successfully!")
+            with span("export.write"), open(file_path, "wb") as f:
+                f.write(save_bytes)
 
-            return save_data_obj
+            logger.info("Save game exported successfully!")
 
-        else:
-            error_message = result.get("message", "An unknown error occurred.")
-            print(f"Failed to export save game: {error_message}")
-            return None
+        return {"fileName": file_name, "save": save_bytes}
 
     except Exception as e:
-        print(f"An error occurred: {e}")
-        print(
+        logger.error(f"Failed to export save game: {e}")
+        logger.warning(
             "Please ensure the Bitburner Electron app is running with the flag: --remote-debugging-port=9222"
         )
         return None
 
     finally:
-        if driver:
-            driver.quit()
+        if own_session and game is not None:
+            game.close()
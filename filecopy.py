@@ -0,0 +1,145 @@
+import errno
+import logging
+import os
+from typing import BinaryIO
+
+from metrics import add_bytes
+
+logger = logging.getLogger(__name__)
+
+# bytes per copy_file_range/sendfile call, and buffer of the fallback copy
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# errors of a kernel copy that is not supported for this pair of files, e.g.
+# copy_file_range across file systems on older kernels or sendfile on macOS
+_UNSUPPORTED = {
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.ENOTSOCK,
+    errno.EBADF,
+}
+
+
+def _copy_file_range(src: BinaryIO, dst: BinaryIO, offset: int, size: int) -> int:
+    while offset < size:
+        count = os.copy_file_range(
+            src.fileno(),
+            dst.fileno(),
+            min(COPY_CHUNK_SIZE, size - offset),
+            offset,
+            offset,
+        )
+        if count == 0:
+            break
+        offset += count
+    return offset
+
+
+def _sendfile(src: BinaryIO, dst: BinaryIO, offset: int, size: int) -> int:
+    dst.seek(offset)
+    while offset < size:
+        count = os.sendfile(
+            dst.fileno(), src.fileno(), offset, min(COPY_CHUNK_SIZE, size - offset)
+        )
+        if count == 0:
+            break
+        offset += count
+    return offset
+
+
+def _buffered(src: BinaryIO, dst: BinaryIO, offset: int, size: int) -> int:
+    src.seek(offset)
+    dst.seek(offset)
+    buffer = memoryview(bytearray(min(COPY_CHUNK_SIZE, max(size - offset, 1))))
+    while offset < size:
+        count = src.readinto(buffer)
+        if not count:
+            break
+        dst.write(buffer[:count])
+        offset += count
+    return offset
+
+
+def copy_fd(src: BinaryIO, dst: BinaryIO, size: int) -> int:
+    """
+    Copy size bytes between two unbuffered files, inside the kernel if possible.
+
+    Tries os.copy_file_range (which can share extents or copy on the server
+    for network file systems), then os.sendfile, then a buffered copy. A
+    method that fails as unsupported hands over to the next one at the offset
+    it reached.
+
+    Returns:
+        Bytes copied, less than size if the source got shorter
+    """
+    offset = 0
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(("copy_file_range", _copy_file_range))
+    if hasattr(os, "sendfile"):
+        methods.append(("sendfile", _sendfile))
+    for name, method in methods:
+        try:
+            offset = method(src, dst, offset, size)
+            add_bytes(f"copy.{name}", offset)
+            return offset
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            logger.debug(f"{name} not supported here ({e}), falling back")
+            # the failed call copied nothing, earlier ones may have
+            offset = os.fstat(dst.fileno()).st_size
+    copied = _buffered(src, dst, offset, size)
+    add_bytes("copy.buffered", copied - offset)
+    return copied
+
+
+def copy_file(src_path: str, dst_path: str) -> int:
+    """
+    Copy a file atomically and durably.
+
+    The copy is written next to dst_path, fsynced and renamed over it, so
+    readers see either the old or the complete new file, even after a crash.
+
+    Returns:
+        Bytes copied
+
+    Raises:
+        IOError: if the source changed size while being copied
+    """
+    tmp_path = dst_path + ".tmp"
+    with open(src_path, "rb", buffering=0) as src:
+        size = os.fstat(src.fileno()).st_size
+        try:
+            with open(tmp_path, "wb", buffering=0) as dst:
+                copied = copy_fd(src, dst, size)
+                os.fsync(dst.fileno())
+            if copied != size:
+                raise IOError(f"{src_path} changed while copying it")
+            os.replace(tmp_path, dst_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+    fsync_directory(os.path.dirname(os.path.abspath(dst_path)))
+    return copied
+
+
+def fsync_directory(path: str):
+    """Persist a rename in path, where the platform supports it."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        # directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
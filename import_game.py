@@ -1,145 +1,217 @@
+import logging
 import argparse
-import glob
-import os
 import time
-import gzip
-import base64
-from typing import Union, Dict
-from utils import SaveResult
+import binascii
+from typing import Optional
+from cdp_client import CDPClient
+from metrics import add_bytes, span
+from utils import SaveBuffer, SaveResult, to_save_buffer
 
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service as ChromeService
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+logger = logging.getLogger(__name__)
 
 
 def get_driver(target: str):
-    """Initializes a robust Chrome driver for the specified target."""
-    chrome_options = Options()
-    if target == "electron":
-        chrome_options.debugger_address = "127.0.0.1:9222"
-        # Manually specify the path to chromedriver.exe for the Electron app
-        chromedriver_path = os.path.join(
-            os.getcwd(), "chromedriver-win64", "chromedriver.exe"
-        )
-        service = ChromeService(executable_path=chromedriver_path)
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        print("Connected to Bitburner")
-        return driver
+    """Initializes a Chrome driver for the web version (Electron uses CDPClient)."""
+    from selenium import webdriver
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from webdriver_manager.chrome import ChromeDriverManager
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
+    chrome_options = Options()
     raise NotImplementedError(
         "Importing saves to the browser-based version does not work yet"
     )
     service = ChromeService(ChromeDriverManager(driver_version="122").install())
     driver = webdriver.Chrome(service=service, options=chrome_options)
-    print("Navigating to Bitburner (Web)...")
+    logger.info("Navigating to Bitburner (Web)...")
     driver.get("https://bitburner-official.github.io/")
 
     try:
-        print("Waiting for game UI to be ready (max 60s)...")
+        logger.info("Waiting for game UI to be ready (max 60s)...")
         WebDriverWait(driver, 10).until(
             EC.visibility_of_element_located((By.ID, "terminal-input"))
         )
 
-        print("Terminal UI is visible")
+        logger.info("Terminal UI is visible")
         WebDriverWait(driver, 10).until(
             lambda d: d.execute_script(
                 "return typeof window.saveObject !== 'undefined' && "
                 "typeof window.saveObject.importGame === 'function'"
             )
         )
-        print("window.saveObject.importGame is ready")
+        logger.info("window.saveObject.importGame is ready")
 
     except TimeoutException as e:
-        print(
+        logger.error(
             f"Error: Game did not fully load or window.saveObject.importGame was not found in time. Details: {e}"
         )
         driver.quit()
         raise
     except Exception as e:
-        print(f"An unexpected error occurred during setup: {e}")
+        logger.error(f"An unexpected error occurred during setup: {e}")
         driver.quit()
         raise
 
     return driver
 
 
-def import_save_game(save: SaveResult):
-    driver = None
+# bytes of the save per DevTools message, about 11 MB once base64 encoded
+IMPORT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Allocates the buffer the save is assembled in. Chunks are appended with
+# IMPORT_CHUNK_SCRIPT and the finished save is pushed with IMPORT_COMMIT_SCRIPT.
+IMPORT_BEGIN_SCRIPT = """
+(() => {
+    if (typeof window.appSaveFns === 'undefined' ||
+        typeof window.appSaveFns.pushSaveData === 'undefined') {
+        throw new Error('window.appSaveFns.pushSaveData function not found.');
+    }
+    window.__saveSyncImport = {bytes: new Uint8Array(SAVE_SIZE), offset: 0};
+    return true;
+})()
+"""
+
+# decodes a base64 chunk in place, natively where setFromBase64 is available
+IMPORT_CHUNK_SCRIPT = """
+(() => {
+    const state = window.__saveSyncImport;
+    const data = "CHUNK_BASE64";
+    if (typeof state.bytes.setFromBase64 === 'function') {
+        state.offset += state.bytes.subarray(state.offset).setFromBase64(data).written;
+        return state.offset;
+    }
+    const binary = atob(data);
+    const bytes = state.bytes;
+    const offset = state.offset;
+    for (let i = 0; i < binary.length; i++) {
+        bytes[offset + i] = binary.charCodeAt(i);
+    }
+    state.offset += binary.length;
+    return state.offset;
+})()
+"""
+
+IMPORT_COMMIT_SCRIPT = """
+(() => {
+    const state = window.__saveSyncImport;
+    delete window.__saveSyncImport;
+    if (state.offset !== state.bytes.length) {
+        throw new Error(`Received ${state.offset} of ${state.bytes.length} save bytes`);
+    }
+    // not automatic to mimic manual import, not sure what the implications
+    // of automatic are
+    window.appSaveFns.pushSaveData(state.bytes, false);
+    return 'Import process initiated.';
+})()
+"""
+
+IMPORT_CLEANUP_SCRIPT = "delete window.__saveSyncImport"
+
+
+def push_save_data(game: CDPClient, save_bytes: SaveBuffer) -> str:
+    """
+    Send the save to the game page and pass it to pushSaveData.
+
+    The save is sent base64 encoded, in chunks of IMPORT_CHUNK_SIZE bytes,
+    into a buffer preallocated in the page, so neither side holds more than
+    one encoded chunk at a time. The game gets the save with a single
+    pushSaveData call once all chunks arrived.
+
+    Returns:
+        Message of the page script
+
+    Raises:
+        CDPError: if the page has no pushSaveData or a chunk got lost
+    """
+    size = len(save_bytes)
+    view = memoryview(save_bytes)
+    chunks = max(1, -(-size // IMPORT_CHUNK_SIZE))
+    game.evaluate(
+        IMPORT_BEGIN_SCRIPT.replace("SAVE_SIZE", str(size)), await_promise=False
+    )
     try:
-        driver = get_driver("electron")
-
-        # Read the save file content as binary and base64 encode it
-        gzipped_content = save.get("save")
-        assert isinstance(
-            gzipped_content, list
-        ), f"save_content is of type {type(gzipped_content)}"
-
-        # Base64 encode the gzipped content and then decode to a UTF-8 string
-        save_content = base64.b64encode(bytes(gzipped_content)).decode("utf-8")
-
-        print("Executing window.appSaveFns.pushSaveData...")
-        result = driver.execute_async_script(
-            """
-            const callback = arguments[arguments.length - 1];
-            const saveDataBase64 = arguments[0];
-
-            if (typeof window.appSaveFns === 'undefined' || typeof window.appSaveFns.pushSaveData === 'undefined') {
-                callback({status: 'error', message: 'window.appSaveFns.pushSaveData function not found.'});
-                return;
-            }
-
-            try {
-                // Decode base64 string to a Uint8Array
-                const binaryString = atob(saveDataBase64);
-                const bytes = new Uint8Array(binaryString.length);
-                for (let i = 0; i < binaryString.length; i++) {
-                    bytes[i] = binaryString.charCodeAt(i);
-                }
-
-                window.appSaveFns.pushSaveData(bytes, false); // not automatic to mimic manual import, not sure what the implications of automatic are
-                callback({status: 'success', message: 'Import process initiated.'});
-            } catch (error) {
-                console.error('JS: Error during base64 decode or pushSaveData:', error);
-                callback({status: 'error', message: 'Error decoding or pushing save data: ' + error.message});
-            }
-            """,
-            save_content,
-        )
+        with span("import.transfer"):
+            for index in range(chunks):
+                start = index * IMPORT_CHUNK_SIZE
+                chunk = view[start : start + IMPORT_CHUNK_SIZE]
+                encoded = binascii.b2a_base64(chunk, newline=False).decode("ascii")
+                script = IMPORT_CHUNK_SCRIPT.replace("CHUNK_BASE64", encoded)
+                del encoded
+                offset = game.evaluate(script, await_promise=False)
+                del script
+                if chunks > 1:
+                    logger.info(
+                        f"Sent {offset / 1024 / 1024:.1f} of "
+                        f"{size / 1024 / 1024:.1f} MB ({offset / size:.0%})"
+                    )
+        with span("import.push_save_data"):
+            return game.evaluate(IMPORT_COMMIT_SCRIPT, await_promise=False)
+    except Exception:
+        game.evaluate(IMPORT_CLEANUP_SCRIPT, await_promise=False)
+        raise
 
-        if result and result.get("status") == "success":
-            print(f"Successfully initiated save game import: {result.get('message')}")
-            print("Please confirm the import within the Bitburner game window.")
-        else:
-            error_message = result.get("message", "An unknown error occurred.")
-            print(f"Failed to import save game: {error_message}")
 
-        # After sending the file, the game will likely show a confirmation modal.
-        # We need to wait for this modal and confirm it.
-        print("Waiting for import confirmation modal...")
-        confirm_button = WebDriverWait(driver, 30).until(
-            EC.element_to_be_clickable(
-                (By.XPATH, "//button[contains(., 'Proceed with import')]")
-            )
-        )
-        confirm_button.click()
-        print("Import confirmed. Game should now reload.")
+# clicks the button of the import confirmation modal once it is shown
+CONFIRM_SCRIPT = """
+(() => {
+    const button = Array.from(document.querySelectorAll('button'))
+        .find(b => b.textContent.includes('Proceed with import'));
+    if (!button || button.disabled) {
+        return false;
+    }
+    button.click();
+    return true;
+})()
+"""
+
+CONFIRM_TIMEOUT = 30.0
+
+
+def import_save_game(save: SaveResult, game: Optional[CDPClient] = None):
+    """
+    Push a save into the running Electron app and confirm the import.
+
+    Args:
+        save: save to import
+        game: open DevTools session to use, a new one is opened and closed
+            again if not given
+    """
+    own_session = game is None
+    try:
+        if own_session:
+            with span("import.connect"):
+                game = CDPClient.connect()
+            logger.info("Connected to Bitburner")
 
-        # Give some time for the game to reload after import
-        time.sleep(5)
+        save_bytes = to_save_buffer(save.get("save"))
+        add_bytes("import.save", len(save_bytes))
+
+        logger.info("Executing window.appSaveFns.pushSaveData...")
+        message = push_save_data(game, save_bytes)
+        logger.info(f"Successfully initiated save game import: {message}")
+        logger.info("Please confirm the import within the Bitburner game window.")
+
+        # After sending the file, the game shows a confirmation modal.
+        # We need to wait for this modal and confirm it.
+        logger.info("Waiting for import confirmation modal...")
+        with span("import.confirm"):
+            deadline = time.monotonic() + CONFIRM_TIMEOUT
+            while not game.evaluate(CONFIRM_SCRIPT):
+                if time.monotonic() > deadline:
+                    raise TimeoutError("The import confirmation modal did not show up")
+                time.sleep(0.25)
+        logger.info("Import confirmed. Game should now reload.")
 
     except Exception as e:
-        print(f"An unexpected error occurred during import: {e}")
+        logger.error(f"An unexpected error occurred during import: {e}")
 
     finally:
-        if driver:
-            if "electron" == "web":
-                input("\nPress Enter to close the browser...")
-            driver.quit()
+        if own_session and game is not None:
+            game.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import cProfile
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+class Metrics:
+    """
+    Named timing spans and byte counters of a run.
+
+    Spans with the same name add up, e.g. every "sftp.read" of a sync. Spans
+    may be nested, each one measures its own wall time. When disabled, span()
+    and add_bytes() do nothing.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.spans: dict[str, dict[str, float]] = {}
+        self.counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the block under name."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """Decorator timing every call of a function as span name."""
+
+        def decorator(func: F) -> F:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorator
+
+    def add_bytes(self, name: str, count: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def _record(self, name: str, elapsed: float):
+        with self._lock:
+            entry = self.spans.get(name)
+            if entry is None:
+                self.spans[name] = {"count": 1, "total_s": elapsed, "max_s": elapsed}
+            else:
+                entry["count"] += 1
+                entry["total_s"] += elapsed
+                entry["max_s"] = max(entry["max_s"], elapsed)
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}
+            self.counters = {}
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "spans": {name: dict(entry) for name, entry in self.spans.items()},
+                "bytes": dict(self.counters),
+            }
+
+    def format_table(self) -> str:
+        data = self.to_dict()
+        lines = [f"{'span':<32} {'count':>6} {'total':>10} {'max':>10}"]
+        for name, entry in sorted(data["spans"].items()):
+            lines.append(
+                f"{name:<32} {entry['count']:>6} {entry['total_s'] * 1000:>8.1f}ms "
+                f"{entry['max_s'] * 1000:>8.1f}ms"
+            )
+        if data["bytes"]:
+            lines.append(f"{'bytes':<32} {'':>6} {'total':>10}")
+            for name, count in sorted(data["bytes"].items()):
+                lines.append(f"{name:<32} {'':>6} {count:>10}")
+        return "\n".join(lines)
+
+
+# metrics of the current process, disabled unless requested (e.g. --metrics)
+metrics = Metrics(enabled=False)
+span = metrics.span
+timed = metrics.timed
+add_bytes = metrics.add_bytes
+
+
+@contextmanager
+def profile(mode: Optional[str], output: Optional[str] = None) -> Iterator[None]:
+    """
+    Profile the block with cProfile or tracemalloc.
+
+    Args:
+        mode: "cprofile", "tracemalloc" or None to not profile
+        output: file for the cProfile stats (readable with pstats/snakeviz),
+            the top entries are written to stderr if not given
+    """
+    if mode is None:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}, expected {PROFILE_MODES}")
+
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+                logger.info(f"Wrote cProfile stats to {output}")
+            else:
+                stats = pstats.Stats(profiler, stream=sys.stderr)
+                stats.sort_stats("cumulative").print_stats(25)
+        return
+
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        sys.stderr.write(
+            f"tracemalloc: peak {peak / 1024 / 1024:.1f}MB, "
+            f"still allocated {current / 1024 / 1024:.1f}MB\n"
+        )
+        for stat in snapshot.statistics("lineno")[:15]:
+            sys.stderr.write(f"{stat}\n")
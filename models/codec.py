@@ -0,0 +1,115 @@
+import bz2
+import gzip
+import lzma
+from typing import Callable, Optional
+from utils import SaveBuffer
+
+# codec used when none is configured: keep the game's gzip output as received
+DEFAULT_CODEC = "gzip"
+
+
+class StorageCodec:
+    """
+    Compression used for stored payloads.
+
+    Saves arrive gzip compressed by the game. A codec may store them in another
+    format (trading CPU for size), and always hands them back as gzip.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        extension: str,
+        compress: Callable[[bytes], bytes],
+        decompress: Callable[[bytes], bytes],
+        passthrough: bool = False,
+    ) -> None:
+        """
+        Args:
+            name: codec spec as configured, e.g. "lzma-9"
+            extension: file extension of stored payloads, without the dot
+            compress: compresses raw (decompressed) save JSON
+            decompress: inverse of compress
+            passthrough: store the game's gzip bytes unchanged
+        """
+        self.name = name
+        self.extension = extension
+        self.compress = compress
+        self.decompress = decompress
+        self.passthrough = passthrough
+
+    @property
+    def is_gzip(self) -> bool:
+        return self.extension == "gz"
+
+    def encode(self, save_bytes: SaveBuffer) -> SaveBuffer:
+        """Turn the game's gzip save into the stored representation."""
+        if self.passthrough:
+            return save_bytes
+        return self.compress(gzip.decompress(save_bytes))
+
+    def decode(self, stored: bytes) -> bytes:
+        """Turn a stored payload back into the game's gzip format."""
+        if self.is_gzip:
+            return stored
+        return gzip.compress(self.decompress(stored))
+
+    def storage_name(self, file_name: str) -> str:
+        """Name of a stored payload, with the extension of this codec."""
+        stem = file_name[: -len(".gz")] if file_name.endswith(".gz") else file_name
+        return f"{stem}.{self.extension}"
+
+    def __repr__(self) -> str:
+        return f"StorageCodec({self.name})"
+
+
+def get_codec(spec: Optional[str]) -> StorageCodec:
+    """
+    Look up a codec by spec.
+
+    Specs are "gzip", "lzma" or "bz2", optionally followed by a compression
+    level, e.g. "gzip-9", "lzma-9", "bz2-9". Plain "gzip" stores the game's
+    output unchanged.
+
+    Raises:
+        ValueError: for unknown codecs or invalid levels
+    """
+    spec = spec or DEFAULT_CODEC
+    name, _, level_str = spec.partition("-")
+    try:
+        level = int(level_str) if level_str else None
+    except ValueError:
+        raise ValueError(f"Invalid compression level in codec {spec!r}")
+
+    if level is not None and not 0 <= level <= 9:
+        raise ValueError(f"Compression level of codec {spec!r} must be 0-9")
+
+    if name == "gzip":
+        gzip_level = 6 if level is None else level
+        return StorageCodec(
+            spec,
+            "gz",
+            lambda data: gzip.compress(data, compresslevel=gzip_level, mtime=0),
+            gzip.decompress,
+            passthrough=level is None,
+        )
+    if name == "lzma":
+        preset = 6 if level is None else level
+        return StorageCodec(
+            spec, "xz", lambda data: lzma.compress(data, preset=preset), lzma.decompress
+        )
+    if name == "bz2":
+        bz2_level = 9 if level is None else max(level, 1)
+        return StorageCodec(
+            spec, "bz2", lambda data: bz2.compress(data, bz2_level), bz2.decompress
+        )
+    raise ValueError(f"Unknown codec {spec!r}, expected gzip, lzma or bz2")
+
+
+def codec_for_file_name(file_name: str) -> StorageCodec:
+    """Codec able to read a stored file, guessed from its extension."""
+    for spec in ("lzma", "bz2"):
+        codec = get_codec(spec)
+        if file_name.endswith(f".{codec.extension}"):
+            return codec
+    return get_codec(DEFAULT_CODEC)
@@ -0,0 +1,70 @@
+import gzip
+import json
+from models.codec import StorageCodec
+from savegame import SaveMetadata
+
+# top-level key of the save object holding the sections (PlayerSave, AllServersSave, ...)
+SECTIONS_KEY = "data"
+
+
+def delta_file_name(sha256: str, extension: str = "gz") -> str:
+    """File name of a delta patch."""
+    return f"delta_{sha256}.json.{extension}"
+
+
+def is_delta_file_name(file_name: str) -> bool:
+    return file_name.startswith("delta_") and ".json." in file_name
+
+
+def make_patch(previous: dict, current: dict, metadata: SaveMetadata) -> dict:
+    """
+    Describe current as the changes to previous, per top-level save section.
+
+    Sections are stored whole when they changed and left out otherwise.
+
+    Args:
+        previous: parsed save object the patch applies to
+        current: parsed save object to encode
+        metadata: manifest entry of current, including its base
+
+    Returns:
+        The patch, to be stored with encode_patch()
+    """
+    previous_sections = previous[SECTIONS_KEY]
+    current_sections = current[SECTIONS_KEY]
+    return {
+        "metadata": metadata.to_dict(),
+        "outer": {k: v for k, v in current.items() if k != SECTIONS_KEY},
+        # full key order, so removed sections and ordering survive the round trip
+        "sections": list(current_sections),
+        "changed": {
+            key: value
+            for key, value in current_sections.items()
+            if key not in previous_sections or previous_sections[key] != value
+        },
+    }
+
+
+def apply_patch(previous: dict, patch: dict) -> dict:
+    """Rebuild the save object a patch was made from."""
+    previous_sections = previous[SECTIONS_KEY]
+    changed = patch["changed"]
+    sections = {
+        key: changed[key] if key in changed else previous_sections[key]
+        for key in patch["sections"]
+    }
+    return {**patch["outer"], SECTIONS_KEY: sections}
+
+
+def encode_patch(patch: dict, codec: StorageCodec) -> bytes:
+    return codec.compress(json.dumps(patch, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_patch(data: bytes, codec: StorageCodec) -> dict:
+    return json.loads(codec.decompress(data))
+
+
+def encode_save(save_json: dict) -> bytes:
+    """Serialize a parsed save object into the game's gzip format."""
+    text = json.dumps(save_json, separators=(",", ":"), ensure_ascii=False)
+    return gzip.compress(text.encode("utf-8"))
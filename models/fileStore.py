@@ -0,0 +1,466 @@
+import logging
+import json
+import lzma
+import zlib
+from abc import abstractmethod
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
+from CloudModel import CloudModel
+from metrics import timed
+from models.codec import DEFAULT_CODEC, codec_for_file_name, get_codec
+from models.delta import (
+    apply_patch,
+    decode_patch,
+    delta_file_name,
+    encode_patch,
+    encode_save,
+    is_delta_file_name,
+    make_patch,
+)
+from models.manifest import MANIFEST_NAME, Manifest
+from models.retention import RetentionPolicy
+from savegame import Savegame, SaveFile, SaveMetadata
+from utils import SaveBuffer, blob_file_name, is_blob_file_name, is_save_file_name
+
+logger = logging.getLogger(__name__)
+
+
+class FileStoreModel(CloudModel):
+    """
+    Base class for backends that keep every save as a file in one directory.
+
+    Subclasses only provide the file primitives. Uploads, latest lookups and
+    the manifest index (see models.manifest) are handled here, so "latest" and
+    "list history" are a single small read of the manifest file.
+    """
+
+    def __init__(
+        self,
+        dedup: bool = False,
+        delta_chain_length: int = 0,
+        codec: str = DEFAULT_CODEC,
+        retention: Optional[RetentionPolicy] = None,
+    ) -> None:
+        """
+        Args:
+            dedup: store payloads content-addressed by their SHA-256, so
+                uploading a save that is already stored only adds a manifest entry
+            delta_chain_length: store uploads as patches against the previous
+                save, with a full save after this many patches. 0 disables deltas.
+            codec: storage codec for new payloads, see models.codec.get_codec.
+                The default keeps the game's gzip output unchanged.
+            retention: prune the history with this policy after every upload
+        """
+        super().__init__()
+        self.dedup = dedup
+        self.delta_chain_length = delta_chain_length
+        self.codec = get_codec(codec)
+        self.retention = retention
+        self._manifest: Optional[Manifest] = None
+        # parsed save object of the last save uploaded or rebuilt in delta mode
+        self._cached_save_json: Optional[tuple[str, dict]] = None
+
+    @abstractmethod
+    def _read_file(self, name: str) -> bytes:
+        """Read a file from the store, raises FileNotFoundError if missing."""
+
+    @abstractmethod
+    def _write_file(self, name: str, data: SaveBuffer):
+        """Write a file to the store, replacing it atomically if it exists."""
+
+    @abstractmethod
+    def _list_files(self) -> list[str]:
+        """Names of all files in the store."""
+
+    @abstractmethod
+    def _delete_files(self, names: list[str]):
+        """Delete files from the store, ignoring files that are already gone."""
+
+    @abstractmethod
+    def _location(self, name: str) -> str:
+        """Human readable location of a file, used in messages."""
+
+    def _copy_file(self, name: str, source: SaveFile):
+        """Store a local file unchanged, backends may copy it without reading it."""
+        source.check_unchanged()
+        # a view of the mapped file, it is not read into memory first
+        self._write_file(name, source.map())
+
+    def _local_path(self, name: str) -> Optional[str]:
+        """Path of a stored file on the local file system, if it has one."""
+        return None
+
+    @contextmanager
+    def _session(self) -> Iterator[None]:
+        """Scope in which several primitives share one connection."""
+        yield
+
+    @timed("store.upload")
+    def upload_save(self, save: Savegame):
+        """
+        Store a Savegame and record it in the manifest.
+
+        Args:
+            save: Savegame object to store
+
+        Raises:
+            ValueError: if the save is truncated or corrupt, nothing is stored
+        """
+        try:
+            # a metadata_only load never read past PlayerSave
+            save.verify()
+            with self._session():
+                manifest = self.load_manifest()
+                metadata = save.metadata
+
+                existing = manifest.find_by_hash(save.sha256) if self.dedup else None
+                if existing is not None:
+                    logger.info(
+                        f"{save.file_name} is identical to the stored "
+                        f"{existing.file_name}, recording metadata only"
+                    )
+                    metadata.object_name = existing.storage_name
+                    metadata.base = existing.base
+                    metadata.codec = existing.codec
+                else:
+                    payload = self._encode_payload(save, metadata, manifest)
+                    logger.info(
+                        f"Saving game to: {self._location(metadata.storage_name)}"
+                    )
+                    if isinstance(payload, SaveFile):
+                        self._copy_file(metadata.storage_name, payload)
+                        size = payload.size
+                    else:
+                        self._write_file(metadata.storage_name, payload)
+                        size = len(payload)
+                    logger.info(f"Successfully saved {save.file_name} ({size} bytes)")
+
+                manifest.add(metadata)
+                self._write_manifest(manifest)
+
+        except Exception as e:
+            logger.error(f"Failed to save file: {e}")
+            raise
+
+        if self.retention is not None:
+            try:
+                self.prune(self.retention)
+            except Exception as e:
+                # the upload itself succeeded, pruning is retried next time
+                logger.error(f"Failed to prune history: {e}")
+
+    @timed("store.prune")
+    def prune(
+        self, policy: RetentionPolicy, dry_run: bool = False
+    ) -> list[SaveMetadata]:
+        """
+        Delete the saves a retention policy does not keep.
+
+        Saves that kept delta patches are based on are kept as well, and
+        deduplicated payloads are only deleted together with their last entry.
+        The manifest is written before any file is deleted, so it never lists
+        saves that are gone.
+
+        Args:
+            policy: which saves to keep
+            dry_run: only report what would be deleted
+
+        Returns:
+            Manifest entries of the deleted saves
+        """
+        with self._session():
+            manifest = self.load_manifest()
+            expired = {
+                entry.file_name for entry in policy.select_expired(manifest.entries)
+            }
+
+            # a kept delta needs its whole chain of bases to be rebuilt
+            for entry in manifest.entries:
+                if entry.file_name in expired:
+                    continue
+                while entry is not None and entry.base is not None:
+                    expired.discard(entry.base)
+                    entry = manifest.get(entry.base)
+
+            removed = [
+                entry for entry in manifest.entries if entry.file_name in expired
+            ]
+            if not removed or dry_run:
+                return removed
+
+            for entry in removed:
+                manifest.remove(entry.file_name)
+            still_used = {entry.storage_name for entry in manifest.entries}
+            files = sorted({entry.storage_name for entry in removed} - still_used)
+
+            self._write_manifest(manifest)
+            self._delete_files(files)
+
+        logger.info(
+            f"Pruned {len(removed)} saves ({len(files)} files), {len(manifest)} left"
+        )
+        return removed
+
+    @timed("store.latest_metadata")
+    def get_latest_metadata(self) -> Optional[SaveMetadata]:
+        """
+        Look up the latest save in the manifest without downloading it.
+
+        Returns:
+            SaveMetadata of the latest save, or None if no saves found
+        """
+        try:
+            latest = self.load_manifest().latest()
+            if latest is None:
+                logger.info("No Bitburner save files found.")
+            return latest
+
+        except Exception as e:
+            logger.error(f"Failed to retrieve latest save metadata: {e}")
+            return None
+
+    @timed("store.get_save")
+    def get_save(self, file_name: str) -> Optional[Savegame]:
+        """
+        Retrieve a single save from the store.
+
+        Args:
+            file_name: name of the save, as listed in the manifest
+
+        Returns:
+            Savegame object, or None if it could not be loaded
+        """
+        try:
+            with self._session():
+                entry = self._find_entry(file_name)
+                logger.info(f"Loading save: {file_name} ...")
+                if entry is not None and entry.base is not None:
+                    save_bytes = encode_save(self._load_save_json(entry))
+                elif entry is not None:
+                    codec = get_codec(entry.codec)
+                    local_path = self._local_path(entry.storage_name)
+                    if codec.is_gzip and local_path is not None:
+                        # stored as the game's gzip, later copies come from the file
+                        return Savegame.from_file(
+                            local_path, metadata_only=True, file_name=file_name
+                        )
+                    save_bytes = codec.decode(self._read_file(entry.storage_name))
+                else:
+                    save_bytes = self._read_file(file_name)
+
+            return Savegame.from_bytes(file_name, save_bytes, metadata_only=True)
+
+        except FileNotFoundError:
+            logger.warning(f"{file_name} is missing, manifest is stale")
+            self.rebuild_manifest()
+            return None
+        except Exception as e:
+            logger.error(f"Failed to retrieve save {file_name}: {e}")
+            return None
+
+    def get_latest_save(self) -> Optional[Savegame]:
+        """
+        Retrieve the latest save file according to the manifest.
+
+        Returns:
+            Savegame object, or None if no saves found
+        """
+        with self._session():
+            save = super().get_latest_save()
+            if save is None and self.get_latest_metadata() is not None:
+                # the manifest was stale and has been rebuilt, try once more
+                save = super().get_latest_save()
+            return save
+
+    def list_saves(self) -> list[SaveMetadata]:
+        """All stored saves, oldest first."""
+        with self._session():
+            return self.load_manifest().entries
+
+    @timed("store.load_manifest")
+    def load_manifest(self) -> Manifest:
+        """Read the manifest, rebuilding it if it is missing or unreadable."""
+        with self._session():
+            try:
+                self._manifest = Manifest.from_bytes(self._read_file(MANIFEST_NAME))
+                return self._manifest
+            except FileNotFoundError:
+                logger.info("No manifest found, rebuilding it...")
+            except ValueError as e:
+                logger.warning(f"{e}, rebuilding manifest...")
+            return self.rebuild_manifest()
+
+    def _encode_payload(
+        self, save: Savegame, metadata: SaveMetadata, manifest: Manifest
+    ) -> Union[SaveBuffer, SaveFile]:
+        """
+        Pick how a new save is stored, updating metadata to match.
+
+        Saves stored unchanged that came from a file are returned as that
+        file, to be copied instead of written from memory.
+        """
+        if self.delta_chain_length:
+            previous = manifest.latest()
+            if (
+                previous is not None
+                and previous.file_name != save.file_name
+                and previous.identifier == save.identifier
+                and manifest.chain_length(previous) < self.delta_chain_length
+            ):
+                try:
+                    previous_json = self._load_save_json(previous)
+                except (OSError, ValueError) as e:
+                    logger.warning(
+                        f"Cannot build delta against {previous.file_name}: {e}"
+                    )
+                else:
+                    metadata.base = previous.file_name
+                    metadata.object_name = delta_file_name(
+                        save.sha256, self.codec.extension
+                    )
+                    metadata.codec = self.codec.name
+                    patch = make_patch(previous_json, save.save_data_json, metadata)
+                    self._cached_save_json = (save.file_name, save.save_data_json)
+                    return encode_patch(patch, self.codec)
+
+            self._cached_save_json = (save.file_name, save.save_data_json)
+
+        if self.dedup:
+            metadata.object_name = blob_file_name(save.sha256, self.codec.extension)
+        elif self.codec.storage_name(save.file_name) != save.file_name:
+            metadata.object_name = self.codec.storage_name(save.file_name)
+        if not self.codec.passthrough:
+            metadata.codec = self.codec.name
+        elif save.source is not None:
+            return save.source
+        return self.codec.encode(save.save_data_bytes)
+
+    def _load_save_json(self, entry: SaveMetadata) -> dict:
+        """Parsed save object of an entry, applying its chain of delta patches."""
+        cached = self._cached_save_json
+        if cached is not None and cached[0] == entry.file_name:
+            return cached[1]
+
+        manifest = self._manifest or self.load_manifest()
+        chain = []
+        while entry.base is not None:
+            chain.append(entry)
+            base = manifest.get(entry.base)
+            if base is None:
+                raise ValueError(f"base {entry.base} of {entry.file_name} is missing")
+            entry = base
+
+        stored = self._read_file(entry.storage_name)
+        save_json = json.loads(get_codec(entry.codec).decompress(stored))
+        del stored
+        for patch_entry in reversed(chain):
+            patch = decode_patch(
+                self._read_file(patch_entry.storage_name), get_codec(patch_entry.codec)
+            )
+            save_json = apply_patch(save_json, patch)
+
+        if self.delta_chain_length:
+            self._cached_save_json = (
+                chain[0].file_name if chain else entry.file_name,
+                save_json,
+            )
+        return save_json
+
+    def _find_entry(self, file_name: str) -> Optional[SaveMetadata]:
+        # the manifest read by a preceding metadata lookup is usually current
+        if self._manifest is not None and file_name in self._manifest:
+            return self._manifest.get(file_name)
+        return self.load_manifest().get(file_name)
+
+    @timed("store.rebuild_manifest")
+    def rebuild_manifest(self, full: bool = False) -> Manifest:
+        """
+        Recreate the manifest from the files in the store.
+
+        Entries of the previous manifest are kept as long as their file still
+        exists, and only files it does not reference are read and hashed.
+
+        Args:
+            full: ignore the previous manifest and read every file. Original
+                file names of deduplicated saves cannot be recovered this way.
+
+        Returns:
+            The new manifest
+        """
+        with self._session():
+            files = self._list_files()
+            present = set(files)
+
+            previous = None if full else self._read_previous_manifest()
+            manifest = Manifest(
+                entry
+                for entry in (previous.entries if previous else [])
+                if entry.storage_name in present
+            )
+            referenced = {entry.storage_name for entry in manifest.entries}
+
+            for name in files:
+                if name in referenced:
+                    continue
+                if is_delta_file_name(name):
+                    # patches carry their own manifest entry
+                    try:
+                        patch = decode_patch(
+                            self._read_file(name), codec_for_file_name(name)
+                        )
+                        manifest.add(SaveMetadata.from_dict(patch["metadata"]))
+                    except (
+                        OSError,
+                        ValueError,
+                        KeyError,
+                        zlib.error,
+                        lzma.LZMAError,
+                    ) as e:
+                        logger.warning(f"Skipping {name}: {e}")
+                    continue
+                if not (is_save_file_name(name) or is_blob_file_name(name)):
+                    continue
+                codec = codec_for_file_name(name)
+                local_path = self._local_path(name)
+                try:
+                    if codec.is_gzip and local_path is not None:
+                        # scanned and hashed straight from the mapped file
+                        save = Savegame.from_file(
+                            local_path, metadata_only=True, file_name=name
+                        )
+                    else:
+                        save = Savegame.from_bytes(
+                            name,
+                            codec.decode(self._read_file(name)),
+                            metadata_only=True,
+                        )
+                except (OSError, ValueError, lzma.LZMAError) as e:
+                    logger.warning(f"Skipping {name}: {e}")
+                    continue
+
+                metadata = save.metadata
+                if not codec.is_gzip:
+                    metadata.file_name = name[: -len(codec.extension)] + "gz"
+                    metadata.object_name = name
+                    metadata.codec = codec.name
+                if is_blob_file_name(name):
+                    # the original file names only live in the manifest, so
+                    # recovered blobs are named after their lastSave
+                    metadata.file_name = f"bitburnerSave_{save.last_save // 1000}_{save.sha256[:8]}.json.gz"
+                    metadata.object_name = name
+                manifest.add(metadata)
+
+            self._write_manifest(manifest)
+
+        logger.info(f"Rebuilt manifest with {len(manifest)} saves")
+        return manifest
+
+    def _read_previous_manifest(self) -> Optional[Manifest]:
+        try:
+            return Manifest.from_bytes(self._read_file(MANIFEST_NAME))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_manifest(self, manifest: Manifest):
+        self._write_file(MANIFEST_NAME, manifest.to_bytes())
+        self._manifest = manifest
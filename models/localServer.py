@@ -1,24 +1,49 @@
+import logging
 import os
-import glob
 from typing import Optional
-from CloudModel import CloudModel
-from savegame import Savegame
-from utils import get_time_from_save_file
+from AsyncCloudModel import ThreadedCloudModel
+from filecopy import copy_file, fsync_directory
+from metrics import add_bytes, timed
+from models.codec import DEFAULT_CODEC
+from models.fileStore import FileStoreModel
+from models.retention import RetentionPolicy
+from savegame import SaveFile
+from utils import SaveBuffer
 
+logger = logging.getLogger(__name__)
 
-class LocalSaveServer(CloudModel):
+
+class LocalSaveServer(FileStoreModel):
     """
     CloudModel implementation using local filesystem for save storage.
     """
 
-    def __init__(self, save_path: str) -> None:
+    def __init__(
+        self,
+        save_path: str,
+        dedup: bool = False,
+        delta_chain_length: int = 0,
+        codec: str = DEFAULT_CODEC,
+        retention: Optional[RetentionPolicy] = None,
+    ) -> None:
         """
         Initialize local save model.
 
         Args:
             save_path: Local directory path for save files
+            dedup: Store identical saves only once (content-addressed)
+            delta_chain_length: Store saves as patches against the previous one,
+                with a full save every this many uploads (0 disables deltas)
+            codec: Storage codec, e.g. "gzip-9", "lzma" or "bz2" (default keeps
+                the game's gzip output unchanged)
+            retention: Prune the history with this policy after every upload
         """
-        super().__init__()
+        super().__init__(
+            dedup=dedup,
+            delta_chain_length=delta_chain_length,
+            codec=codec,
+            retention=retention,
+        )
         self.save_path = save_path
         self._ensure_save_directory()
 
@@ -27,62 +52,64 @@ class LocalSaveServer(CloudModel):
         if not os.path.exists(self.save_path):
             try:
                 os.makedirs(self.save_path)
-                print(f"Created save directory: {self.save_path}")
+                logger.info(f"Created save directory: {self.save_path}")
             except Exception as e:
-                print(f"Failed to create save directory {self.save_path}: {e}")
+                logger.error(f"Failed to create save directory {self.save_path}: {e}")
                 raise
 
-    def upload_save(self, save: Savegame):
-        """
-        Save a Savegame to the local directory.
-
-        Args:
-            save: Savegame object to save
-        """
-        file_name = save.file_name
-        save_content = save.save_data_bytes
-        assert isinstance(
-            save_content, list
-        ), f"save_content is of type {type(save_content)}"
-
-        file_path = os.path.join(self.save_path, file_name)
-
+    def _location(self, name: str) -> str:
+        return os.path.join(self.save_path, name)
+
+    @timed("local.read")
+    def _read_file(self, name: str) -> bytes:
+        with open(self._location(name), "rb") as f:
+            data = f.read()
+        add_bytes("local.read", len(data))
+        return data
+
+    @timed("local.write")
+    def _write_file(self, name: str, data: SaveBuffer):
+        # write next to the target, fsync and rename, as copy_file does, so
+        # readers never see a partial file, even after a crash
+        file_path = self._location(name)
+        tmp_path = file_path + ".tmp"
         try:
-            print(f"Saving game to: {file_path}")
-            save_bytes = bytes(save_content)
-            with open(file_path, "wb") as f:
-                f.write(save_bytes)
-            print(f"Successfully saved {file_name} ({len(save_bytes)} bytes)")
-
-        except Exception as e:
-            print(f"Failed to save file: {e}")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             raise
+        fsync_directory(self.save_path)
+        add_bytes("local.written", len(data))
 
-    def get_latest_save(self) -> Optional[Savegame]:
-        """
-        Retrieve the latest save file from the local directory.
+    @timed("local.copy")
+    def _copy_file(self, name: str, source: SaveFile):
+        # kernel-side copy, the save does not pass through Python memory
+        source.check_unchanged()
+        add_bytes("local.copied", copy_file(source.path, self._location(name)))
 
-        Returns:
-            Savegame object, or None if no saves found
-        """
-        try:
-            # get all save files from save dir
-            file_pattern = os.path.join(self.save_path, "bitburnerSave_*.json*")
-            list_of_files = glob.glob(file_pattern)
+    def _local_path(self, name: str) -> Optional[str]:
+        return self._location(name)
 
-            if not list_of_files:
-                print("No Bitburner save files found in local directory.")
-                return None
+    @timed("local.delete")
+    def _delete_files(self, names: list[str]):
+        for name in names:
+            try:
+                os.remove(self._location(name))
+            except FileNotFoundError:
+                pass
 
-            latest_file_path = max(
-                list_of_files, key=lambda f: get_time_from_save_file(f)
-            )
-            latest_file_name = os.path.basename(latest_file_path)
+    @timed("local.list")
+    def _list_files(self) -> list[str]:
+        return os.listdir(self.save_path)
 
-            print(f"Loading latest save: {latest_file_name} ...")
 
-            return Savegame.from_file(latest_file_path)
+class AsyncLocalSaveServer(ThreadedCloudModel):
+    """LocalSaveServer as AsyncCloudModel, takes the same arguments."""
 
-        except Exception as e:
-            print(f"Failed to retrieve latest save: {e}")
-            return None
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(LocalSaveServer(*args, **kwargs))
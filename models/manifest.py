@@ -0,0 +1,93 @@
+import json
+from typing import Iterable, Optional
+from savegame import SaveMetadata
+from utils import get_time_from_save_file
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+class Manifest:
+    """
+    Index of all saves stored by a backend.
+
+    Lets a backend answer "latest" and "list history" with a single small read
+    instead of listing the directory and parsing every file name.
+    """
+
+    def __init__(self, entries: Iterable[SaveMetadata] = ()) -> None:
+        self._entries: dict[str, SaveMetadata] = {}
+        for entry in entries:
+            self.add(entry)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Manifest":
+        """
+        Parse a manifest file.
+
+        Raises:
+            ValueError: if the manifest is malformed or has an unknown version
+        """
+        try:
+            content = json.loads(data)
+            if content.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"unsupported version {content.get('version')}")
+            return cls(SaveMetadata.from_dict(entry) for entry in content["saves"])
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Error parsing manifest: {e}")
+
+    def to_bytes(self) -> bytes:
+        content = {
+            "version": MANIFEST_VERSION,
+            "saves": [entry.to_dict() for entry in self.entries],
+        }
+        return json.dumps(content, separators=(",", ":")).encode("utf-8")
+
+    def add(self, entry: SaveMetadata):
+        """Add an entry, replacing any previous entry with the same file name."""
+        self._entries[entry.file_name] = entry
+
+    def remove(self, file_name: str) -> Optional[SaveMetadata]:
+        return self._entries.pop(file_name, None)
+
+    def get(self, file_name: str) -> Optional[SaveMetadata]:
+        return self._entries.get(file_name)
+
+    def find_by_hash(self, sha256: str) -> Optional[SaveMetadata]:
+        """An entry whose payload has this hash, if any."""
+        for entry in self._entries.values():
+            if entry.sha256 == sha256:
+                return entry
+        return None
+
+    def chain_length(self, entry: SaveMetadata) -> int:
+        """Number of delta patches between an entry and its full base."""
+        length = 0
+        while entry.base is not None:
+            base = self._entries.get(entry.base)
+            if base is None:
+                raise ValueError(f"base {entry.base} of {entry.file_name} is missing")
+            entry = base
+            length += 1
+        return length
+
+    @property
+    def entries(self) -> list[SaveMetadata]:
+        """All entries, oldest first."""
+        return sorted(self._entries.values(), key=_sort_key)
+
+    def latest(self) -> Optional[SaveMetadata]:
+        if not self._entries:
+            return None
+        return max(self._entries.values(), key=_sort_key)
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _sort_key(entry: SaveMetadata) -> tuple[int, int]:
+    # same ordering the backends used when scanning file names
+    return get_time_from_save_file(entry.file_name), entry.last_save
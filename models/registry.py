@@ -0,0 +1,151 @@
+import importlib
+import json
+import os
+from typing import Any, Optional
+
+from CloudModel import CloudModel
+from models.retention import RetentionPolicy
+
+# config files looked up in the working directory when --config is not given
+DEFAULT_CONFIG_FILES = ("saveSync.toml", "saveSync.json")
+
+# used without a config file
+DEFAULT_BACKEND = {"type": "local", "save_path": "savegames"}
+
+# backend types and the class implementing them as "module:attribute". Modules
+# are only imported once a backend of their type is built, so a local sync
+# does not pay for loading paramiko.
+_BACKENDS: dict[str, str] = {
+    "local": "models.localServer:LocalSaveServer",
+    "sftp": "models.sftpServer:SFTPCloudServer",
+    "replicated": "models.replicated:ReplicatedCloudModel",
+}
+
+
+def register_backend(name: str, target: str):
+    """
+    Make a backend type available in config files.
+
+    Args:
+        name: value of "type" in the config
+        target: class as "module:attribute", imported on first use. Its
+            constructor gets the other keys of the backend table.
+    """
+    if ":" not in target:
+        raise ValueError(f"Backend target must be 'module:attribute', got {target!r}")
+    _BACKENDS[name] = target
+
+
+def backend_types() -> list[str]:
+    return sorted(_BACKENDS)
+
+
+def _load_class(backend_type: str) -> type:
+    try:
+        target = _BACKENDS[backend_type]
+    except KeyError:
+        raise ValueError(
+            f"Unknown backend type {backend_type!r}, "
+            f"expected one of: {', '.join(backend_types())}"
+        ) from None
+    module_name, attribute = target.split(":", 1)
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def build_backend(config: dict[str, Any], base_dir: str = ".") -> CloudModel:
+    """
+    Instantiate the backend described by a config table.
+
+    "type" selects the backend, all other keys are passed to its constructor.
+    Relative save_path and private_key_path entries are resolved against
+    base_dir, "retention" may be given as a spec like "1d:1h,30d:1d" and the
+    "replicas" of a replicated backend are backend tables themselves.
+
+    Raises:
+        ValueError: for unknown types or invalid options
+    """
+    options = dict(config)
+    backend_type = options.pop("type", None)
+    if backend_type is None:
+        raise ValueError("Backend config needs a 'type'")
+
+    for key in ("save_path", "private_key_path"):
+        if options.get(key):
+            options[key] = os.path.join(base_dir, os.path.expanduser(options[key]))
+    if isinstance(options.get("retention"), str):
+        options["retention"] = RetentionPolicy.from_spec(options["retention"])
+    if "replicas" in options:
+        options["replicas"] = {
+            name: build_backend(replica, base_dir)
+            for name, replica in options["replicas"].items()
+        }
+
+    backend_class = _load_class(backend_type)
+    try:
+        return backend_class(**options)
+    except TypeError as e:
+        raise ValueError(f"Invalid options for backend {backend_type!r}: {e}") from e
+
+
+def load_config(path: str) -> dict[str, Any]:
+    """
+    Read a TOML or JSON config file, depending on its extension.
+
+    Raises:
+        ValueError: if the file cannot be parsed
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    loads = _toml_loads() if path.endswith(".toml") else json.loads
+    try:
+        return loads(data.decode("utf-8"))
+    except ValueError as e:
+        raise ValueError(f"Invalid config file {path}: {e}") from e
+
+
+def _toml_loads():
+    try:
+        import tomllib
+    except ImportError:
+        # tomllib is new in Python 3.11, tomli is the same parser for older ones
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ValueError(
+                "TOML config files need Python 3.11+ or the tomli package, "
+                "use a .json config instead"
+            ) from None
+    return tomllib.loads
+
+
+def find_config(directory: str) -> Optional[str]:
+    for name in DEFAULT_CONFIG_FILES:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def backend_from_config(path: Optional[str] = None) -> CloudModel:
+    """
+    Backend of a config file, or of the first default config in the working
+    directory. Without any config, saves go to ./savegames.
+
+    The backend is the "backend" table of the file, for example:
+
+        [backend]
+        type = "sftp"
+        hostname = "url-to-server.com"
+        username = "username"
+        private_key_path = "~/.ssh/id_rsa"
+        remote_path = "/bitburner_saves"
+    """
+    if path is None:
+        path = find_config(os.getcwd())
+    if path is None:
+        return build_backend(DEFAULT_BACKEND, os.getcwd())
+
+    config = load_config(path)
+    if "backend" not in config:
+        raise ValueError(f"No [backend] table in {path}")
+    return build_backend(config["backend"], os.path.dirname(os.path.abspath(path)))
@@ -0,0 +1,211 @@
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional, TypeVar
+from CloudModel import CloudModel
+from models.manifest import Manifest
+from models.retention import RetentionPolicy
+from savegame import Savegame, SaveMetadata
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ReplicatedCloudModel(CloudModel):
+    """
+    CloudModel storing every save on several backends.
+
+    Uploads go to all replicas in parallel and succeed once write_quorum of them
+    stored the save; the remaining uploads finish in the background. Lookups
+    ask all replicas at once and use the newest answer, replicas behind it are
+    reported as lagging.
+    """
+
+    def __init__(
+        self, replicas: dict[str, CloudModel], write_quorum: Optional[int] = None
+    ) -> None:
+        """
+        Args:
+            replicas: backends by name, e.g. {"nas": LocalSaveServer(...), ...}
+            write_quorum: replicas that must store an upload for it to succeed,
+                defaults to a majority
+        """
+        super().__init__()
+        if not replicas:
+            raise ValueError("ReplicatedCloudModel needs at least one replica")
+        if write_quorum is None:
+            write_quorum = len(replicas) // 2 + 1
+        if not 1 <= write_quorum <= len(replicas):
+            raise ValueError(
+                f"write_quorum must be between 1 and {len(replicas)}, got {write_quorum}"
+            )
+
+        self.replicas = replicas
+        self.write_quorum = write_quorum
+        # names of replicas that missed an upload or returned an older latest save
+        self.lagging: set[str] = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(replicas), thread_name_prefix="replica"
+        )
+        # backends keep state between calls, a replica only runs one call at a time
+        self._locks = {name: threading.Lock() for name in replicas}
+        self._latest_source: Optional[str] = None
+
+    def _submit(self, name: str, call: Callable[[CloudModel], T]) -> Future:
+        def run() -> T:
+            with self._locks[name]:
+                return call(self.replicas[name])
+
+        return self._executor.submit(run)
+
+    def _fan_out(self, call: Callable[[CloudModel], T]) -> dict[str, Future]:
+        return {name: self._submit(name, call) for name in self.replicas}
+
+    def upload_save(self, save: Savegame):
+        """
+        Upload a save to all replicas.
+
+        Raises:
+            ValueError: if the save is truncated or corrupt
+            RuntimeError: if fewer than write_quorum replicas stored the save
+        """
+        # verify and hash once here, not in several threads at once
+        save.verify()
+        save.compute_sha256()
+        futures = self._fan_out(lambda replica: replica.upload_save(save))
+        names = {future: name for name, future in futures.items()}
+
+        stored, failed = 0, 0
+        pending = set(names)
+        while pending and stored < self.write_quorum:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = names[future]
+                if future.exception() is None:
+                    stored += 1
+                else:
+                    failed += 1
+                    self.lagging.add(name)
+                    logger.error(
+                        f"Upload to replica {name} failed: {future.exception()}"
+                    )
+
+        for future in pending:
+            future.add_done_callback(self._on_late_upload(names[future]))
+
+        if stored < self.write_quorum:
+            raise RuntimeError(
+                f"Save stored on {stored} of {len(self.replicas)} replicas, "
+                f"write quorum is {self.write_quorum}"
+            )
+        logger.info(
+            f"Save stored on {stored} of {len(self.replicas)} replicas"
+            + (f", {len(pending)} still uploading" if pending else "")
+        )
+
+    def _on_late_upload(self, name: str) -> Callable[[Future], None]:
+        def done(future: Future):
+            if future.exception() is not None:
+                self.lagging.add(name)
+                logger.error(f"Upload to replica {name} failed: {future.exception()}")
+
+        return done
+
+    def get_latest_metadata(self) -> Optional[SaveMetadata]:
+        """Latest save over all replicas, updating the lagging replicas."""
+        latest_by_replica: dict[str, Optional[SaveMetadata]] = {}
+        for name, future in self._fan_out(
+            lambda replica: replica.get_latest_metadata()
+        ).items():
+            try:
+                latest_by_replica[name] = future.result()
+            except Exception as e:
+                logger.warning(f"Replica {name} is unavailable: {e}")
+                latest_by_replica[name] = None
+
+        available = {n: m for n, m in latest_by_replica.items() if m is not None}
+        if not available:
+            self._latest_source = None
+            return None
+
+        self._latest_source = max(available, key=lambda n: available[n].last_save)
+        latest = available[self._latest_source]
+        self.lagging = {
+            name
+            for name, meta in latest_by_replica.items()
+            if meta is None or meta.last_save < latest.last_save
+        }
+        if self.lagging:
+            lagging = ", ".join(sorted(self.lagging))
+            logger.warning(f"Replicas behind the latest save: {lagging}")
+        return latest
+
+    def get_save(self, file_name: str) -> Optional[Savegame]:
+        """Download a save, from the replica with the newest save first."""
+        names = sorted(self.replicas, key=lambda name: name != self._latest_source)
+        for name in names:
+            try:
+                save = self._submit(name, lambda r: r.get_save(file_name)).result()
+            except Exception as e:
+                logger.error(f"Replica {name} failed to load {file_name}: {e}")
+                continue
+            if save is not None:
+                return save
+        return None
+
+    def list_saves(self) -> list[SaveMetadata]:
+        """Saves stored on any replica, oldest first."""
+        saves: dict[str, SaveMetadata] = {}
+        for name, future in self._fan_out(lambda replica: replica.list_saves()).items():
+            try:
+                for meta in future.result():
+                    saves.setdefault(meta.file_name, meta)
+            except Exception as e:
+                logger.warning(f"Replica {name} is unavailable: {e}")
+        return sorted(saves.values(), key=lambda meta: (meta.last_save, meta.file_name))
+
+    def prune(
+        self, policy: RetentionPolicy, dry_run: bool = False
+    ) -> list[SaveMetadata]:
+        """
+        Prune the history of every replica with the same policy.
+
+        Returns:
+            Entries deleted from any replica
+        """
+        removed: dict[str, SaveMetadata] = {}
+        futures = self._fan_out(lambda replica: replica.prune(policy, dry_run=dry_run))
+        for name, future in futures.items():
+            try:
+                for meta in future.result():
+                    removed.setdefault(meta.file_name, meta)
+            except Exception as e:
+                logger.error(f"Failed to prune replica {name}: {e}")
+        return sorted(
+            removed.values(), key=lambda meta: (meta.last_save, meta.file_name)
+        )
+
+    def rebuild_manifest(self, full: bool = False) -> Manifest:
+        """
+        Rebuild the manifest of every replica from its own files.
+
+        Returns:
+            Entries of all rebuilt manifests, one per file name
+        """
+        merged = Manifest()
+        futures = self._fan_out(lambda replica: replica.rebuild_manifest(full=full))
+        for name, future in futures.items():
+            try:
+                for meta in future.result().entries:
+                    if merged.get(meta.file_name) is None:
+                        merged.add(meta)
+            except Exception as e:
+                logger.error(f"Failed to rebuild the manifest of replica {name}: {e}")
+        return merged
+
+    def close(self):
+        """Wait for background uploads, then close all replicas."""
+        self._executor.shutdown(wait=True)
+        for replica in self.replicas.values():
+            replica.close()
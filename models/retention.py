@@ -0,0 +1,120 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from savegame import SaveMetadata
+
+# keep everything for an hour, then hourly for a day, daily for a month,
+# weekly for a year and monthly after that
+DEFAULT_RETENTION = "1h:all,1d:1h,30d:1d,1y:1w,forever:30d"
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "y": 365 * 86400}
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdwy])$")
+
+
+def parse_duration(text: str) -> float:
+    """Parse durations like 90s, 1h, 30d or 1y into seconds."""
+    match = _DURATION.match(text.strip())
+    if match is None:
+        raise ValueError(f"Invalid duration {text!r}, expected e.g. 1h, 30d or 1y")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+@dataclass
+class RetentionTier:
+    # saves younger than this (seconds) fall into the tier, None for no limit
+    max_age: Optional[float]
+    # one save is kept per interval (seconds), None keeps all of them
+    interval: Optional[float]
+
+
+class RetentionPolicy:
+    """
+    Grandfather-father-son retention of stored saves.
+
+    Every save falls into the first tier it is younger than. Within a tier,
+    only the newest save of every interval is kept, and saves older than the
+    last tier are dropped. Tiers apply per game identifier, and the latest save
+    of every game is always kept.
+    """
+
+    def __init__(self, tiers: list[RetentionTier]) -> None:
+        if not tiers:
+            raise ValueError("A retention policy needs at least one tier")
+        ages = [tier.max_age for tier in tiers]
+        if None in ages[:-1]:
+            raise ValueError("Only the last retention tier can be unlimited")
+        finite = [age for age in ages if age is not None]
+        if finite != sorted(finite):
+            raise ValueError("Retention tiers must be ordered by age")
+        self.tiers = tiers
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "RetentionPolicy":
+        """
+        Parse a policy like "1h:all,1d:1h,30d:1d,forever:30d".
+
+        Every comma separated tier is AGE:INTERVAL, keeping one save per
+        INTERVAL for saves younger than AGE. AGE may be "forever" and INTERVAL
+        may be "all" to keep every save.
+
+        Raises:
+            ValueError: for malformed specs
+        """
+        tiers = []
+        for part in spec.split(","):
+            age, sep, interval = part.strip().partition(":")
+            if not sep:
+                raise ValueError(
+                    f"Invalid retention tier {part!r}, expected AGE:INTERVAL"
+                )
+            tiers.append(
+                RetentionTier(
+                    max_age=None if age == "forever" else parse_duration(age),
+                    interval=None if interval == "all" else parse_duration(interval),
+                )
+            )
+        return cls(tiers)
+
+    def _tier(self, age: float) -> Optional[int]:
+        for index, tier in enumerate(self.tiers):
+            if tier.max_age is None or age < tier.max_age:
+                return index
+        return None
+
+    def select_expired(
+        self, entries: Iterable[SaveMetadata], now: Optional[float] = None
+    ) -> list[SaveMetadata]:
+        """
+        Saves the policy does not keep.
+
+        Args:
+            entries: stored saves
+            now: reference time in seconds, defaults to the current time
+        """
+        now = time.time() if now is None else now
+        newest_first = sorted(entries, key=lambda entry: entry.last_save, reverse=True)
+
+        seen_games: set[str] = set()
+        seen_buckets: set[tuple] = set()
+        expired = []
+        for entry in newest_first:
+            if entry.identifier not in seen_games:
+                seen_games.add(entry.identifier)
+                continue
+
+            age = max(now - entry.last_save / 1000, 0)
+            index = self._tier(age)
+            if index is None:
+                expired.append(entry)
+                continue
+            interval = self.tiers[index].interval
+            if interval is None:
+                continue
+
+            bucket = (entry.identifier, index, int(entry.last_save / 1000 // interval))
+            if bucket in seen_buckets:
+                expired.append(entry)
+            else:
+                seen_buckets.add(bucket)
+        return expired
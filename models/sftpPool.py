@@ -0,0 +1,146 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+import paramiko
+
+
+class PooledConnection:
+    def __init__(self, sftp: paramiko.SFTPClient, ssh: paramiko.SSHClient) -> None:
+        self.sftp = sftp
+        self.ssh = ssh
+        self.last_used = time.monotonic()
+
+    @property
+    def is_active(self) -> bool:
+        transport = self.ssh.get_transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        try:
+            self.sftp.close()
+        finally:
+            self.ssh.close()
+
+
+class SFTPConnectionPool:
+    """
+    Keeps authenticated SFTP sessions open so calls do not repeat the SSH handshake.
+
+    Connections are handed out exclusively via connection() and returned to the
+    pool afterwards. Idle connections get SSH keepalives, and are health checked
+    before reuse; dead connections are dropped and replaced transparently.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], tuple[paramiko.SFTPClient, paramiko.SSHClient]],
+        max_size: int = 2,
+        keepalive_interval: int = 30,
+        health_check_after: float = 60.0,
+        max_idle: float = 600.0,
+    ) -> None:
+        """
+        Args:
+            connect: opens a new authenticated (sftp, ssh) pair
+            max_size: maximum number of idle connections kept open
+            keepalive_interval: seconds between SSH keepalive packets, 0 disables
+            health_check_after: idle seconds after which a connection is probed
+                with a round trip before it is reused
+            max_idle: idle seconds after which a connection is closed instead of reused
+        """
+        self._connect = connect
+        self.max_size = max_size
+        self.keepalive_interval = keepalive_interval
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+        self._idle: list[PooledConnection] = []
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """Borrow a connection for the duration of the block."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def reconnect(self, conn: PooledConnection):
+        """Replace a borrowed connection that dropped with a new one, in place."""
+        self._discard(conn)
+        conn.sftp, conn.ssh = self._open()
+        conn.last_used = time.monotonic()
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Fraction of borrowed connections that did not need a new handshake."""
+        total = self.stats["created"] + self.stats["reused"]
+        return self.stats["reused"] / total if total else 0.0
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def __enter__(self) -> "SFTPConnectionPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _acquire(self) -> PooledConnection:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn = self._idle.pop()
+            if self._is_healthy(conn):
+                self.stats["reused"] += 1
+                return conn
+            self._discard(conn)
+
+        return PooledConnection(*self._open())
+
+    def _open(self) -> tuple[paramiko.SFTPClient, paramiko.SSHClient]:
+        sftp, ssh = self._connect()
+        transport = ssh.get_transport()
+        if transport is not None and self.keepalive_interval:
+            transport.set_keepalive(self.keepalive_interval)
+        self.stats["created"] += 1
+        return sftp, ssh
+
+    def _release(self, conn: PooledConnection):
+        if not conn.is_active:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if not conn.is_active:
+            return False
+        idle_for = time.monotonic() - conn.last_used
+        if idle_for > self.max_idle:
+            return False
+        if idle_for > self.health_check_after:
+            # the transport can look active while the server already dropped us
+            try:
+                conn.sftp.normalize(".")
+            except (paramiko.SSHException, EOFError, OSError):
+                return False
+        return True
+
+    def _discard(self, conn: PooledConnection):
+        self.stats["discarded"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,13 +1,75 @@
+import hashlib
+import logging
 import os
+import threading
+import time
 import paramiko
-from typing import Optional
-from io import BytesIO
-from CloudModel import CloudModel
-from savegame import Savegame
-from utils import get_time_from_save_file
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+from paramiko.common import DEFAULT_WINDOW_SIZE
+from paramiko.message import Message
+from paramiko.sftp import (
+    CMD_DATA,
+    CMD_READ,
+    CMD_REMOVE,
+    CMD_STATUS,
+    CMD_WRITE,
+    SFTPError,
+    int64,
+)
+from AsyncCloudModel import ThreadedCloudModel
+from metrics import add_bytes, timed
+from models.codec import DEFAULT_CODEC
+from models.fileStore import FileStoreModel
+from models.manifest import Manifest
+from models.retention import RetentionPolicy
+from savegame import SaveMetadata
+from models.sftpPool import SFTPConnectionPool
+from utils import SaveBuffer
 
+logger = logging.getLogger(__name__)
 
-class SFTPCloudServer(CloudModel):
+# remove requests sent before waiting for their responses
+DELETE_BATCH_SIZE = 64
+
+# bytes per read/write request, servers accept at least 32 KB
+DEFAULT_BLOCK_SIZE = 32768
+# read/write requests in flight before waiting for the oldest response
+DEFAULT_MAX_REQUESTS = 64
+
+# part files of interrupted uploads older than this are deleted by prune and
+# rebuild_manifest, younger ones may still be resumed or be written elsewhere
+STALE_PART_AGE = 24 * 3600
+
+# errors of a dropped connection, transfers reconnect and resume after these
+# and after any OSError once the transport is no longer active
+CONNECTION_ERRORS = (paramiko.SSHException, EOFError, ConnectionError, TimeoutError)
+
+
+class _Response:
+    """
+    Receives the response to one pipelined request.
+
+    paramiko hands responses that arrive while it waits for another request
+    to the object the request was registered with. Requests registered as
+    type(None), as paramiko does for its own pipelined writes, lose those
+    responses, and waiting for them later never returns.
+    """
+
+    # paramiko only keeps weak references to pending requests
+    __slots__ = ("type", "msg", "__weakref__")
+
+    def __init__(self) -> None:
+        self.type: Optional[int] = None
+        self.msg: Optional[Message] = None
+
+    def _async_response(self, t: int, msg: Message, num: int):
+        self.type = t
+        self.msg = msg
+
+
+class SFTPCloudServer(FileStoreModel):
     """
     CloudModel implementation using SFTP for network drive access.
 
@@ -22,6 +84,16 @@ class SFTPCloudServer(CloudModel):
         private_key_path: Optional[str] = None,
         port: int = 22,
         remote_path: str = "/bitburner_saves",
+        pool_size: int = 2,
+        keepalive_interval: int = 30,
+        dedup: bool = False,
+        delta_chain_length: int = 0,
+        codec: str = DEFAULT_CODEC,
+        retention: Optional[RetentionPolicy] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_requests: int = DEFAULT_MAX_REQUESTS,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+        max_resumes: int = 3,
     ):
         """
         Initialize SFTP connection parameters.
@@ -33,15 +105,46 @@ class SFTPCloudServer(CloudModel):
             private_key_path: Path to private key file (if using key auth)
             port: SSH port (default 22)
             remote_path: Remote directory path for save files
+            pool_size: Number of idle connections kept open between calls
+            keepalive_interval: Seconds between SSH keepalives on open connections
+            dedup: Store identical saves only once (content-addressed)
+            delta_chain_length: Store saves as patches against the previous one,
+                with a full save every this many uploads (0 disables deltas)
+            codec: Storage codec, e.g. "gzip-9", "lzma" or "bz2" (default keeps
+                the game's gzip output unchanged)
+            retention: Prune the history with this policy after every upload
+            block_size: Bytes per read or write request
+            max_requests: Requests in flight per transfer, together with
+                block_size this should cover bandwidth times round trip time
+            window_size: SSH channel window in bytes, limits the data in
+                flight regardless of max_requests
+            max_resumes: Reconnects per transfer after a dropped connection
         """
-        super().__init__()
+        super().__init__(
+            dedup=dedup,
+            delta_chain_length=delta_chain_length,
+            codec=codec,
+            retention=retention,
+        )
         self.hostname = hostname
         self.username = username
         self.password = password
         self.private_key_path = private_key_path
         self.port = port
         self.remote_path = remote_path
+        self.block_size = block_size
+        self.max_requests = max_requests
+        self.window_size = window_size
+        self.max_resumes = max_resumes
+        self._pool = SFTPConnectionPool(
+            self._get_sftp_client,
+            max_size=pool_size,
+            keepalive_interval=keepalive_interval,
+        )
+        # connection used by the active _session() of each thread
+        self._local = threading.local()
 
+    @timed("sftp.connect")
     def _get_sftp_client(self) -> tuple[paramiko.SFTPClient, paramiko.SSHClient]:
         """Create and return an SFTP client connection with SSH client."""
         ssh = paramiko.SSHClient()
@@ -62,7 +165,9 @@ class SFTPCloudServer(CloudModel):
                 password=self.password,
             )
 
-        sftp = ssh.open_sftp()
+        sftp = paramiko.SFTPClient.from_transport(
+            ssh.get_transport(), window_size=self.window_size
+        )
         return sftp, ssh
 
     def _ensure_remote_directory(self, sftp: paramiko.SFTPClient):
@@ -72,101 +177,321 @@ class SFTPCloudServer(CloudModel):
             # directory does not exist, create it
             try:
                 sftp.mkdir(self.remote_path)
-                print(f"Created remote directory: {self.remote_path}")
+                logger.info(f"Created remote directory: {self.remote_path}")
             except Exception as e:
-                print(f"Failed to create remote directory {self.remote_path}: {e}")
+                logger.error(
+                    f"Failed to create remote directory {self.remote_path}: {e}"
+                )
                 raise
 
-    def upload_save(self, save: Savegame):
+    @property
+    def connection_stats(self) -> dict[str, float]:
+        """How often a pooled connection was reused versus newly created."""
+        return {**self._pool.stats, "reuse_ratio": self._pool.reuse_ratio}
+
+    def close(self):
+        """Close all pooled connections."""
+        stats = self._pool.stats
+        if stats["created"]:
+            logger.info(
+                f"SFTP connections: {stats['created']} created, {stats['reused']} reused"
+            )
+        self._pool.close()
+
+    @contextmanager
+    def _session(self) -> Iterator[paramiko.SFTPClient]:
+        """Borrow one pooled connection for all file operations inside the block."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn.sftp
+            return
+
+        with self._pool.connection() as conn:
+            self._local.conn = conn
+            try:
+                yield conn.sftp
+            finally:
+                self._local.conn = None
+
+    def _reconnect(self) -> paramiko.SFTPClient:
+        """Replace the dropped connection of the active session."""
+        conn = self._local.conn
+        self._pool.reconnect(conn)
+        return conn.sftp
+
+    def _remote_file_path(self, name: str) -> str:
+        return os.path.join(self.remote_path, name).replace("\\", "/")
+
+    def _location(self, name: str) -> str:
+        return f"{self.hostname}:{self._remote_file_path(name)}"
+
+    @timed("sftp.read")
+    def _read_file(self, name: str) -> bytes:
+        remote_file_path = self._remote_file_path(name)
+        with self._session() as sftp:
+            buffer = bytearray(sftp.stat(remote_file_path).st_size)
+            self._resumable(
+                name,
+                sftp,
+                0,
+                lambda sftp, offset: self._read_blocks(
+                    sftp, remote_file_path, memoryview(buffer), offset
+                ),
+            )
+        add_bytes("sftp.read", len(buffer))
+        return bytes(buffer)
+
+    @timed("sftp.write")
+    def _write_file(self, name: str, data: SaveBuffer):
+        remote_file_path = self._remote_file_path(name)
+        view = memoryview(data)
+        # uploads go to a part file named after the content and are renamed
+        # when complete, so readers never see a partial file and a retry, or
+        # the next run, only resumes a part file holding the same bytes
+        digest = hashlib.blake2b(view, digest_size=8).hexdigest()
+        part_path = f"{remote_file_path}.{digest}.part"
+
+        def write(sftp: paramiko.SFTPClient, offset: int) -> Iterator[int]:
+            return self._write_blocks(sftp, part_path, view, offset)
+
+        with self._session() as sftp:
+            offset = self._part_size(sftp, part_path, len(view))
+            if offset:
+                logger.info(f"Resuming upload of {name} at {offset} bytes")
+            try:
+                sftp = self._resumable(name, sftp, offset, write)
+            except FileNotFoundError:
+                self._ensure_remote_directory(sftp)
+                sftp = self._resumable(name, sftp, 0, write)
+
+            try:
+                sftp.posix_rename(part_path, remote_file_path)
+            except IOError:
+                # server without the posix-rename extension
+                try:
+                    sftp.remove(remote_file_path)
+                except FileNotFoundError:
+                    pass
+                sftp.rename(part_path, remote_file_path)
+        add_bytes("sftp.written", len(view))
+
+    def _part_size(self, sftp: paramiko.SFTPClient, part_path: str, size: int) -> int:
+        """Bytes of an earlier, interrupted upload to resume from."""
+        try:
+            part_size = sftp.stat(part_path).st_size
+        except FileNotFoundError:
+            return 0
+        return part_size if part_size <= size else 0
+
+    def _resumable(
+        self,
+        name: str,
+        sftp: paramiko.SFTPClient,
+        offset: int,
+        transfer: Callable[[paramiko.SFTPClient, int], Iterator[int]],
+    ) -> paramiko.SFTPClient:
         """
-        Upload a save file to the SFTP server.
+        Run a block transfer, reconnecting and resuming after a dropped connection.
 
-        Args:
-            save: Savegame object to upload
+        transfer(sftp, offset) continues the transfer at offset and yields
+        the offset it would resume from after every completed request.
+
+        Returns:
+            The connection the transfer completed on
         """
-        remote_file_path = os.path.join(self.remote_path, save.file_name).replace(
-            "\\", "/"
-        )
+        resumes = 0
+        while True:
+            try:
+                for offset in transfer(sftp, offset):
+                    pass
+                return sftp
+            except Exception as e:
+                if not self._is_dropped(e) or resumes >= self.max_resumes:
+                    raise
+                resumes += 1
+                logger.warning(
+                    f"Transfer of {name} interrupted at {offset} bytes ({e}), "
+                    "reconnecting..."
+                )
+                sftp = self._reconnect()
 
-        sftp = None
-        ssh = None
-        try:
-            sftp, ssh = self._get_sftp_client()
-            self._ensure_remote_directory(sftp)
+    def _is_dropped(self, error: Exception) -> bool:
+        """Whether an error means the connection of the active session is gone."""
+        if isinstance(error, CONNECTION_ERRORS):
+            return True
+        # paramiko reports writes to a closed channel as a plain OSError
+        return isinstance(error, OSError) and not self._local.conn.is_active
 
-            print(f"Uploading save to SFTP: {self.hostname}:{remote_file_path}")
+    def _read_blocks(
+        self, sftp: paramiko.SFTPClient, path: str, view: memoryview, offset: int
+    ) -> Iterator[int]:
+        """
+        Read a file into view from offset on, with up to max_requests reads
+        in flight. Short reads are requested again for the missing part.
+        """
+        size = len(view)
+        with sftp.open(path, "rb") as f:
+            pending: deque[tuple[_Response, int, int]] = deque()
+            next_offset = offset
+            while next_offset < size or pending:
+                while next_offset < size and len(pending) < self.max_requests:
+                    length = min(self.block_size, size - next_offset)
+                    response = self._request(
+                        sftp, CMD_READ, f.handle, int64(next_offset), length
+                    )
+                    pending.append((response, next_offset, length))
+                    next_offset += length
 
-            save_bytes = bytes(save.save_data_bytes)
-            with BytesIO(save_bytes) as file_obj:
-                sftp.putfo(file_obj, remote_file_path)
+                response, start, length = pending.popleft()
+                try:
+                    self._wait(sftp, response)
+                except EOFError:
+                    # an SFTP EOF status, not a dropped connection
+                    raise IOError(f"{path} is shorter than {size} bytes") from None
+                if response.type != CMD_DATA:
+                    raise SFTPError("Expected data")
+                data = response.msg.get_binary()
+                view[start : start + len(data)] = data
+                if len(data) < length:
+                    start, length = start + len(data), length - len(data)
+                    response = self._request(
+                        sftp, CMD_READ, f.handle, int64(start), length
+                    )
+                    pending.append((response, start, length))
+                yield min((start for _, start, _ in pending), default=next_offset)
 
-            print(f"Successfully uploaded {save.file_name} ({len(save_bytes)} bytes)")
+    @staticmethod
+    def _request(sftp: paramiko.SFTPClient, t: int, *args) -> _Response:
+        """Send a request without waiting, its response is read by _wait."""
+        response = _Response()
+        sftp._async_request(response, t, *args)
+        return response
 
-        except Exception as e:
-            print(f"Failed to upload save file: {e}")
-            raise
-        finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
+    @staticmethod
+    def _wait(sftp: paramiko.SFTPClient, response: _Response) -> _Response:
+        """
+        Read responses until this one arrived, raising for error statuses.
+        Responses to other pipelined requests are kept by their own _Response.
+        """
+        while response.type is None:
+            sftp._read_response()
+        if response.type == CMD_STATUS:
+            sftp._convert_status(response.msg)
+        return response
 
-    def get_latest_save(self) -> Optional[Savegame]:
+    def _write_blocks(
+        self, sftp: paramiko.SFTPClient, path: str, view: memoryview, offset: int
+    ) -> Iterator[int]:
+        """
+        Write view to a file from offset on, with up to max_requests writes
+        in flight.
         """
-        Retrieve the latest save file from the SFTP server.
+        size = len(view)
+        with sftp.open(path, "r+b" if offset else "wb") as f:
+            pending: deque[tuple[_Response, int]] = deque()
+            next_offset = offset
+            while next_offset < size or pending:
+                while next_offset < size and len(pending) < self.max_requests:
+                    block = view[next_offset : next_offset + self.block_size]
+                    response = self._request(
+                        sftp, CMD_WRITE, f.handle, int64(next_offset), bytes(block)
+                    )
+                    pending.append((response, next_offset))
+                    next_offset += len(block)
 
-        Returns:
-            Savegame object, or None if no saves found
+                response, _ = pending.popleft()
+                if self._wait(sftp, response).type != CMD_STATUS:
+                    raise SFTPError("Expected status")
+                yield pending[0][1] if pending else next_offset
+
+    def prune(
+        self, policy: RetentionPolicy, dry_run: bool = False
+    ) -> list[SaveMetadata]:
+        with self._session():
+            removed = super().prune(policy, dry_run=dry_run)
+            if not dry_run:
+                self._delete_stale_parts()
+        return removed
+
+    def rebuild_manifest(self, full: bool = False) -> Manifest:
+        with self._session():
+            self._delete_stale_parts()
+            return super().rebuild_manifest(full=full)
+
+    def _delete_stale_parts(self):
         """
-        sftp = None
-        ssh = None
+        Delete the part files of uploads interrupted more than STALE_PART_AGE
+        ago. They are only resumed by an upload of the same bytes, which in
+        watch mode or RFA ingestion rarely comes.
+        """
+        cutoff = time.time() - STALE_PART_AGE
         try:
-            sftp, ssh = self._get_sftp_client()
+            with self._session() as sftp:
+                stale = [
+                    entry.filename
+                    for entry in sftp.listdir_attr(self.remote_path)
+                    if entry.filename.endswith(".part")
+                    and entry.st_mtime is not None
+                    and entry.st_mtime < cutoff
+                ]
+                if stale:
+                    logger.info(
+                        f"Deleting {len(stale)} part files of interrupted uploads"
+                    )
+                    self._delete_files(stale)
+        except FileNotFoundError:
+            # nothing uploaded yet, so nothing to clean up
+            logger.debug(f"Remote directory {self.remote_path} does not exist yet")
+        except (OSError, paramiko.SSHException) as e:
+            logger.warning(f"Failed to delete stale part files: {e}")
 
-            # get files from remote directory
+    @timed("sftp.delete")
+    def _delete_files(self, names: list[str]):
+        """
+        Delete files with pipelined requests.
+
+        Up to DELETE_BATCH_SIZE remove requests are sent before their responses
+        are read, so a batch costs about one round trip instead of one per file.
+        """
+        with self._session() as sftp:
+            for start in range(0, len(names), DELETE_BATCH_SIZE):
+                batch = names[start : start + DELETE_BATCH_SIZE]
+                requests = [
+                    (
+                        name,
+                        self._request(
+                            sftp,
+                            CMD_REMOVE,
+                            sftp._adjust_cwd(self._remote_file_path(name)),
+                        ),
+                    )
+                    for name in batch
+                ]
+                # read every response, so none is left pending on the connection
+                errors = []
+                for name, request in requests:
+                    try:
+                        self._wait(sftp, request)
+                    except FileNotFoundError:
+                        pass
+                    except IOError as e:
+                        errors.append(f"{name}: {e}")
+                if errors:
+                    raise IOError(f"Failed to delete {', '.join(errors)}")
+
+    @timed("sftp.list")
+    def _list_files(self) -> list[str]:
+        with self._session() as sftp:
             try:
-                files = sftp.listdir(self.remote_path)
+                return sftp.listdir(self.remote_path)
             except FileNotFoundError:
-                print(f"Remote directory {self.remote_path} not found.")
-                return None
-
-            save_files = [
-                f
-                for f in files
-                if f.startswith("bitburnerSave_") and f.endswith(".json.gz")
-            ]
-
-            if not save_files:
-                print("No Bitburner save files found on SFTP server.")
-                return None
-
-            # filter latest save
-            latest_file_name = max(save_files, key=lambda f: get_time_from_save_file(f))
-            remote_file_path = os.path.join(self.remote_path, latest_file_name).replace(
-                "\\", "/"
-            )
-
-            print(f"Downloading latest save: {latest_file_name}")
+                # an empty store, e.g. before the first upload
+                logger.debug(f"Remote directory {self.remote_path} not found.")
+                return []
 
-            with BytesIO() as file_obj:
-                sftp.getfo(remote_file_path, file_obj)
-                file_content = file_obj.getvalue()
 
-            # Create Savegame object from downloaded data
-            save_content = list(file_content)
-            save_result = {"fileName": latest_file_name, "save": save_content}
-            savegame = Savegame(save_result)
+class AsyncSFTPCloudServer(ThreadedCloudModel):
+    """SFTPCloudServer as AsyncCloudModel, takes the same arguments."""
 
-            print(
-                f"Successfully downloaded {latest_file_name} ({len(save_content)} bytes)"
-            )
-            return savegame
-
-        except Exception as e:
-            print(f"Failed to retrieve latest save: {e}")
-            return None
-        finally:
-            if sftp:
-                sftp.close()
-            if ssh:
-                ssh.close()
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(SFTPCloudServer(*args, **kwargs))
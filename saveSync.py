@@ -1,15 +1,26 @@
 import argparse
+import asyncio
+import json
+import logging
 import os
 import time
 import re
 
+from AsyncCloudModel import ThreadedCloudModel
 from CloudModel import CloudModel
-from export_game import save_from_electron
-from import_game import import_save_game
-from models.localServer import LocalSaveServer
-from models.sftpServer import SFTPCloudServer
-from savegame import Savegame
-from typing import Optional
+from metrics import PROFILE_MODES, metrics, profile, span, timed
+from models.registry import backend_from_config
+from models.retention import DEFAULT_RETENTION, RetentionPolicy
+from savegame import Savegame, SaveMetadata
+from typing import TYPE_CHECKING, Optional
+from utils import is_save_file_name
+
+# the automation modules pull in websockets and selenium, they are only
+# imported when the running app is synced
+if TYPE_CHECKING:
+    from cdp_client import CDPClient
+
+logger = logging.getLogger(__name__)
 
 
 def update_save_file_timestamp(path: str):
@@ -34,71 +45,303 @@ def replace_unix_timestamp(file_name: str, new_timestamp: int) -> str:
     return new_file_name
 
 
-def get_local_save(args) -> Optional[Savegame]:
-    if args.command == "app" and args.auto:
-        save_result = save_from_electron()
+def uses_electron(args) -> bool:
+    """Whether saves are exported from / imported into a running Electron app."""
+    return args.command in ("app", "watch") and args.auto
+
+
+@timed("sync.get_local_save")
+def get_local_save(args, game: Optional["CDPClient"] = None) -> Optional[Savegame]:
+    if uses_electron(args):
+        from export_game import save_from_electron
+
+        # watch mode polls the game, don't leave an export file behind every time
+        save_result = save_from_electron(
+            save_to_disk=args.command != "watch", game=game
+        )
         if save_result:
-            return Savegame(save_result)
+            return Savegame(save_result, metadata_only=True)
         return None
-    elif (args.command == "app" and not args.auto) or args.command == "web":
-        return Savegame.from_file(args.save_file)
+    elif args.command in ("app", "web", "watch"):
+        return Savegame.from_file(args.save_file, metadata_only=True)
     else:
         raise ValueError("Invalid command")
 
 
-def set_local_save(args, cloud_save: Savegame):
+@timed("sync.set_local_save")
+def set_local_save(args, cloud_save: Savegame, game: Optional["CDPClient"] = None):
     """Set local save from cloud save."""
-    if args.command == "app" and args.auto:
-        import_save_game(cloud_save.to_save_result())
-        print("Successfully imported save game directly into Bitburner")
+    if uses_electron(args):
+        from import_game import import_save_game
+
+        import_save_game(cloud_save.to_save_result(), game=game)
+        logger.info("Successfully imported save game directly into Bitburner")
         return
 
-    if (args.command == "app" and not args.auto) or args.command == "web":
+    if args.command in ("app", "web", "watch"):
         new_save_path = replace_unix_timestamp(args.save_file, int(time.time()))
         cloud_save.save_to_file(new_save_path)
     else:
         raise ValueError("Invalid command")
-    print(
+    logger.info(
         f"Successfully saved savegame to {new_save_path}. Now you need to import it in Bitburner (Options -> Import Game)"
     )
 
 
-def main(args, cloud_model: CloudModel):
-    print("Retreiving local save from Bitburner")
-    local_save = get_local_save(args)
-    assert local_save is not None
-    local_time = local_save.progression_timestamp
+def print_history(cloud_model: CloudModel):
+    saves = cloud_model.list_saves()
+    if not saves:
+        print("No saves stored.")
+        return
+    for meta in saves:
+        print(
+            f"{meta.file_name}  lastSave={meta.last_save_readable}  id={meta.identifier}  "
+            f"size={meta.size}  sha256={meta.sha256[:12]}"
+        )
 
-    print("Retreiving latest save from server...")
-    cloud_save = cloud_model.get_latest_save()
-    if cloud_save:
-        cloud_time = cloud_save.progression_timestamp
-    else:
-        cloud_time = 0  # No cloud save exists
 
-    print(
+def prune_history(cloud_model: CloudModel, policy: RetentionPolicy, dry_run: bool):
+    removed = cloud_model.prune(policy, dry_run=dry_run)
+    if not removed:
+        print("Nothing to prune.")
+        return
+    for meta in removed:
+        action = "would delete" if dry_run else "deleted"
+        print(f"{action} {meta.file_name}  lastSave={meta.last_save_readable}")
+
+
+def log_saves(local_save: Savegame, cloud_meta: Optional[SaveMetadata]):
+    logger.info(
         f"Local save: {local_save.file_name} (timestamp: {local_save.last_save_readable})"
     )
-    if cloud_save:
-        print(
-            f"Cloud save: {cloud_save.file_name} (timestamp: {cloud_save.last_save_readable})"
+    if cloud_meta:
+        logger.info(
+            f"Cloud save: {cloud_meta.file_name} (timestamp: {cloud_meta.last_save_readable})"
         )
     else:
-        print("Cloud save: No cloud save found")
+        logger.info("Cloud save: No cloud save found")
+
+
+def sync(
+    args,
+    cloud_model: CloudModel,
+    local_save: Savegame,
+    cloud_meta: Optional[SaveMetadata],
+    game: Optional["CDPClient"] = None,
+) -> Optional[SaveMetadata]:
+    """
+    Upload or download depending on which save is newer.
+
+    Returns:
+        Metadata of the cloud save after the sync
+    """
+    local_time = local_save.progression_timestamp
+    if cloud_meta:
+        cloud_time = cloud_meta.last_save
+    else:
+        cloud_time = 0  # No cloud save exists
+
+    log_saves(local_save, cloud_meta)
 
-    # compare local save with cloud save using Savegame comparison
+    # compare local save with cloud save using the lastSave timestamps,
+    # the cloud payload is only downloaded when it actually wins
     if local_time > cloud_time:
-        print("Local save is newer, uploading...")
+        logger.info("Local save is newer, uploading...")
+        try:
+            # the compare only read PlayerSave, check the rest before it spreads
+            local_save.verify()
+        except ValueError as e:
+            logger.error(f"Not uploading {local_save.file_name}: {e}")
+            return cloud_meta
         cloud_model.upload_save(local_save)
-    elif local_time < cloud_time and cloud_save is not None:
-        print("Cloud save is newer, updating...")
-        set_local_save(args, cloud_save)
+        return local_save.metadata
+    elif local_time < cloud_time and cloud_meta is not None:
+        logger.info("Cloud save is newer, downloading...")
+        cloud_save = cloud_model.get_save(cloud_meta.file_name)
+        if cloud_save is None:
+            logger.error("Failed to download the cloud save, nothing was changed.")
+            return cloud_meta
+        set_local_save(args, cloud_save, game)
     else:
-        print("Saves are equal according to lastSave timestamp, nothing to do.")
+        logger.info("Saves are equal according to lastSave timestamp, nothing to do.")
+    return cloud_meta
+
+
+async def sync_async(
+    args,
+    cloud_model: ThreadedCloudModel,
+    local_save: Savegame,
+    cloud_meta: Optional[SaveMetadata],
+    game: Optional["CDPClient"] = None,
+) -> Optional[SaveMetadata]:
+    """sync() in a worker thread, with the blocking model of a ThreadedCloudModel."""
+    return await cloud_model.run(
+        lambda model: sync(args, model, local_save, cloud_meta, game)
+    )
+
+
+async def main(args, cloud_model: ThreadedCloudModel):
+    game = None
+    if uses_electron(args):
+        from cdp_client import CDPClient, CDPError
+
+        # one DevTools session for the export and a possible import
+        try:
+            with span("sync.connect_game"):
+                game = await asyncio.to_thread(CDPClient.connect)
+        except CDPError as e:
+            logger.error(str(e))
+            return
+
+    try:
+        # the export from the game and the cloud lookup are independent, so the
+        # sync waits for the slower of the two instead of both in a row
+        logger.info(
+            "Retreiving local save from Bitburner and latest save metadata from server..."
+        )
+        with span("sync.fetch_state"):
+            local_save, cloud_meta = await asyncio.gather(
+                asyncio.to_thread(get_local_save, args, game),
+                cloud_model.get_latest_metadata(),
+            )
+        assert local_save is not None
+
+        await sync_async(args, cloud_model, local_save, cloud_meta, game)
+    finally:
+        if game is not None:
+            game.close()
+
+
+def snapshot_save_dir(save_dir: str) -> dict[str, tuple[float, int]]:
+    """mtime and size of every save file in a directory."""
+    snapshot = {}
+    with os.scandir(save_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and is_save_file_name(entry.name):
+                stat = entry.stat()
+                snapshot[entry.path] = (stat.st_mtime, stat.st_size)
+    return snapshot
+
+
+def watch(args, cloud_model: CloudModel):
+    """
+    Keep syncing until interrupted.
+
+    Polls the export directory (or the running Electron app with --auto) every
+    --interval seconds. New files in the directory are synced once they have
+    settled for --debounce seconds, app saves as soon as their lastSave changes.
+    The backend connection and the last known cloud metadata are kept between
+    cycles, as is the DevTools session with the app in --auto mode. The cloud
+    is re-checked every --cloud-interval seconds so saves
+    uploaded from other devices are picked up as well.
+    """
+    logger.info("Retreiving latest save metadata from server...")
+    cloud_meta = cloud_model.get_latest_metadata()
+    cloud_checked = time.monotonic()
+    # lastSave of the local save as of the last sync
+    synced_time: Optional[int] = None
+
+    snapshot: dict[str, tuple[float, int]] = {}
+    changed_at: Optional[float] = None
+    game: Optional["CDPClient"] = None
+    if not args.auto:
+        logger.info(f"Watching {args.save_dir} for new saves (Ctrl+C to stop)")
+    else:
+        logger.info("Polling the running Bitburner app for new saves (Ctrl+C to stop)")
+
+    try:
+        while True:
+            try:
+                now = time.monotonic()
+                local_save = None
+                cloud_is_newer = False
+
+                if args.auto:
+                    if game is None:
+                        from cdp_client import CDPClient
+
+                        game = CDPClient.connect()
+                    local_save = get_local_save(args, game)
+                    if local_save is None:
+                        # the app may have been restarted, reconnect next cycle
+                        game.close()
+                        game = None
+                else:
+                    current = snapshot_save_dir(args.save_dir)
+                    if current != snapshot:
+                        snapshot = current
+                        changed_at = now
+                    elif changed_at is not None and now - changed_at >= args.debounce:
+                        changed_at = None
+                        if snapshot:
+                            args.save_file = max(snapshot, key=lambda p: snapshot[p][0])
+                            local_save = get_local_save(args, game)
+
+                local_changed = (
+                    local_save is not None and local_save.last_save != synced_time
+                )
+                if local_changed or now - cloud_checked >= args.cloud_interval:
+                    cloud_meta = cloud_model.get_latest_metadata()
+                    cloud_checked = now
+                    cloud_is_newer = (
+                        cloud_meta is not None
+                        and synced_time is not None
+                        and cloud_meta.last_save > synced_time
+                    )
+                    if cloud_is_newer and local_save is None:
+                        # another device uploaded a newer save
+                        local_save = get_local_save(args, game)
+
+                if local_save is not None and (local_changed or cloud_is_newer):
+                    cloud_meta = sync(args, cloud_model, local_save, cloud_meta, game)
+                    synced_time = max(
+                        local_save.last_save, cloud_meta.last_save if cloud_meta else 0
+                    )
+            except Exception as e:
+                # keep watching, the next cycle retries
+                logger.error(f"Sync failed: {e}")
+                if game is not None:
+                    game.close()
+                    game = None
+
+            time.sleep(args.interval)
+
+    except KeyboardInterrupt:
+        logger.info("Stopped watching.")
+    finally:
+        if game is not None:
+            game.close()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Bitburner Save Sync")
+    parser.add_argument(
+        "--config",
+        help="TOML or JSON file selecting the storage backend "
+        "(default: saveSync.toml or saveSync.json in the working directory)",
+    )
+    parser.add_argument(
+        "--log-level",
+        dest="log_level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Messages to show (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--metrics",
+        choices=["json", "table"],
+        help="Print timings and byte counts of every phase when done",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        help="Profile the run with cProfile or tracemalloc",
+    )
+    parser.add_argument(
+        "--profile-output",
+        dest="profile_output",
+        help="File for the cProfile stats instead of logging the top entries",
+    )
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     # app command
@@ -125,8 +368,77 @@ if __name__ == "__main__":
         help="Path to the local Bitburner save file",
     )
 
+    # watch command
+    watch_parser = subparsers.add_parser(
+        "watch", help="Keep running and sync whenever the save changes"
+    )
+    watch_source = watch_parser.add_mutually_exclusive_group(required=True)
+    watch_source.add_argument(
+        "--auto",
+        action="store_true",
+        help="Poll the running Bitburner app (requires --remote-debugging-port=9222)",
+    )
+    watch_source.add_argument(
+        "--save-dir",
+        type=str,
+        dest="save_dir",
+        help="Directory the game exports saves to (web or manual app mode)",
+    )
+    watch_parser.set_defaults(save_file=None)
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=5.0,
+        help="Seconds between checks for local changes (default: %(default)s)",
+    )
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        help="Seconds a change must settle before syncing (default: %(default)s)",
+    )
+    watch_parser.add_argument(
+        "--cloud-interval",
+        type=float,
+        dest="cloud_interval",
+        default=300.0,
+        help="Seconds between checks for newer cloud saves (default: %(default)s)",
+    )
+
+    # storage commands
+    subparsers.add_parser("history", help="List all saves stored in the cloud")
+    rebuild_parser = subparsers.add_parser(
+        "rebuild-manifest",
+        help="Rebuild the cloud manifest from the stored save files",
+    )
+    rebuild_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-read every stored file instead of keeping valid manifest entries",
+    )
+
+    prune_parser = subparsers.add_parser(
+        "prune", help="Delete stored saves a retention policy does not keep"
+    )
+    prune_parser.add_argument(
+        "--keep",
+        default=DEFAULT_RETENTION,
+        help="Retention tiers as AGE:INTERVAL, e.g. 1d:1h keeps one save per hour "
+        "of the last day (default: %(default)s)",
+    )
+    prune_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        dest="dry_run",
+        help="Only list the saves that would be deleted",
+    )
+
     args = parser.parse_args()
 
+    # messages go to stderr, so stdout stays clean for --metrics json
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+    metrics.enabled = args.metrics is not None
+
     if not args.command:
         parser.print_help()
         exit(1)
@@ -137,18 +449,30 @@ if __name__ == "__main__":
     if args.command == "web" and not args.save_file:
         parser.error("--save-file is required when using 'web'")
 
-    # Uncomment these lines if you wnat to use SFTP
-    # SFTP_CONFIG = {
-    #     "hostname": "url-to-server.com",  # SFTP server hostname or IP
-    #     "username": "username",  # SSH username
-    #     "password": "password",  # SSH password (None if using key)
-    #     "private_key_path": None,  # path to SSH private key (None if using password)
-    #     "port": 22,  # SSH port (default is 22)
-    #     "remote_path": "/bitburner_saves",  # remote directory for saves
-    # }
-    # model = SFTPCloudModel(**SFTP_CONFIG)
-
-    # and comment this in, so this one is deactivated
-    model = LocalSaveServer(os.path.join(os.getcwd(), "savegames"))
-
-    main(args, model)
+    if args.command == "prune":
+        try:
+            retention = RetentionPolicy.from_spec(args.keep)
+        except ValueError as e:
+            parser.error(str(e))
+
+    try:
+        model = backend_from_config(args.config)
+    except (OSError, ValueError) as e:
+        parser.error(f"Could not set up the storage backend: {e}")
+
+    with profile(args.profile, args.profile_output), span("total"), model:
+        if args.command == "history":
+            print_history(model)
+        elif args.command == "rebuild-manifest":
+            model.rebuild_manifest(full=args.full)
+        elif args.command == "prune":
+            prune_history(model, retention, args.dry_run)
+        elif args.command == "watch":
+            watch(args, model)
+        else:
+            asyncio.run(main(args, ThreadedCloudModel(model)))
+
+    if args.metrics == "json":
+        print(json.dumps(metrics.to_dict(), indent=2))
+    elif args.metrics == "table":
+        print(metrics.format_table())
@@ -1,45 +1,341 @@
 import gzip
+import hashlib
 import json
+import mmap
+import re
 import time
 import os
-from utils import SaveResult
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from filecopy import copy_file
+from metrics import add_bytes, span, timed
+from utils import SaveBuffer, SaveResult, to_save_buffer
+
+# compressed bytes fed to the decompressor per step of the metadata scan
+METADATA_CHUNK_SIZE = 64 * 1024
+# decompressed bytes produced per step when verifying a save, then discarded
+VERIFY_OUTPUT_SIZE = 1024 * 1024
+# a file mapped on Windows cannot be replaced or deleted until it is unmapped,
+# which would block pruning and overwriting stored saves, so files are read there
+MAP_FILES = os.name != "nt"
+
+_PLAYER_SAVE_KEY = re.compile(rb'"PlayerSave"\s*:\s*"')
+_BACKSLASH = ord("\\")
+
+_PARSE_ERRORS = (json.JSONDecodeError, KeyError, gzip.BadGzipFile, zlib.error)
+
+
+def _find_string_end(buffer: bytearray, pos: int) -> Optional[int]:
+    """Index of the first unescaped quote at or after pos, or None."""
+    while True:
+        pos = buffer.find(b'"', pos)
+        if pos == -1:
+            return None
+        backslashes = 0
+        while buffer[pos - 1 - backslashes] == _BACKSLASH:
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return pos
+        pos += 1
+
+
+def read_player_save(save_bytes: SaveBuffer) -> dict:
+    """
+    Extract the nested PlayerSave object without decompressing the whole save.
+
+    The gzip stream is decompressed chunk by chunk until the JSON string holding
+    PlayerSave is complete, then only that string is parsed. The remaining
+    sections (servers, companies, ...) are never decompressed or parsed.
+
+    Args:
+        save_bytes: gzip compressed save as exported by the game
+
+    Returns:
+        The parsed PlayerSave object ({"ctor": ..., "data": {...}})
+    """
+    view = memoryview(save_bytes)
+    return _scan_player_save(
+        view[offset : offset + METADATA_CHUNK_SIZE]
+        for offset in range(0, len(view), METADATA_CHUNK_SIZE)
+    )
+
+
+def _scan_player_save(chunks: Iterable[SaveBuffer]) -> dict:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    buffer = bytearray()
+    found_key = False
+    resume = 0
+
+    for chunk in chunks:
+        buffer += decompressor.decompress(chunk)
+
+        if not found_key:
+            match = _PLAYER_SAVE_KEY.search(buffer)
+            if match is None:
+                # keep just enough to match a key split across two chunks
+                del buffer[:-32]
+                continue
+            # start at the opening quote of the PlayerSave string
+            del buffer[: match.end() - 1]
+            found_key = True
+            resume = 1
+
+        end = _find_string_end(buffer, resume)
+        if end is not None:
+            return json.loads(json.loads(bytes(buffer[: end + 1])))
+
+        # rescan a trailing run of backslashes once more data arrived
+        resume = len(buffer)
+        while resume > 1 and buffer[resume - 1] == _BACKSLASH:
+            resume -= 1
+
+    raise KeyError("PlayerSave")
+
+
+def verify_save(save_bytes: SaveBuffer):
+    """
+    Check that a gzip compressed save is complete and uncorrupted.
+
+    The whole stream is decompressed and the output thrown away, so the CRC
+    and length in the gzip trailer are checked without holding the JSON.
+
+    Raises:
+        ValueError: if the stream is truncated or corrupt
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    view = memoryview(save_bytes)
+    try:
+        for offset in range(0, len(view), METADATA_CHUNK_SIZE):
+            chunk = view[offset : offset + METADATA_CHUNK_SIZE]
+            while chunk and not decompressor.eof:
+                decompressor.decompress(chunk, VERIFY_OUTPUT_SIZE)
+                chunk = decompressor.unconsumed_tail
+        decompressor.flush()
+    except zlib.error as e:
+        raise ValueError(f"Corrupt save file: {e}") from e
+    if not decompressor.eof:
+        raise ValueError("Corrupt save file: compressed stream is truncated")
+
+
+@dataclass
+class SaveMetadata:
+    """Everything needed to pick the newest save, without its payload."""
+
+    file_name: str
+    last_save: int
+    identifier: str
+    size: int
+    sha256: str
+    # file holding the payload when it is not stored under file_name
+    object_name: Optional[str] = None
+    # for delta patches: the file name of the version the patch applies to
+    base: Optional[str] = None
+    # storage codec of the stored payload, None for the game's own gzip
+    codec: Optional[str] = None
+
+    @property
+    def storage_name(self) -> str:
+        return self.object_name or self.file_name
+
+    def to_dict(self) -> dict:
+        data = {
+            "fileName": self.file_name,
+            "lastSave": self.last_save,
+            "identifier": self.identifier,
+            "size": self.size,
+            "sha256": self.sha256,
+        }
+        if self.object_name:
+            data["object"] = self.object_name
+        if self.base:
+            data["base"] = self.base
+        if self.codec:
+            data["codec"] = self.codec
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SaveMetadata":
+        return cls(
+            file_name=data["fileName"],
+            last_save=data["lastSave"],
+            identifier=data.get("identifier", "unknown"),
+            size=data["size"],
+            sha256=data["sha256"],
+            object_name=data.get("object"),
+            base=data.get("base"),
+            codec=data.get("codec"),
+        )
+
+    @property
+    def last_save_readable(self) -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_save / 1000))
+
+
+@dataclass(frozen=True)
+class SaveFile:
+    """A local file holding a save exactly as the game exported it."""
+
+    path: str
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_path(cls, path: str) -> "SaveFile":
+        stat = os.stat(path)
+        return cls(path, stat.st_size, stat.st_mtime_ns)
+
+    def check_unchanged(self):
+        """
+        Raises:
+            IOError: if the file was modified since it was recorded
+        """
+        if SaveFile.from_path(self.path) != self:
+            raise IOError(f"{self.path} changed since it was loaded")
+
+    def map(self) -> SaveBuffer:
+        """
+        Read-only view of the file contents, backed by a memory mapping.
+
+        Pages are read from the page cache as they are accessed, so
+        decompressing or hashing the view does not copy the file into the
+        process first. The mapping stays valid while the view is referenced:
+        stored saves are replaced by renaming, never rewritten in place.
+
+        Raises:
+            IOError: if the file was modified since it was recorded
+        """
+        with open(self.path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size != self.size:
+                raise IOError(f"{self.path} changed since it was loaded")
+            if not MAP_FILES:
+                return f.read()
+            if size == 0:
+                # empty files cannot be mapped
+                return b""
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
 
 
 class Savegame:
-    def __init__(self, save_result: SaveResult):
-        self.save_result = save_result
+    @timed("savegame.load")
+    def __init__(
+        self,
+        save_result: SaveResult,
+        metadata_only: bool = False,
+        source: Optional[SaveFile] = None,
+    ):
+        """
+        Args:
+            save_result: dict with 'fileName' and gzip compressed 'save' data
+            metadata_only: only read lastSave, identifier and totalPlaytime
+                from PlayerSave and defer parsing the full save until
+                save_data_json is accessed
+            source: file holding the save unchanged. 'save' may then be left
+                out, the file is mapped once the bytes are needed, and
+                copies of the save are made by the kernel from the file.
+        """
         self.file_name = str(save_result.get("fileName", "unknown"))
+        self.source = source
 
-        save_content = save_result.get("save")
-        assert isinstance(
-            save_content, list
-        ), f"save_content is of type {type(save_content)}, expected list"
-
-        self.save_data_bytes = save_content
-        save_bytes = bytes(save_content)
+        # single immutable buffer, shared with the backends and the import path
+        self._save_data_bytes: Optional[SaveBuffer] = None
+        if source is None or save_result.get("save") is not None:
+            self._save_data_bytes = to_save_buffer(save_result.get("save"))
+            add_bytes("savegame.loaded", len(self._save_data_bytes))
+        self._save_data_json: Optional[dict] = None
+        self._sha256: Optional[str] = None
+        self._verified = False
 
         try:
-            decompressed_content = gzip.decompress(save_bytes)
-            self.save_data_json = json.loads(decompressed_content.decode("utf-8"))
-
-            player_save = json.loads(self.save_data_json["data"]["PlayerSave"])
+            if metadata_only:
+                with span("savegame.read_player_save"):
+                    player_save = self._read_player_save()
+            else:
+                player_save = json.loads(self.save_data_json["data"]["PlayerSave"])
             self.player_data = player_save["data"]
 
             self.last_save = self.player_data["lastSave"]
             self.identifier = self.player_data.get("identifier", "unknown")
             self.total_playtime = self.player_data["totalPlaytime"]
 
-        except (json.JSONDecodeError, KeyError, gzip.BadGzipFile) as e:
+        except _PARSE_ERRORS as e:
             raise ValueError(f"Error parsing save file: {e}")
 
     @classmethod
-    def from_file(cls, file_path: str) -> "Savegame":
-        file_name = os.path.basename(file_path)
-        with open(file_path, "rb") as f:
-            file_content = f.read()
+    def from_file(
+        cls,
+        file_path: str,
+        metadata_only: bool = False,
+        file_name: Optional[str] = None,
+    ) -> "Savegame":
+        """
+        Load a save file through a memory mapping.
 
-        save_result = {"fileName": file_name, "save": list(file_content)}
-        return cls(save_result)
+        The bytes of the save are a view of the mapping, nothing is copied
+        into memory. With metadata_only, only the pages up to PlayerSave are
+        read, and the file is the source of later copies.
+
+        Args:
+            file_path: path of a gzip compressed save
+            metadata_only: see __init__
+            file_name: name of the save, defaults to the name of the file
+        """
+        if file_name is None:
+            file_name = os.path.basename(file_path)
+        return cls(
+            {"fileName": file_name},
+            metadata_only,
+            source=SaveFile.from_path(file_path),
+        )
+
+    @classmethod
+    def from_bytes(
+        cls, file_name: str, save_bytes: SaveBuffer, metadata_only: bool = False
+    ) -> "Savegame":
+        return cls({"fileName": file_name, "save": save_bytes}, metadata_only)
+
+    @property
+    def save_data_bytes(self) -> SaveBuffer:
+        """The gzip compressed save, mapped from the source file on first access."""
+        if self._save_data_bytes is None:
+            self.source.check_unchanged()
+            with span("savegame.map_file"):
+                self._save_data_bytes = self.source.map()
+            add_bytes("savegame.mapped", len(self._save_data_bytes))
+        return self._save_data_bytes
+
+    def _read_player_save(self) -> dict:
+        return read_player_save(self.save_data_bytes)
+
+    @property
+    def save_data_json(self) -> dict:
+        """The fully parsed outer save object, parsed on first access."""
+        if self._save_data_json is None:
+            try:
+                with span("savegame.decompress"):
+                    decompressed_content = gzip.decompress(self.save_data_bytes)
+                add_bytes("savegame.decompressed", len(decompressed_content))
+                with span("savegame.parse_json"):
+                    self._save_data_json = json.loads(
+                        decompressed_content.decode("utf-8")
+                    )
+            except _PARSE_ERRORS as e:
+                raise ValueError(f"Error parsing save file: {e}")
+        return self._save_data_json
+
+    def verify(self):
+        """
+        Check the whole compressed save, which a metadata_only load does not.
+
+        Raises:
+            ValueError: if the save is truncated or corrupt
+        """
+        if not self._verified and self._save_data_json is None:
+            with span("savegame.verify"):
+                verify_save(self.save_data_bytes)
+        # a full parse has decompressed and checked the whole stream already
+        self._verified = True
 
     @property
     def progression_timestamp(self) -> int:
@@ -49,13 +345,55 @@ class Savegame:
     def last_save_readable(self) -> str:
         return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_save / 1000))
 
+    @property
+    def size(self) -> int:
+        if self._save_data_bytes is None:
+            return self.source.size
+        return len(self._save_data_bytes)
+
+    @property
+    def sha256(self) -> str:
+        """Hex digest of the compressed save bytes, computed once."""
+        return self.compute_sha256()
+
+    def compute_sha256(self) -> str:
+        """
+        Hash the compressed save now, unless it was hashed before.
+
+        Call it where hashing may block, e.g. in a worker thread, so later
+        reads of sha256 are free.
+
+        Returns:
+            Hex digest of the compressed save bytes
+        """
+        if self._sha256 is None:
+            with span("savegame.sha256"):
+                self._sha256 = hashlib.sha256(self.save_data_bytes).hexdigest()
+        return self._sha256
+
+    @property
+    def metadata(self) -> SaveMetadata:
+        return SaveMetadata(
+            file_name=self.file_name,
+            last_save=self.last_save,
+            identifier=self.identifier,
+            size=self.size,
+            sha256=self.sha256,
+        )
+
+    @timed("savegame.save_to_file")
     def save_to_file(self, file_path: str):
-        save_bytes = bytes(self.save_data_bytes)
+        if self.source is not None:
+            # kernel-side copy from the source file, with fsync and rename
+            self.source.check_unchanged()
+            add_bytes("savegame.copied", copy_file(self.source.path, file_path))
+            return
         with open(file_path, "wb") as f:
-            f.write(save_bytes)
+            f.write(self.save_data_bytes)
+        add_bytes("savegame.written", len(self.save_data_bytes))
 
     def to_save_result(self) -> SaveResult:
-        return self.save_result
+        return {"fileName": self.file_name, "save": self.save_data_bytes}
 
     def __str__(self) -> str:
         return f"Savegame({self.file_name}, lastSave={self.last_save_readable}, id={self.identifier})"
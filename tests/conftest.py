@@ -0,0 +1,10 @@
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+# synthetic_save and the mock endpoints
+sys.path.insert(0, os.path.join(REPO_DIR, "benchmarks"))
+# the RFA server modules import each other by name
+sys.path.insert(0, os.path.join(REPO_DIR, "websocket_server"))
@@ -0,0 +1,84 @@
+import shutil
+
+import pytest
+
+# the mock page runs the JavaScript of the export and import scripts in Node.js
+if shutil.which("node") is None:
+    pytest.skip("node is not installed", allow_module_level=True)
+
+import export_game
+import import_game
+from cdp_client import CDPClient, CDPError
+from export_game import read_save_data
+from import_game import CONFIRM_SCRIPT, push_save_data
+from mock_cdp import MockCDPEndpoint
+from synthetic_save import make_save, save_file_name
+
+# small enough to split the test saves into several chunks
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture(scope="module")
+def save_bytes() -> bytes:
+    return make_save(2 * 1024 * 1024)
+
+
+@pytest.fixture
+def endpoint(save_bytes):
+    with MockCDPEndpoint(save_bytes, save_file_name()) as endpoint:
+        yield endpoint
+
+
+@pytest.fixture
+def game(endpoint):
+    with CDPClient.connect(endpoint.address) as game:
+        yield game
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(
+        export_game,
+        "EXPORT_SCRIPT",
+        export_game.EXPORT_SCRIPT.replace(
+            f"chunkSize = {export_game.EXPORT_CHUNK_SIZE}", f"chunkSize = {CHUNK_SIZE}"
+        ),
+    )
+    monkeypatch.setattr(import_game, "IMPORT_CHUNK_SIZE", CHUNK_SIZE)
+
+
+def test_read_save_data(game, save_bytes):
+    file_name, data = read_save_data(game)
+    assert file_name == save_file_name()
+    assert bytes(data) == save_bytes
+
+
+def test_read_save_data_in_chunks(endpoint, game, save_bytes, small_chunks):
+    _, data = read_save_data(game)
+    assert bytes(data) == save_bytes
+    assert endpoint.evaluations > 2
+    # the chunk reader is removed from the page again
+    assert game.evaluate("typeof window.__saveSyncExport") == "undefined"
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_push_save_data_replaces_save(request, endpoint, game, chunked):
+    if chunked:
+        request.getfixturevalue("small_chunks")
+    new_save = make_save(1024 * 1024, last_save=1752885774000)
+
+    push_save_data(game, new_save)
+    # the game only takes the save once the import is confirmed
+    assert endpoint.page.state()[1] == 0
+    assert game.evaluate(CONFIRM_SCRIPT) is True
+
+    assert endpoint.page.state() == (new_save, 1)
+    assert bytes(read_save_data(game)[1]) == new_save
+
+
+def test_missing_app_save_fns(game):
+    game.evaluate("delete window.appSaveFns")
+    with pytest.raises(CDPError, match="getSaveData"):
+        read_save_data(game)
+    with pytest.raises(CDPError, match="pushSaveData"):
+        push_save_data(game, b"save")
@@ -0,0 +1,49 @@
+import gzip
+
+import pytest
+
+from models.codec import codec_for_file_name, get_codec
+from models.localServer import LocalSaveServer
+from savegame import Savegame
+from synthetic_save import make_save, save_file_name
+
+CODECS = [
+    "gzip",
+    "gzip-1",
+    "gzip-9",
+    "lzma",
+    "lzma-0",
+    "lzma-9",
+    "bz2",
+    "bz2-1",
+    "bz2-9",
+]
+
+
+@pytest.mark.parametrize("spec", CODECS)
+def test_codec_round_trip(spec):
+    codec = get_codec(spec)
+    data = make_save(64 * 1024)
+
+    stored = codec.encode(data)
+    assert gzip.decompress(codec.decode(bytes(stored))) == gzip.decompress(data)
+    if codec.passthrough:
+        assert stored == data
+    assert codec_for_file_name(codec.storage_name(save_file_name())).extension == (
+        codec.extension
+    )
+
+
+@pytest.mark.parametrize("spec", CODECS)
+def test_store_round_trip(tmp_path, spec):
+    store = LocalSaveServer(str(tmp_path), codec=spec)
+    save = Savegame.from_bytes(save_file_name(), make_save(64 * 1024))
+    store.upload_save(save)
+
+    assert store.get_save(save.file_name).save_data_json == save.save_data_json
+
+
+@pytest.mark.parametrize("spec", ["xz", "gzip-10", "lzma-x"])
+def test_invalid_codec(spec):
+    with pytest.raises(ValueError):
+        get_codec(spec)
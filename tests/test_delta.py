@@ -0,0 +1,47 @@
+import json
+
+from models.codec import get_codec
+from models.delta import apply_patch, decode_patch, encode_patch, make_patch
+from models.localServer import LocalSaveServer
+from savegame import Savegame
+from synthetic_save import DEFAULT_LAST_SAVE, make_save, make_save_json, save_file_name
+
+
+def _save_json(last_save: int) -> dict:
+    return json.loads(make_save_json(64 * 1024, last_save=last_save))
+
+
+def test_patch_round_trip():
+    previous = _save_json(DEFAULT_LAST_SAVE)
+    current = _save_json(DEFAULT_LAST_SAVE + 60_000)
+    del current["data"]["AliasesSave"]
+    current["data"]["InfiltrationsSave"] = "{}"
+    metadata = Savegame.from_bytes(
+        save_file_name(DEFAULT_LAST_SAVE + 60_000),
+        make_save(64 * 1024, last_save=DEFAULT_LAST_SAVE + 60_000),
+    ).metadata
+
+    patch = make_patch(previous, current, metadata)
+    assert sorted(patch["changed"]) == ["InfiltrationsSave", "PlayerSave"]
+
+    stored = encode_patch(patch, get_codec("gzip"))
+    rebuilt = apply_patch(previous, decode_patch(stored, get_codec("gzip")))
+    assert rebuilt == current
+    assert list(rebuilt["data"]) == list(current["data"])
+
+
+def test_delta_store_returns_every_version(tmp_path):
+    store = LocalSaveServer(str(tmp_path), delta_chain_length=2)
+    versions = {}
+    for minute in range(4):
+        last_save = DEFAULT_LAST_SAVE + minute * 60_000
+        save = Savegame.from_bytes(
+            save_file_name(last_save), make_save(64 * 1024, last_save=last_save)
+        )
+        store.upload_save(save)
+        versions[save.file_name] = save.save_data_json
+
+    entries = store.list_saves()
+    assert [entry.base is not None for entry in entries] == [False, True, True, False]
+    for file_name, save_json in versions.items():
+        assert store.get_save(file_name).save_data_json == save_json
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from models.localServer import LocalSaveServer
+from models.manifest import MANIFEST_NAME
+from savegame import Savegame, SaveMetadata
+from synthetic_save import DEFAULT_LAST_SAVE, make_save, save_file_name
+from utils import is_blob_file_name
+
+
+def test_dedup_stores_identical_saves_once(tmp_path):
+    store = LocalSaveServer(str(tmp_path), dedup=True)
+    data = make_save(64 * 1024)
+    names = [save_file_name(), save_file_name(DEFAULT_LAST_SAVE + 60_000)]
+    for name in names:
+        store.upload_save(Savegame.from_bytes(name, data))
+
+    entries = store.list_saves()
+    assert sorted(entry.file_name for entry in entries) == sorted(names)
+    assert len({entry.storage_name for entry in entries}) == 1
+    blobs = [name for name in os.listdir(tmp_path) if is_blob_file_name(name)]
+    assert blobs == [entries[0].storage_name]
+    for name in names:
+        assert bytes(store.get_save(name).save_data_bytes) == data
+
+
+def _recoverable(entry: SaveMetadata) -> dict:
+    data = entry.to_dict()
+    if entry.codec is not None and entry.base is None:
+        # recompressed payloads come back as new gzip bytes, not the game's
+        del data["size"], data["sha256"]
+    return data
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"codec": "lzma"}, {"delta_chain_length": 2}], ids=str
+)
+def test_rebuild_manifest_after_manifest_is_deleted(tmp_path, options):
+    store = LocalSaveServer(str(tmp_path), **options)
+    for minute in range(3):
+        last_save = DEFAULT_LAST_SAVE + minute * 60_000
+        store.upload_save(
+            Savegame.from_bytes(
+                save_file_name(last_save), make_save(64 * 1024, last_save=last_save)
+            )
+        )
+    entries = [_recoverable(entry) for entry in store.list_saves()]
+
+    os.remove(os.path.join(tmp_path, MANIFEST_NAME))
+    rebuilt = LocalSaveServer(str(tmp_path), **options).list_saves()
+
+    assert [_recoverable(entry) for entry in rebuilt] == entries
+    assert os.path.exists(os.path.join(tmp_path, MANIFEST_NAME))
@@ -0,0 +1,27 @@
+import os
+
+from models.localServer import LocalSaveServer
+from models.manifest import MANIFEST_NAME
+from models.replicated import ReplicatedCloudModel
+from savegame import Savegame
+from synthetic_save import make_save, save_file_name
+
+
+def test_rebuild_manifest_fans_out(tmp_path):
+    paths = {name: os.path.join(tmp_path, name) for name in ("a", "b")}
+    model = ReplicatedCloudModel(
+        {name: LocalSaveServer(path) for name, path in paths.items()}
+    )
+    with model:
+        save = Savegame.from_bytes(
+            save_file_name(), make_save(64 * 1024), metadata_only=True
+        )
+        model.upload_save(save)
+        for path in paths.values():
+            os.remove(os.path.join(path, MANIFEST_NAME))
+
+        manifest = model.rebuild_manifest(full=True)
+
+    assert [entry.file_name for entry in manifest.entries] == [save.file_name]
+    for path in paths.values():
+        assert os.path.exists(os.path.join(path, MANIFEST_NAME))
@@ -0,0 +1,54 @@
+import pytest
+
+from models.retention import DEFAULT_RETENTION, RetentionPolicy
+from savegame import SaveMetadata
+
+NOW = 100 * 86400
+
+
+def _entry(identifier: str, age: float) -> SaveMetadata:
+    last_save = int((NOW - age) * 1000)
+    return SaveMetadata(
+        file_name=f"bitburnerSave_{last_save // 1000}_{identifier}.json.gz",
+        last_save=last_save,
+        identifier=identifier,
+        size=0,
+        sha256="",
+    )
+
+
+def test_select_expired_keeps_one_save_per_bucket():
+    policy = RetentionPolicy.from_spec("1h:all,1d:1h,30d:1d")
+    entries = {
+        "latest": _entry("a", 0),
+        "recent": _entry("a", 10 * 60),
+        "recent_older": _entry("a", 20 * 60),
+        # both in the hour starting 6h ago, only the newer one is kept
+        "hourly": _entry("a", 5 * 3600 + 10 * 60),
+        "hourly_older": _entry("a", 5 * 3600 + 20 * 60),
+        "previous_hour": _entry("a", 6 * 3600 + 30 * 60),
+        "daily": _entry("a", 3 * 86400),
+        "too_old": _entry("a", 40 * 86400),
+    }
+
+    expired = policy.select_expired(entries.values(), now=NOW)
+
+    assert expired == [entries["hourly_older"], entries["too_old"]]
+
+
+def test_select_expired_keeps_latest_save_of_every_game():
+    policy = RetentionPolicy.from_spec("1h:all,1d:1h")
+    old_a, old_b = _entry("a", 10 * 86400), _entry("b", 20 * 86400)
+    older_b = _entry("b", 21 * 86400)
+
+    assert policy.select_expired([older_b, old_a, old_b], now=NOW) == [older_b]
+
+
+@pytest.mark.parametrize("spec", ["1h", "1h:all,forever:1d,1y:1w", "1d:all,1h:all"])
+def test_invalid_retention_spec(spec):
+    with pytest.raises(ValueError):
+        RetentionPolicy.from_spec(spec)
+
+
+def test_default_retention_parses():
+    assert len(RetentionPolicy.from_spec(DEFAULT_RETENTION).tiers) == 5
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from rfa_client import RFAClient, RFAError, RequestExpiry
+
+
+class FakeWebSocket:
+    remote_address = ("127.0.0.1", 12525)
+
+    def __init__(self) -> None:
+        self.sent = {}
+
+    async def send(self, message: str):
+        request = json.loads(message)
+        self.sent[request["method"]] = request["id"]
+
+
+def test_requests_expire_in_deadline_order():
+    async def run():
+        expiry = RequestExpiry()
+        websocket = FakeWebSocket()
+        client = RFAClient(websocket, expiry)
+        start = time.monotonic()
+        slow = asyncio.create_task(client.request("getSaveFile", timeout=30))
+        fast = asyncio.create_task(client.request("getAllFiles", timeout=10))
+        answered = asyncio.create_task(client.request("getFileNames", timeout=5))
+        await asyncio.sleep(0)
+
+        client.handle_response({"id": websocket.sent["getFileNames"], "result": []})
+        assert await answered == []
+        assert len(expiry) == 3
+
+        # the answered request is due first, but only dropped
+        assert expiry.expire_due(start + 20) == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await fast
+        assert not slow.done()
+
+        assert expiry.expire_due(start + 40) == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await slow
+        assert len(expiry) == 0 and client.pending_count == 0
+
+    asyncio.run(run())
+
+
+def test_responses_resolve_their_own_request():
+    async def run():
+        websocket = FakeWebSocket()
+        client = RFAClient(websocket, RequestExpiry())
+        save = asyncio.create_task(client.request("getSaveFile"))
+        files = asyncio.create_task(client.request("getAllFiles"))
+        await asyncio.sleep(0)
+
+        client.handle_response({"id": websocket.sent["getAllFiles"], "error": "no"})
+        client.handle_response({"id": websocket.sent["getSaveFile"], "result": "x"})
+        assert not client.handle_response({"id": 99, "result": None})
+
+        assert await save == "x"
+        with pytest.raises(RFAError):
+            await files
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import argparse
+import os
+
+import pytest
+
+from models.localServer import LocalSaveServer
+from saveSync import sync
+from savegame import Savegame, verify_save
+from synthetic_save import make_save, save_file_name
+
+
+@pytest.fixture(scope="module")
+def save_bytes() -> bytes:
+    return make_save(2 * 1024 * 1024)
+
+
+@pytest.fixture
+def truncated_path(tmp_path, save_bytes) -> str:
+    path = os.path.join(tmp_path, save_file_name())
+    with open(path, "wb") as f:
+        f.write(save_bytes[: len(save_bytes) // 2])
+    return path
+
+
+def test_verify_accepts_complete_save(save_bytes):
+    verify_save(save_bytes)
+    Savegame.from_bytes(save_file_name(), save_bytes, metadata_only=True).verify()
+
+
+def test_verify_refuses_truncated_save(truncated_path):
+    # PlayerSave is at the start, the lazy load cannot notice the truncation
+    save = Savegame.from_file(truncated_path, metadata_only=True)
+    with pytest.raises(ValueError, match="truncated"):
+        save.verify()
+
+
+def test_verify_refuses_corrupt_save(save_bytes):
+    corrupt = bytearray(save_bytes)
+    corrupt[-8] ^= 0xFF  # CRC of the gzip trailer
+    with pytest.raises(ValueError):
+        verify_save(bytes(corrupt))
+
+
+def test_upload_refuses_truncated_save(tmp_path, truncated_path):
+    store = LocalSaveServer(os.path.join(tmp_path, "store"))
+    with pytest.raises(ValueError):
+        store.upload_save(Savegame.from_file(truncated_path, metadata_only=True))
+    assert store.get_latest_metadata() is None
+    assert store.list_saves() == []
+
+
+def test_sync_does_not_upload_truncated_save(tmp_path, truncated_path):
+    store = LocalSaveServer(os.path.join(tmp_path, "store"))
+    args = argparse.Namespace(command="web", auto=False, save_file=truncated_path)
+    local_save = Savegame.from_file(truncated_path, metadata_only=True)
+
+    assert sync(args, store, local_save, None) is None
+    assert store.get_latest_metadata() is None
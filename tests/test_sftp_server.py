@@ -0,0 +1,111 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from paramiko.message import Message
+from paramiko.sftp import CMD_DATA, CMD_READ, CMD_STATUS, CMD_WRITE
+
+from mock_sftp import MockSFTPServer
+from models.sftpServer import STALE_PART_AGE, SFTPCloudServer
+from savegame import Savegame
+from synthetic_save import make_save, save_file_name
+
+
+class _File:
+    handle = b"handle"
+
+
+class ReversedSFTP:
+    """
+    Serves a bytearray, answering the outstanding requests newest first, so
+    every response but one arrives while another request is awaited.
+    """
+
+    def __init__(self, data: bytearray) -> None:
+        self.data = data
+        self._pending = []
+
+    @contextmanager
+    def open(self, path: str, mode: str):
+        yield _File()
+
+    def _async_request(self, fileobj, t, *args):
+        self._pending.append((fileobj, t, args))
+        return len(self._pending)
+
+    def _read_response(self):
+        fileobj, t, args = self._pending.pop()
+        msg = Message()
+        if t == CMD_READ:
+            _, offset, length = args
+            msg.add_string(bytes(self.data[offset : offset + length]))
+            msg.rewind()
+            fileobj._async_response(CMD_DATA, msg, 0)
+        elif t == CMD_WRITE:
+            _, offset, block = args
+            self.data[offset : offset + len(block)] = block
+            fileobj._async_response(CMD_STATUS, msg, 0)
+
+    def _convert_status(self, msg):
+        pass
+
+
+def _model() -> SFTPCloudServer:
+    return SFTPCloudServer("localhost", "user", block_size=1000, max_requests=8)
+
+
+def test_read_blocks_with_out_of_order_responses():
+    data = bytearray(range(256)) * 100
+    buffer = bytearray(len(data))
+    for _ in _model()._read_blocks(ReversedSFTP(data), "f", memoryview(buffer), 0):
+        pass
+    assert buffer == data
+
+
+def test_write_blocks_with_out_of_order_responses():
+    data = bytes(range(256)) * 100
+    stored = bytearray(len(data))
+    offsets = list(
+        _model()._write_blocks(ReversedSFTP(stored), "f", memoryview(data), 0)
+    )
+    assert stored == data
+    # resume offsets only cover writes that were acknowledged
+    assert offsets == sorted(offsets) and offsets[-1] == len(data)
+
+
+def test_stale_part_files_are_deleted(tmp_path):
+    saves = os.path.join(tmp_path, "saves")
+    os.mkdir(saves)
+    stale = os.path.join(saves, "bitburnerSave_1752885714_BN1x0.json.gz.0123.part")
+    fresh = os.path.join(saves, "bitburnerSave_1752885774_BN1x0.json.gz.4567.part")
+    for path in (stale, fresh):
+        with open(path, "wb") as f:
+            f.write(b"partial")
+    old = time.time() - STALE_PART_AGE - 60
+    os.utime(stale, (old, old))
+
+    with MockSFTPServer(str(tmp_path)) as server:
+        model = SFTPCloudServer(
+            "127.0.0.1", "user", "pw", port=server.port, remote_path="/saves"
+        )
+        with model:
+            model.rebuild_manifest()
+
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+
+
+def test_first_upload_logs_no_warnings(tmp_path, caplog):
+    save = Savegame.from_bytes(save_file_name(), make_save(10_000))
+
+    with MockSFTPServer(str(tmp_path)) as server:
+        model = SFTPCloudServer(
+            "127.0.0.1", "user", "pw", port=server.port, remote_path="/saves"
+        )
+        with caplog.at_level(logging.WARNING), model:
+            model.rebuild_manifest()
+            model.upload_save(save)
+
+    assert not caplog.records
+    assert os.path.exists(os.path.join(tmp_path, "saves", save.file_name))
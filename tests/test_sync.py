@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import os
+
+from AsyncCloudModel import ThreadedCloudModel
+from models.localServer import LocalSaveServer
+from saveSync import sync_async
+from savegame import Savegame
+from synthetic_save import DEFAULT_LAST_SAVE, make_save, save_file_name
+
+
+def _write_save(directory: str, last_save: int) -> str:
+    path = os.path.join(directory, save_file_name(last_save))
+    with open(path, "wb") as f:
+        f.write(make_save(64 * 1024, last_save=last_save))
+    return path
+
+
+def test_sync_async_uploads_newer_save(tmp_path):
+    path = _write_save(tmp_path, DEFAULT_LAST_SAVE)
+    store = LocalSaveServer(os.path.join(tmp_path, "store"))
+    args = argparse.Namespace(command="web", auto=False, save_file=path)
+    local_save = Savegame.from_file(path, metadata_only=True)
+
+    synced = asyncio.run(sync_async(args, ThreadedCloudModel(store), local_save, None))
+
+    assert synced.file_name == local_save.file_name
+    assert store.get_latest_metadata().sha256 == local_save.sha256
+
+
+def test_sync_async_downloads_newer_cloud_save(tmp_path):
+    store = LocalSaveServer(os.path.join(tmp_path, "store"))
+    cloud_path = _write_save(tmp_path, DEFAULT_LAST_SAVE + 60_000)
+    store.upload_save(Savegame.from_file(cloud_path, metadata_only=True))
+    os.remove(cloud_path)
+
+    export_dir = os.path.join(tmp_path, "exports")
+    os.mkdir(export_dir)
+    path = _write_save(export_dir, DEFAULT_LAST_SAVE)
+    args = argparse.Namespace(command="web", auto=False, save_file=path)
+    local_save = Savegame.from_file(path, metadata_only=True)
+    cloud_meta = store.get_latest_metadata()
+
+    synced = asyncio.run(
+        sync_async(args, ThreadedCloudModel(store), local_save, cloud_meta)
+    )
+
+    assert synced == cloud_meta
+    # the cloud save was exported next to the local one
+    assert len(os.listdir(export_dir)) == 2
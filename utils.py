@@ -1,7 +1,8 @@
 from typing import Dict, Union
 import re
 
-SaveResult = Dict[str, Union[str, list[int]]]
+SaveBuffer = Union[bytes, memoryview]
+SaveResult = Dict[str, Union[str, bytes, memoryview, list[int]]]
 
 
 def get_time_from_save_file(file_name: str) -> int:
@@ -9,3 +10,40 @@ def get_time_from_save_file(file_name: str) -> int:
     if match:
         return int(match.group(1))
     raise ValueError(f"no unix timestamp in file name found: {file_name}")
+
+
+def to_save_buffer(save_content) -> SaveBuffer:
+    """
+    Convert the "save" entry of a SaveResult into an immutable byte buffer.
+
+    bytes and read-only memoryviews are passed through without copying. The
+    int list returned by WebDriver is only converted here, at the edge.
+    """
+    if isinstance(save_content, bytes):
+        return save_content
+    if isinstance(save_content, memoryview):
+        return save_content if save_content.readonly else save_content.tobytes()
+    if isinstance(save_content, (bytearray, list)):
+        return bytes(save_content)
+    raise TypeError(
+        f"save_content is of type {type(save_content)}, expected bytes or list"
+    )
+
+
+# extensions of stored payloads, one per storage codec
+_STORED_SUFFIX = re.compile(r"\.json\.(gz|xz|bz2)$")
+
+
+def is_save_file_name(file_name: str) -> bool:
+    return file_name.startswith("bitburnerSave_") and bool(
+        _STORED_SUFFIX.search(file_name)
+    )
+
+
+def blob_file_name(sha256: str, extension: str = "gz") -> str:
+    """File name of a content-addressed save payload."""
+    return f"blob_{sha256}.json.{extension}"
+
+
+def is_blob_file_name(file_name: str) -> bool:
+    return file_name.startswith("blob_") and bool(_STORED_SUFFIX.search(file_name))
@@ -1,9 +1,22 @@
+import argparse
 import asyncio
+import base64
+import binascii
+import os
+import sys
 import websockets
 import time
 import json
 import logging
-from datetime import datetime
+from typing import Optional
+
+# make the sync modules (CloudModel, models, savegame) importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AsyncCloudModel import AsyncCloudModel, ThreadedCloudModel
+from savegame import Savegame
+from rfa_client import RFAClient, RequestExpiry
+from script_mirror import ScriptMirror
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -11,121 +24,219 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 MAX_SIZE = 50 * 1024 * 1024  # 50MB
+# characters of the save string decoded and written per step, multiple of 4 for base64
+DECODE_CHUNK_SIZE = 1024 * 1024
 PING_INTERVAL = 20
 PING_TIMEOUT = 10
 
-connected_clients = set()
-message_count = 0
-message_tracker = {}
+connected_clients: set[RFAClient] = set()
+request_expiry = RequestExpiry()
+# tasks nobody awaits, the loop only keeps weak references to them
+background_tasks: set[asyncio.Task] = set()
+
+# directory for received saves, and the pipeline passing them to a backend
+output_dir = os.getcwd()
+ingestion: Optional["SaveIngestion"] = None
+# identifier -> (lastSave, sha256) of the newest save received per game
+last_seen_saves: dict[str, tuple[int, str]] = {}
+# local copy of the in-game scripts, if enabled
+mirror: Optional[ScriptMirror] = None
+
+
+def is_new_save(save: Savegame) -> bool:
+    """Whether lastSave and content differ from the last save of the same game."""
+    previous = last_seen_saves.get(save.identifier)
+    return previous is None or (
+        previous[0] != save.last_save and previous[1] != save.sha256
+    )
 
 
-def register_message(message_id: int, method: str, params=None):
-    message_tracker[message_id] = {
-        "id": message_id,
-        "method": method,
-        "params": params or {},
-        "timestamp": datetime.now().isoformat(),
-        "status": "pending",
-    }
-    logger.info(f"Registered message {message_id} with method '{method}' in tracker")
+def remember_save(save: Savegame):
+    """Record a save once it is stored, so the same save is not stored again."""
+    last_seen_saves[save.identifier] = (save.last_save, save.sha256)
 
 
-def get_tracked_message(message_id: int):
-    return message_tracker.get(message_id)
+class SaveIngestion:
+    """
+    Passes saves received from game clients to an AsyncCloudModel.
 
+    New saves go through a bounded queue to a single upload worker, so a slow
+    backend makes the receiving side wait instead of piling up saves in memory.
+    """
 
-def mark_message_completed(message_id: int):
-    if message_id in message_tracker:
-        message_tracker[message_id]["status"] = "completed"
-        logger.info(f"Marked message {message_id} as completed")
+    def __init__(self, cloud_model: AsyncCloudModel, queue_size: int = 2) -> None:
+        self.cloud_model = cloud_model
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
 
+    async def load_cloud_state(self):
+        """Remember the latest cloud save, so it is not uploaded again."""
+        meta = await self.cloud_model.get_latest_metadata()
+        if meta is not None:
+            last_seen_saves[meta.identifier] = (meta.last_save, meta.sha256)
 
-def remove_message_from_tracker(message_id: int):
-    if message_id in message_tracker:
-        removed = message_tracker.pop(message_id)
-        logger.info(f"Removed message {message_id} from tracker")
-        return removed
-    return None
+    async def submit(self, save: Savegame):
+        """
+        Queue a save for upload, waiting while the queue is full.
 
+        The save hands over the file it was loaded from: the upload reads
+        the file, and the worker removes it once the upload is done.
+        """
+        await self.queue.put(save)
+        logger.info(
+            f"Queued {save.file_name} for upload ({self.queue.qsize()} waiting)"
+        )
 
-async def handle_save_file_response(websocket, result, message_id):
+    async def run(self):
+        while True:
+            save = await self.queue.get()
+            try:
+                if not is_new_save(save):
+                    # an identical save queued earlier was uploaded meanwhile
+                    logger.info(f"{save.file_name} is already stored, skipped")
+                    continue
+                await self.cloud_model.upload_save(save)
+                remember_save(save)
+                logger.info(f"Uploaded {save.file_name}")
+            except Exception as e:
+                logger.error(f"Failed to upload {save.file_name}: {e}")
+            finally:
+                if save.source is not None:
+                    _remove_file(save.source.path)
+                self.queue.task_done()
+
+
+def _write_chunks(f, data: str, encode) -> int:
+    written = 0
+    for start in range(0, len(data), DECODE_CHUNK_SIZE):
+        chunk = encode(data[start : start + DECODE_CHUNK_SIZE])
+        f.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def write_save_data(data: str, is_binary: bool, file_path: str) -> int:
+    """
+    Decode the save string of a getSaveFile response and write it to disk.
+
+    Binary saves arrive base64 encoded and are written as the gzip bytes they
+    encode; text saves are written as they are. The string is processed in
+    DECODE_CHUNK_SIZE slices, so the decoded save never exists in memory as a
+    whole, and the file only appears under file_path once it is complete.
+
+    Returns:
+        Number of bytes written
+    """
+    tmp_path = file_path + ".tmp"
     try:
-        logger.info(f"Received save file response for message {message_id}")
+        with open(tmp_path, "wb") as f:
+            if not is_binary:
+                written = _write_chunks(f, data, lambda chunk: chunk.encode("utf-8"))
+            else:
+                try:
+                    written = _write_chunks(
+                        f, data, lambda chunk: base64.b64decode(chunk, validate=True)
+                    )
+                except binascii.Error:
+                    # not base64: a binary string with one char per byte
+                    f.seek(0)
+                    f.truncate()
+                    written = _write_chunks(
+                        f, data, lambda chunk: chunk.encode("latin-1")
+                    )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        return written
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+async def handle_save_file_response(client: RFAClient, result):
+    try:
+        logger.info(f"Received save file from {client.address}")
 
         ident = result["identifier"]
         is_binary = result["binary"]
-        data = result["save"]
+        data = result.pop("save")
+
+        tmp_path = os.path.join(output_dir, f".incoming_{id(client)}_{time.time_ns()}")
+        written = await asyncio.to_thread(write_save_data, data, is_binary, tmp_path)
+        del data
+
+        submitted = False
+        try:
+            if not is_binary:
+                # text saves of old game versions are kept, but cannot be parsed
+                file_path = os.path.join(
+                    output_dir, f"bitburnerSave_{int(time.time())}_.json"
+                )
+                os.replace(tmp_path, file_path)
+                logger.warning(
+                    f"Wrote text save of {ident} to {file_path}, not ingested"
+                )
+                return
+
+            save = await asyncio.to_thread(_load_save, tmp_path)
+            if not is_new_save(save):
+                logger.info(f"Save of {ident} did not change, skipped")
+                return
 
-        byte_data = bytes(ord(c) for c in data)
-        with open(f"bitburnerSave_{int(time.time())}_.json.gz", "wb") as f:
-            f.write(byte_data)
+            if ingestion is not None:
+                await ingestion.submit(save)
+                submitted = True
+            else:
+                file_path = os.path.join(output_dir, save.file_name)
+                os.replace(tmp_path, file_path)
+                remember_save(save)
+                logger.info(f"Wrote save of {ident} to {file_path} ({written} bytes)")
+        finally:
+            # skipped or unreadable saves leave no incoming file behind
+            if not submitted:
+                _remove_file(tmp_path)
 
     except Exception as e:
         logger.error(f"Error processing save file response: {e}")
 
 
-async def cleanup_old_messages():
-    # Clean up every minute
-    while True:
-        await asyncio.sleep(60)
+def _load_save(file_path: str) -> Savegame:
+    # mapped, not read, the file stays the source of the upload
+    save = Savegame.from_file(file_path, metadata_only=True)
+    # named after lastSave, so every new save gets its own file
+    save.file_name = f"bitburnerSave_{save.last_save // 1000}_.json.gz"
+    save.compute_sha256()  # hash off the event loop
+    return save
 
-        current_time = datetime.now()
-        messages_to_remove = []
 
-        # Remove messages older than 5 min
-        for msg_id, msg_data in message_tracker.items():
-            if msg_data["status"] == "completed":
-                msg_time = datetime.fromisoformat(msg_data["timestamp"])
-                if (current_time - msg_time).total_seconds() > 300:
-                    messages_to_remove.append(msg_id)
+def _remove_file(file_path: str):
+    if os.path.exists(file_path):
+        os.remove(file_path)
 
-        for msg_id in messages_to_remove:
-            remove_message_from_tracker(msg_id)
 
-        if messages_to_remove:
-            logger.info(
-                f"Cleaned up {len(messages_to_remove)} old completed messages from tracker"
-            )
+async def request_saves_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await get_savefile()
+        except Exception as e:
+            logger.error(f"Failed to request save file: {e}")
 
 
-async def handle_jsonrpc_message(websocket, data):
+async def handle_jsonrpc_message(client: RFAClient, data):
     message_id = data.get("id")
 
     if "result" in data or "error" in data:
-        # response to a previous request
-        if message_id is not None:
-            tracked_message = get_tracked_message(message_id)
-            if tracked_message:
-                logger.info(
-                    f"Received response for tracked message {message_id}: {tracked_message['method']}"
-                )
-                mark_message_completed(message_id)
-
-                if "result" in data:
-                    result = data["result"]
-                    method = tracked_message["method"]
-
-                    if method == "getSaveFile":
-                        await handle_save_file_response(websocket, result, message_id)
-                    else:
-                        logger.info(
-                            f"Success response for {method}: {str(result)[:200]}..."
-                        )
-
-                elif "error" in data:
-                    logger.error(
-                        f"Error response for {tracked_message['method']}: {data['error']}"
-                    )
-            else:
-                logger.warning(
-                    f"Received response for unknown message ID: {message_id}"
-                )
-                # Send error response
-                error_response = {
-                    "jsonrpc": "2.0",
-                    "error": {"code": -32600, "message": "Unknown message received"},
-                }
-                await websocket.send(json.dumps(error_response))
+        # response to a previous request of this client
+        if not client.handle_response(data):
+            logger.warning(
+                f"Received response for unknown message ID {message_id} from {client.address}"
+            )
+            error_response = {
+                "jsonrpc": "2.0",
+                "error": {"code": -32600, "message": "Unknown message received"},
+            }
+            await client.websocket.send(json.dumps(error_response))
     else:
         # Invalid JSON-RPC message
         logger.warning(f"Invalid JSON-RPC message received: {data}")
@@ -134,21 +245,20 @@ async def handle_jsonrpc_message(websocket, data):
             "id": message_id,
             "error": {"code": -32600, "message": "Invalid JSON-RPC message"},
         }
-        await websocket.send(json.dumps(error_response))
+        await client.websocket.send(json.dumps(error_response))
 
 
 async def handle_client(websocket):
     client_address = websocket.remote_address
     logger.info(f"New client connected: {client_address}")
 
-    connected_clients.add(websocket)
+    client = RFAClient(websocket, request_expiry)
+    connected_clients.add(client)
 
     # immediatly request savefile data from client
-    try:
-        await get_savefile()
-        logger.info("Requested save file from newly connected client")
-    except Exception as e:
-        logger.error(f"Failed to request save file from new client: {e}")
+    request_save(client)
+    if mirror is not None:
+        client.start_task(mirror_scripts(client))
 
     # receive and parse messages from client
     try:
@@ -161,7 +271,9 @@ async def handle_client(websocket):
                 logger.info(f"Message content: {message}")
 
             data = json.loads(message)
-            await handle_jsonrpc_message(websocket, data)
+            # don't keep the raw message alive next to the parsed one
+            del message
+            await handle_jsonrpc_message(client, data)
 
     except websockets.exceptions.ConnectionClosedError as e:
         logger.warning(f"Client {client_address} connection closed unexpectedly: {e}")
@@ -176,43 +288,93 @@ async def handle_client(websocket):
         logger.error(f"Exception type: {type(e).__name__}")
     finally:
         # Remove client from connected clients
-        connected_clients.discard(websocket)
+        connected_clients.discard(client)
+        client.close()
 
 
-async def broadcast_message(message):
-    if connected_clients:
-        logger.info(f"Broadcasting message to {len(connected_clients)} clients")
-        # Create a copy of the set to avoid issues if clients disconnect during broadcast
-        clients_copy = connected_clients.copy()
-        await asyncio.gather(
-            *[client.send(message) for client in clients_copy], return_exceptions=True
-        )
+async def fetch_save(client: RFAClient):
+    client.save_request_active = True
+    try:
+        result = await client.request("getSaveFile")
+        await handle_save_file_response(client, result)
+    except Exception as e:
+        logger.error(f"Failed to get save file from {client.address}: {e}")
+    finally:
+        client.save_request_active = False
+
+
+def request_save(client: RFAClient):
+    """Request a save from a client, unless one is still on its way."""
+    if client.save_request_active:
+        logger.info(f"Save of {client.address} still pending, not requested again")
+        return
+    task = asyncio.create_task(fetch_save(client))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
 
 async def get_savefile():
-    global message_count
     if connected_clients:
-        method = "getSaveFile"
-        # Register the message in the tracker before sending
-        register_message(message_count, method)
+        logger.info(f"Requesting save files from {len(connected_clients)} clients")
+        for client in list(connected_clients):
+            request_save(client)
 
-        data = {
-            "jsonrpc": "2.0",
-            "id": message_count,
-            "method": method,
-        }
-        message = json.dumps(data)
-        await broadcast_message(message)
-        message_count += 1
+
+async def mirror_scripts(client: RFAClient):
+    try:
+        await mirror.sync(client)
+    except Exception as e:
+        logger.error(f"Failed to mirror scripts of {client.address}: {e}")
+
+
+async def mirror_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        for client in list(connected_clients):
+            await mirror_scripts(client)
+
+
+def ingestion_backend(args) -> Optional[AsyncCloudModel]:
+    """
+    Backend new saves are uploaded to, None to only keep them in --output-dir.
+
+    Raises:
+        OSError, ValueError: if the config file cannot be read or is invalid
+    """
+    from models.registry import backend_from_config, build_backend
+
+    if args.config:
+        model = backend_from_config(args.config)
+    elif args.save_path:
+        # shorthand for a config with a local backend
+        model = build_backend({"type": "local", "save_path": args.save_path})
+    else:
+        return None
+    return ThreadedCloudModel(model)
 
 
-async def main():
-    host = "localhost"
-    port = 12525
+async def main(args, cloud_model: Optional[AsyncCloudModel] = None):
+    global ingestion, mirror, output_dir
+    host = args.host
+    port = args.port
+    output_dir = args.output_dir
 
     logger.info(f"Starting WebSocket server on {host}:{port}")
     logger.info(f"Max message size: {MAX_SIZE / 1024 / 1024:.1f}MB")
 
+    tasks = []
+    if cloud_model is not None:
+        ingestion = SaveIngestion(cloud_model, args.queue_size)
+        await ingestion.load_cloud_state()
+        tasks.append(asyncio.create_task(ingestion.run()))
+        logger.info(f"Ingesting new saves into {args.config or args.save_path}")
+
+    if args.mirror_dir:
+        servers = (
+            None if args.mirror_servers == "all" else args.mirror_servers.split(",")
+        )
+        mirror = ScriptMirror(args.mirror_dir, servers)
+
     server = await websockets.serve(
         handle_client,
         host,
@@ -224,19 +386,88 @@ async def main():
     )
     logger.info(f"WebSocket server running on ws://{host}:{port}")
 
-    # Start the cleanup task
-    cleanup_task = asyncio.create_task(cleanup_old_messages())
+    # fails requests the games did not answer in time
+    tasks.append(asyncio.create_task(request_expiry.run()))
+    if args.interval > 0:
+        tasks.append(asyncio.create_task(request_saves_periodically(args.interval)))
+        logger.info(f"Requesting save files every {args.interval:.0f}s")
+    if mirror is not None:
+        tasks.append(asyncio.create_task(mirror_periodically(args.mirror_interval)))
+        logger.info(
+            f"Mirroring scripts to {args.mirror_dir} every {args.mirror_interval:.0f}s"
+        )
 
     try:
         await server.wait_closed()
     except KeyboardInterrupt:
         logger.info("Server interrupted by user")
     finally:
-        cleanup_task.cancel()
+        for task in tasks:
+            task.cancel()
         server.close()
         await server.wait_closed()
+        if ingestion is not None:
+            await ingestion.cloud_model.close()
         logger.info("Server stopped")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Bitburner Remote File API server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=12525)
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=0,
+        help="Seconds between save file requests, 0 only requests on connect",
+    )
+    parser.add_argument(
+        "--output-dir",
+        dest="output_dir",
+        default=os.getcwd(),
+        help="Directory for received saves (default: current directory)",
+    )
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument(
+        "--config",
+        help="Upload new saves to the backend of this TOML or JSON config file "
+        "(see saveSync.py) instead of keeping them in --output-dir",
+    )
+    backend.add_argument(
+        "--save-path",
+        dest="save_path",
+        help="Shorthand for --config with a local backend at this path",
+    )
+    parser.add_argument(
+        "--queue-size",
+        dest="queue_size",
+        type=int,
+        default=2,
+        help="Saves waiting for upload before receiving blocks (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--mirror-dir",
+        dest="mirror_dir",
+        help="Keep the in-game scripts in sync with this directory, one "
+        "subdirectory per server",
+    )
+    parser.add_argument(
+        "--mirror-servers",
+        dest="mirror_servers",
+        default="home",
+        help="Comma separated servers to mirror, or 'all' for every server with "
+        "admin rights (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--mirror-interval",
+        dest="mirror_interval",
+        type=float,
+        default=5,
+        help="Seconds between script mirror cycles (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    try:
+        cloud_model = ingestion_backend(args)
+    except (OSError, ValueError) as e:
+        parser.error(f"Could not set up the storage backend: {e}")
+    asyncio.run(main(args, cloud_model))
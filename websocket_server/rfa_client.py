@@ -0,0 +1,153 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# seconds a game client gets to answer a request, saves can take a while
+REQUEST_TIMEOUT = 120.0
+
+
+class RFAError(Exception):
+    """Error response of a game client to a request."""
+
+
+class RequestExpiry:
+    """
+    Fails requests that did not get a response in time.
+
+    Deadlines are monotonic timestamps kept in a heap, so adding a request and
+    expiring the next due one are O(log n) and a check never scans requests
+    that are not due yet. Answered requests are dropped lazily when their
+    deadline comes up.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, "RFAClient", int]] = []
+        self._order = itertools.count()
+
+    def add(self, deadline: float, client: "RFAClient", request_id: int):
+        heapq.heappush(self._heap, (deadline, next(self._order), client, request_id))
+
+    def expire_due(self, now: Optional[float] = None) -> int:
+        """Expire all requests whose deadline passed, returns how many were pending."""
+        now = time.monotonic() if now is None else now
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, _, client, request_id = heapq.heappop(self._heap)
+            if client.expire(request_id):
+                expired += 1
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    async def run(self, max_sleep: float = 1.0):
+        while True:
+            delay = max_sleep
+            if self._heap:
+                delay = min(delay, max(0.0, self._heap[0][0] - time.monotonic()))
+            await asyncio.sleep(delay)
+            expired = self.expire_due()
+            if expired:
+                logger.warning(f"{expired} request(s) timed out")
+
+
+class RFAClient:
+    """
+    A connected game instance.
+
+    Every client has its own request id space and a future per pending request,
+    so responses of several games never land on the same request.
+    """
+
+    def __init__(self, websocket, expiry: RequestExpiry) -> None:
+        self.websocket = websocket
+        self.address = websocket.remote_address
+        self._expiry = expiry
+        self._next_id = 0
+        self._pending: dict[int, tuple[str, asyncio.Future]] = {}
+        # set while a getSaveFile request of this client is being processed
+        self.save_request_active = False
+        # work for this client only, cancelled when it disconnects
+        self._tasks: set[asyncio.Task] = set()
+
+    async def request(
+        self,
+        method: str,
+        params: Optional[dict] = None,
+        timeout: float = REQUEST_TIMEOUT,
+    ) -> Any:
+        """
+        Send a JSON-RPC request and wait for its result.
+
+        Raises:
+            RFAError: if the game answered with an error
+            asyncio.TimeoutError: if there was no answer within timeout seconds
+        """
+        request_id = self._next_id
+        self._next_id += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (method, future)
+        self._expiry.add(time.monotonic() + timeout, self, request_id)
+
+        message = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if params is not None:
+            message["params"] = params
+        try:
+            await self.websocket.send(json.dumps(message))
+        except Exception:
+            self._pending.pop(request_id, None)
+            raise
+        return await future
+
+    def handle_response(self, data: dict) -> bool:
+        """Resolve the request a response belongs to, False if it is unknown."""
+        entry = self._pending.pop(data.get("id"), None)
+        if entry is None:
+            return False
+
+        method, future = entry
+        if not future.done():
+            if "error" in data:
+                future.set_exception(RFAError(f"{method}: {data['error']}"))
+            else:
+                future.set_result(data.get("result"))
+        return True
+
+    def expire(self, request_id: int) -> bool:
+        entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return False
+
+        method, future = entry
+        if not future.done():
+            future.set_exception(
+                asyncio.TimeoutError(f"{method} request {request_id} timed out")
+            )
+        return True
+
+    def start_task(self, coro) -> asyncio.Task:
+        """Run a coroutine for this client, until it is done or the client closes."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def close(self):
+        """The connection is gone: cancel the tasks of this client, fail its requests."""
+        for task in list(self._tasks):
+            task.cancel()
+        pending, self._pending = self._pending, {}
+        for method, future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"{method}: client disconnected"))
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
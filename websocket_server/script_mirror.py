@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from functools import partial
+from typing import Callable, Optional
+
+from rfa_client import RFAClient
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = ".mirror_index.json"
+INDEX_VERSION = 1
+# file types the game accepts in pushFile
+SCRIPT_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".script", ".txt")
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def is_script_file(file_name: str) -> bool:
+    return file_name.endswith(SCRIPT_EXTENSIONS)
+
+
+def _write_atomic(path: str, content: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class ScriptMirror:
+    """
+    Two-way mirror of in-game scripts in a local directory.
+
+    Every in-game server maps to a directory below root, e.g. root/home/lib/util.js.
+    An index stores the hash of every file as of the last sync, the common base
+    of both sides: a file changed on one side only is pushed or pulled, a file
+    changed on both sides is reported as conflict and left alone.
+
+    A cycle fetches all files of a server with a single getAllFiles request and
+    sends all pushFile/deleteFile requests at once, so the cost is a few round
+    trips per cycle instead of one per file.
+    """
+
+    def __init__(self, root: str, servers: Optional[list[str]] = None) -> None:
+        """
+        Args:
+            root: local directory holding one subdirectory per server
+            servers: in-game servers to mirror, None mirrors all servers with
+                admin rights
+        """
+        self.root = root
+        self.servers = servers
+        self._index_path = os.path.join(root, INDEX_NAME)
+        self._index = self._load_index()
+        self._lock = asyncio.Lock()
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path, "rb") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning(f"Invalid mirror index {self._index_path}, starting over")
+            return {}
+        if index.get("version") != INDEX_VERSION:
+            return {}
+        return index["servers"]
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        data = {"version": INDEX_VERSION, "servers": self._index}
+        _write_atomic(
+            self._index_path, json.dumps(data, separators=(",", ":")).encode()
+        )
+
+    async def _list_servers(self, client: RFAClient) -> list[str]:
+        if self.servers is not None:
+            return self.servers
+        servers = await client.request("getAllServers")
+        return [s["hostname"] for s in servers if s.get("hasAdminRights")]
+
+    async def sync(self, client: RFAClient) -> dict[str, int]:
+        """
+        Run one sync cycle against a game client.
+
+        Returns:
+            Number of pushed, pulled, deleted, conflicting and failed files
+        """
+        async with self._lock:
+            servers = await self._list_servers(client)
+            remote_files = await asyncio.gather(
+                *[client.request("getAllFiles", {"server": s}) for s in servers]
+            )
+
+            counts = {
+                "pushed": 0,
+                "pulled": 0,
+                "deleted": 0,
+                "conflicts": 0,
+                "failed": 0,
+            }
+            requests = []
+            for server, files in zip(servers, remote_files):
+                requests += self._sync_server(server, files, counts)
+
+            results = await asyncio.gather(
+                *[client.request(method, params) for method, params, _ in requests],
+                return_exceptions=True,
+            )
+            for (method, params, update), result in zip(requests, results):
+                if isinstance(result, Exception):
+                    # index stays at the old base, so the file is sent again next cycle
+                    file_path = f"{params['server']}/{params['filename']}"
+                    logger.error(f"{method} {file_path} failed: {result}")
+                    counts["failed"] += 1
+                else:
+                    update()
+            self._save_index()
+
+        if any(counts.values()):
+            logger.info(
+                "Script mirror: {pushed} pushed, {pulled} pulled, {deleted} deleted, "
+                "{conflicts} conflicts, {failed} failed".format(**counts)
+            )
+        return counts
+
+    def _sync_server(
+        self, server: str, files: list[dict], counts: dict[str, int]
+    ) -> list[tuple[str, dict, Callable[[], None]]]:
+        """
+        Update the local side of a server and return the requests for the game,
+        each with the index update to apply once it succeeded.
+        """
+        server_dir = os.path.join(self.root, server)
+        base = self._index.setdefault(server, {})
+
+        remote = {}
+        for file in files:
+            name = file["filename"].lstrip("/")
+            if is_script_file(name):
+                remote[name] = file["content"].encode("utf-8")
+        remote_hashes = {
+            name: content_hash(content) for name, content in remote.items()
+        }
+        local_hashes = self._local_hashes(server_dir, base)
+
+        requests = []
+        for name in set(base) | set(remote_hashes) | set(local_hashes):
+            base_hash = base[name]["sha256"] if name in base else None
+            local_hash = local_hashes.get(name)
+            remote_hash = remote_hashes.get(name)
+            local_path = os.path.join(server_dir, *name.split("/"))
+
+            if local_hash == remote_hash:
+                if local_hash is None:
+                    base.pop(name, None)
+                else:
+                    self._remember(base, name, local_path, local_hash)
+            elif remote_hash == base_hash:
+                # changed locally
+                if local_hash is None:
+                    requests.append(
+                        (
+                            "deleteFile",
+                            {"filename": name, "server": server},
+                            partial(base.pop, name, None),
+                        )
+                    )
+                    counts["deleted"] += 1
+                else:
+                    with open(local_path, "rb") as f:
+                        content = f.read().decode("utf-8")
+                    requests.append(
+                        (
+                            "pushFile",
+                            {"filename": name, "content": content, "server": server},
+                            partial(self._remember, base, name, local_path, local_hash),
+                        )
+                    )
+                    counts["pushed"] += 1
+            elif local_hash == base_hash:
+                # changed in game
+                if remote_hash is None:
+                    os.remove(local_path)
+                    base.pop(name, None)
+                    counts["deleted"] += 1
+                else:
+                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                    _write_atomic(local_path, remote[name])
+                    self._remember(base, name, local_path, remote_hash)
+                    counts["pulled"] += 1
+            else:
+                logger.warning(f"Conflict: {server}/{name} changed locally and in game")
+                counts["conflicts"] += 1
+        return requests
+
+    def _local_hashes(self, server_dir: str, base: dict) -> dict[str, str]:
+        """Hash the local files of a server, reusing the index for unmodified files."""
+        hashes = {}
+        for dir_path, dir_names, file_names in os.walk(server_dir):
+            dir_names[:] = [d for d in dir_names if not d.startswith(".")]
+            for file_name in file_names:
+                if file_name.startswith(".") or not is_script_file(file_name):
+                    continue
+                path = os.path.join(dir_path, file_name)
+                name = os.path.relpath(path, server_dir).replace(os.sep, "/")
+                stat = os.stat(path)
+                entry = base.get(name)
+                if (
+                    entry is not None
+                    and entry["mtime"] == stat.st_mtime_ns
+                    and entry["size"] == stat.st_size
+                ):
+                    hashes[name] = entry["sha256"]
+                    continue
+                with open(path, "rb") as f:
+                    hashes[name] = content_hash(f.read())
+        return hashes
+
+    @staticmethod
+    def _remember(base: dict, name: str, local_path: str, sha256: str):
+        stat = os.stat(local_path)
+        base[name] = {"sha256": sha256, "mtime": stat.st_mtime_ns, "size": stat.st_size}